@@ -0,0 +1,114 @@
+"""
+Latency benchmark for concurrent `POST /matches/{matchId}/ball`.
+
+Creates a set of matches on a running API instance, then scores them all at
+the same time (one scorer per match, deliveries posted back to back) and
+reports latency percentiles as JSON.
+
+To compare the blocking pymongo data layer with the async one, start the API
+from each revision and run the benchmark against it with a different label:
+
+    python -m Benchmarks.ballLatencyBenchmark --base-url http://localhost:9000 --label before
+    python -m Benchmarks.ballLatencyBenchmark --base-url http://localhost:9000 --label after
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+
+def buildMatchPayload(index: int) -> dict:
+    return {
+        "hostTeam": {"name": f"Host {index}", "players": []},
+        "visitorTeam": {"name": f"Visitor {index}", "players": []},
+        "tossWonBy": "host",
+        "optedTo": "bat",
+        "overs": 20,
+        "settings": {
+            "playersPerTeam": 11,
+            "noBall": {"reball": True, "runs": 1},
+            "wideBall": {"reball": True, "runs": 1},
+        },
+    }
+
+
+def buildBallPayload(index: int) -> dict:
+    runs = [0, 1, 4, 0, 2, 6][index % 6]
+    return {"ballType": "normal", "runs": runs, "batsman": "Striker", "bowler": "Bowler"}
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(label: str, latencies: list, elapsed: float, errors: int, endpoint: str = "POST /matches/{matchId}/ball") -> dict:
+    return {
+        "label": label,
+        "endpoint": endpoint,
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsedSeconds": round(elapsed, 3),
+        "throughputPerSecond": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latencyMs": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+async def createMatch(client: httpx.AsyncClient, index: int) -> str:
+    response = await client.post("/matches", json=buildMatchPayload(index))
+    matchId = response.json()["result"]["id"]
+    await client.put(f"/matches/{matchId}/opening-players", json={"striker": "Striker", "nonStriker": "NonStriker", "bowler": "Bowler"})
+    return matchId
+
+
+async def scoreMatch(client: httpx.AsyncClient, matchId: str, balls: int, latencies: list) -> int:
+    errors = 0
+    for index in range(balls):
+        start = time.perf_counter()
+        response = await client.post(f"/matches/{matchId}/ball", json=buildBallPayload(index))
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200 or response.json().get("code") != 56:
+            errors += 1
+    return errors
+
+
+async def runBenchmark(baseUrl: str, matches: int, balls: int, label: str) -> dict:
+    limits = httpx.Limits(max_connections=matches, max_keepalive_connections=matches)
+    async with httpx.AsyncClient(base_url=baseUrl, limits=limits, timeout=60) as client:
+        matchIds = [await createMatch(client, index) for index in range(matches)]
+        latencies = []
+        start = time.perf_counter()
+        errors = await asyncio.gather(*(scoreMatch(client, matchId, balls, latencies) for matchId in matchIds))
+        elapsed = time.perf_counter() - start
+    return summarize(label, latencies, elapsed, sum(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent ball recording latency benchmark")
+    parser.add_argument("--base-url", default="http://localhost:9000")
+    parser.add_argument("--matches", type=int, default=50, help="number of matches scored concurrently")
+    parser.add_argument("--balls", type=int, default=60, help="deliveries posted per match")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--output", help="optional path to write the JSON result to")
+    args = parser.parse_args()
+
+    result = asyncio.run(runBenchmark(args.base_url, args.matches, args.balls, args.label))
+    payload = json.dumps(result, indent=2)
+    print(payload)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Concurrency stress test for scoring: several writers score the same matches
+at once, and afterwards every acknowledged delivery must be stored exactly
+once.
+
+Each match gets several scorers posting deliveries at the same time, and
+now and then undoing the last ball. Every delivery carries a unique tag in
+`commentary`. Once scoring stops, the ball events and scoreboard of each
+match are read back from Mongo and checked:
+
+- the live ball events have eventIndex 0..n-1 with no gaps or repeats,
+- their tags are exactly the acknowledged deliveries minus the undone ones,
+- the stored scoreboard counts n events and their runs.
+
+Deliveries rejected with code 78 (lost every retry to another writer) were
+never acknowledged and must not be stored.
+
+One more match is scored, has its opening players re-set, and must then
+have nothing to undo: undo may not reach balls of the replaced scoreboard.
+
+The writers are either real uvicorn worker processes, started here against
+the Mongo in MONGO_DB_URL (pass --write-behind to see what the default
+write-behind mode does with several workers), or several live match engines
+in this process sharing one database, which also runs on mongomock:
+
+    python -m Benchmarks.concurrencyStress --workers 4 --matches 5 --scorers 4 --balls 25
+    python -m Benchmarks.concurrencyStress --engines 4 --mongomock
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from Benchmarks.ballLatencyBenchmark import createMatch
+from Benchmarks.scoringBenchmark import environment, openClient, useMongomock
+
+BALL_RECORDED = 56
+BALL_UNDONE = 62
+NO_BALL_TO_UNDO = 63
+SCOREBOARD_CONFLICT = 78
+
+
+def buildTaggedBall(tag: str, chooser: random.Random) -> dict:
+    return {"ballType": "normal", "runs": chooser.choice([0, 1, 2, 4, 6]), "batsman": "Striker", "bowler": "Bowler", "commentary": tag}
+
+
+class HttpScorer:
+    """Scores through the API of running workers."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+
+    async def recordBall(self, matchId: str, ball: dict):
+        response = await self.client.post(f"/matches/{matchId}/ball", json=ball)
+        body = response.json()
+        return body.get("code"), body.get("result")
+
+    async def undoLastBall(self, matchId: str):
+        response = await self.client.delete(f"/matches/{matchId}/ball/last")
+        body = response.json()
+        return body.get("code"), (body.get("result") or {}).get("ball")
+
+
+class EngineScorer:
+    """Scores through one of several live match engines in this process, each standing in for a worker."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def recordBall(self, matchId: str, ball: dict):
+        from Models.ballModel import BallEvent
+        from Utils.liveMatchEngine import ScoreboardConflict
+        try:
+            state = await self.engine.getState(matchId)
+            return BALL_RECORDED, await self.engine.recordBall(state, BallEvent.model_validate(ball))
+        except ScoreboardConflict:
+            return SCOREBOARD_CONFLICT, None
+
+    async def undoLastBall(self, matchId: str):
+        from Utils.liveMatchEngine import ScoreboardConflict
+        try:
+            state = await self.engine.getState(matchId)
+            event = await self.engine.undoLastBall(state)
+            return (BALL_UNDONE, event) if event else (NO_BALL_TO_UNDO, None)
+        except ScoreboardConflict:
+            return SCOREBOARD_CONFLICT, None
+
+
+async def runScorer(scorer, matchId: str, name: str, balls: int, undoRate: float, seed: int, ledger: dict):
+    """Post `balls` deliveries to one match, undoing the last ball now and then, and record every outcome."""
+    chooser = random.Random(seed)
+    for index in range(balls):
+        ball = buildTaggedBall(f"{name}-{index}", chooser)
+        try:
+            code, _ = await scorer.recordBall(matchId, ball)
+        except Exception:
+            code = None
+        if code == BALL_RECORDED:
+            ledger["acknowledged"][ball["commentary"]] = ball["runs"]
+        elif code == SCOREBOARD_CONFLICT:
+            ledger["conflicts"] += 1
+        else:
+            ledger["errors"] += 1
+
+        if chooser.random() < undoRate:
+            try:
+                code, event = await scorer.undoLastBall(matchId)
+            except Exception:
+                code, event = None, None
+            if code == BALL_UNDONE:
+                ledger["undone"].append(event["commentary"])
+            elif code == SCOREBOARD_CONFLICT:
+                ledger["conflicts"] += 1
+            elif code != NO_BALL_TO_UNDO:
+                ledger["errors"] += 1
+        await asyncio.sleep(0)
+
+
+async def verifyMatch(matchId: str, ledger: dict) -> list:
+    """Everything wrong with what is stored for one match, as messages."""
+    from Database.matchDb import getBallEventsForReplay
+    from Database.scoreboardDb import getScoreboardFromDb, scoreboardCache
+
+    problems = []
+    events = await getBallEventsForReplay(matchId)
+    indexes = [event.get("eventIndex") for event in events]
+    if indexes != list(range(len(events))):
+        problems.append(f"ball events are not numbered 0..{len(events) - 1}: {indexes}")
+
+    stored = [event.get("commentary") for event in events]
+    expected = dict(ledger["acknowledged"])
+    for tag in ledger["undone"]:
+        if expected.pop(tag, None) is None:
+            problems.append(f"undo returned {tag}, which was never acknowledged or was undone twice")
+    duplicated = sorted({tag for tag in stored if stored.count(tag) > 1})
+    lost = sorted(set(expected) - set(stored))
+    unacknowledged = sorted(set(stored) - set(expected))
+    if duplicated:
+        problems.append(f"stored more than once: {duplicated}")
+    if lost:
+        problems.append(f"acknowledged but not stored: {lost}")
+    if unacknowledged:
+        problems.append(f"stored but not acknowledged (or undone): {unacknowledged}")
+
+    scoreboardCache.invalidate({"matchId": matchId})
+    scoreboard = await getScoreboardFromDb({"matchId": matchId}) or {}
+    if scoreboard.get("eventCount") != len(events):
+        problems.append(f"scoreboard eventCount {scoreboard.get('eventCount')} but {len(events)} ball events")
+    runs = sum(event.get("runs", 0) for event in events)
+    if scoreboard.get("score") != runs:
+        problems.append(f"scoreboard score {scoreboard.get('score')} but the ball events add up to {runs}")
+    return problems
+
+
+async def checkUndoAfterReopen(client: httpx.AsyncClient, index: int) -> list:
+    """Score a few balls, re-set the opening players and check that the new scoreboard has nothing to undo."""
+    matchId = await createMatch(client, index)
+    for ball in range(4):
+        await client.post(f"/matches/{matchId}/ball", json=buildTaggedBall(f"reopen-{ball}", random.Random(ball)))
+    await client.put(f"/matches/{matchId}/opening-players", json={"striker": "C", "nonStriker": "D", "bowler": "E"})
+
+    problems = []
+    code = (await client.delete(f"/matches/{matchId}/ball/last")).json().get("code")
+    if code != NO_BALL_TO_UNDO:
+        problems.append(f"undo on a re-set scoreboard returned code {code}, expected {NO_BALL_TO_UNDO}")
+    scoreboard = (await client.get(f"/matches/{matchId}/scoreboard")).json().get("result") or {}
+    if scoreboard.get("score") != 0 or [batsman["name"] for batsman in scoreboard.get("currentBatsmen", [])] != ["C", "D"]:
+        problems.append(f"re-set scoreboard changed: score {scoreboard.get('score')}, batsmen {scoreboard.get('currentBatsmen')}")
+    code = (await client.post(f"/matches/{matchId}/ball", json=buildTaggedBall("reopen-new", random.Random(0)))).json().get("code")
+    if code != BALL_RECORDED:
+        problems.append(f"first ball on a re-set scoreboard returned code {code}")
+    return problems
+
+
+async def waitUntilHealthy(baseUrl: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=baseUrl, timeout=5) as client:
+        while True:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit(f"workers at {baseUrl} did not become healthy within {timeout}s")
+            await asyncio.sleep(0.5)
+
+
+@contextlib.contextmanager
+def launchWorkers(workers: int, port: int, writeThrough: bool):
+    """Run `uvicorn main:app` with `workers` processes; SIGTERM on exit lets each flush and close."""
+    env = dict(os.environ, LIVE_WRITE_THROUGH="true" if writeThrough else "false")
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+    process = subprocess.Popen(command, env=env)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def scoreAll(scorers: list, matchIds: list, args) -> tuple:
+    """Give every match `args.scorers` concurrent scorers, spread over `scorers`. Returns (ledgers, seconds)."""
+    ledgers = {matchId: {"acknowledged": {}, "undone": [], "conflicts": 0, "errors": 0} for matchId in matchIds}
+    tasks = []
+    for matchNumber, matchId in enumerate(matchIds):
+        for scorerNumber in range(args.scorers):
+            scorer = scorers[(matchNumber + scorerNumber) % len(scorers)]
+            seed = args.seed * 1_000_003 + matchNumber * 1000 + scorerNumber
+            tasks.append(runScorer(scorer, matchId, f"s{scorerNumber}", args.balls, args.undo_rate, seed, ledgers[matchId]))
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return ledgers, time.perf_counter() - start
+
+
+async def runWithWorkers(args) -> tuple:
+    with launchWorkers(args.workers, args.port, not args.write_behind) as baseUrl:
+        await waitUntilHealthy(baseUrl, args.startup_timeout)
+        limits = httpx.Limits(max_connections=args.matches * args.scorers)
+        async with httpx.AsyncClient(base_url=baseUrl, limits=limits, timeout=60) as client:
+            matchIds = [await createMatch(client, index) for index in range(args.matches)]
+            ledgers, elapsed = await scoreAll([HttpScorer(client)], matchIds, args)
+            reopenProblems = await checkUndoAfterReopen(client, args.matches)
+    # The workers have flushed and exited; read what they left behind
+    from Database.mongoData import mongo
+    try:
+        return ledgers, elapsed, {matchId: await verifyMatch(matchId, ledgers[matchId]) for matchId in matchIds}, reopenProblems
+    finally:
+        await mongo.close()
+
+
+async def runWithEngines(args) -> tuple:
+    from Utils.liveMatchEngine import LiveMatchEngine
+    from constants import (
+        liveFlushIntervalSeconds, liveMatchIdleSeconds, scoreboardConflictRetries, scoreboardConflictBackoffMs, staleBallEventSeconds,
+    )
+
+    async with openClient("", True, args.matches) as client:
+        matchIds = [await createMatch(client, index) for index in range(args.matches)]
+        engines = [
+            LiveMatchEngine(
+                liveFlushIntervalSeconds, liveMatchIdleSeconds, not args.write_behind,
+                scoreboardConflictRetries, scoreboardConflictBackoffMs / 1000, staleBallEventSeconds,
+            )
+            for _ in range(args.engines)
+        ]
+        for engine in engines:
+            engine.start()
+        ledgers, elapsed = await scoreAll([EngineScorer(engine) for engine in engines], matchIds, args)
+        for engine in engines:
+            await engine.stop()
+        problems = {matchId: await verifyMatch(matchId, ledgers[matchId]) for matchId in matchIds}
+        return ledgers, elapsed, problems, await checkUndoAfterReopen(client, args.matches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that concurrent writers never lose or duplicate a delivery")
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes to start against MONGO_DB_URL")
+    parser.add_argument("--port", type=int, default=9100, help="port for the started workers")
+    parser.add_argument("--startup-timeout", type=float, default=30, help="seconds to wait for the workers' /health")
+    parser.add_argument("--engines", type=int, default=0, help="instead of workers, run this many live match engines in this process")
+    parser.add_argument("--mongomock", action="store_true", help="with --engines, use an in-memory mongomock database")
+    parser.add_argument("--write-behind", action="store_true", help="score with write-behind instead of LIVE_WRITE_THROUGH")
+    parser.add_argument("--matches", type=int, default=5)
+    parser.add_argument("--scorers", type=int, default=4, help="concurrent scorers per match")
+    parser.add_argument("--balls", type=int, default=25, help="deliveries posted by each scorer (keep scorers x balls within one innings)")
+    parser.add_argument("--undo-rate", type=float, default=0.05, help="chance a scorer undoes the last ball after a delivery")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="optional path to write the JSON result to")
+    args = parser.parse_args()
+    if args.mongomock and not args.engines:
+        parser.error("--mongomock only applies with --engines")
+    if args.mongomock:
+        useMongomock()
+
+    ledgers, elapsed, problems, reopenProblems = asyncio.run(runWithEngines(args) if args.engines else runWithWorkers(args))
+    acknowledged = sum(len(ledger["acknowledged"]) for ledger in ledgers.values())
+    result = {
+        "environment": environment(),
+        "config": {
+            "writers": f"{args.engines} engines in-process" if args.engines else f"{args.workers} uvicorn workers",
+            "database": "mongomock" if args.mongomock else "configured",
+            "mode": "write-behind" if args.write_behind else "write-through",
+            "matches": args.matches,
+            "scorersPerMatch": args.scorers,
+            "ballsPerScorer": args.balls,
+            "undoRate": args.undo_rate,
+            "seed": args.seed,
+        },
+        "acknowledged": acknowledged,
+        "undone": sum(len(ledger["undone"]) for ledger in ledgers.values()),
+        "conflicts": sum(ledger["conflicts"] for ledger in ledgers.values()),
+        "errors": sum(ledger["errors"] for ledger in ledgers.values()),
+        "elapsedSeconds": round(elapsed, 3),
+        "acknowledgedPerSecond": round(acknowledged / elapsed, 1) if elapsed > 0 else 0.0,
+        "problems": {matchId: found for matchId, found in problems.items() if found},
+        "reopenProblems": reopenProblems,
+    }
+    result["ok"] = not result["problems"] and not result["reopenProblems"] and not result["errors"]
+    payload = json.dumps(result, indent=2)
+    print(payload)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(payload)
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Load test and micro-benchmarks for the scoring hot path.
+
+The load test scores N matches concurrently through
+`POST /matches/{matchId}/ball` while M viewers poll
+`GET /matches/{matchId}/scoreboard` (with If-None-Match, like the UI), and
+reports throughput and p50/p95/p99 latency per endpoint. In-process runs
+also report requests per CPU second, i.e. per core. The micro-benchmarks
+time `updateScoreboardWithBall`, `buildInitialScoreboard`,
+`initializeScoreboardFromMatch`, the encoding of a scoreboard response and
+a `CompactBallLog` round trip in-process. The round trip must give back
+every `BallEvent` field, or the run fails.
+
+Run it against a live instance, or in-process against the Mongo configured
+in MONGO_DB_URL, or against mongomock (needs mongomock-motor installed):
+
+    python -m Benchmarks.scoringBenchmark --base-url http://localhost:9000 --matches 50 --viewers 200
+    python -m Benchmarks.scoringBenchmark --in-process --matches 20 --viewers 50 --micro
+    python -m Benchmarks.scoringBenchmark --in-process --mongomock --output bench.json
+
+The JSON result records the configuration, git revision and platform, so
+runs can be compared over time. Ball payloads are a fixed sequence, so two
+runs with the same options do the same work.
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from Benchmarks.ballLatencyBenchmark import buildMatchPayload, buildBallPayload, createMatch, summarize
+
+BALL_ENDPOINT = "POST /matches/{matchId}/ball"
+SCOREBOARD_ENDPOINT = "GET /matches/{matchId}/scoreboard"
+
+
+def useMongomock():
+    """Point the data layer at an in-memory mongomock database. Must run before the app is imported."""
+    try:
+        import mongomock.collection
+        import mongomock_motor
+    except ImportError:
+        raise SystemExit("--mongomock needs the mongomock-motor package")
+    import motor.motor_asyncio
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+    # mongomock's bulk API predates the `sort` argument newer pymongo passes to it
+    for name in ("add_update", "add_replace"):
+        original = getattr(mongomock.collection.BulkOperationBuilder, name)
+
+        def withoutSort(self, *args, sort=None, _original=original, **kwargs):
+            return _original(self, *args, **kwargs)
+
+        setattr(mongomock.collection.BulkOperationBuilder, name, withoutSort)
+
+    # and its create_indexes drops partialFilterExpression, which indexes on optional fields such as seq rely on
+    def createIndexes(self, indexes, session=None):
+        return [
+            self.create_index(
+                list(index.document["key"].items()), name=index.document.get("name"),
+                unique=index.document.get("unique", False), sparse=index.document.get("sparse", False),
+                expireAfterSeconds=index.document.get("expireAfterSeconds"),
+                partialFilterExpression=index.document.get("partialFilterExpression"),
+            )
+            for index in indexes
+        ]
+
+    mongomock.collection.Collection.create_indexes = createIndexes
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "gitRevision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+@contextlib.asynccontextmanager
+async def openClient(baseUrl: str, inProcess: bool, connections: int):
+    """An HTTP client for a running instance, or for the app in this process with its lifespan running."""
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    if not inProcess:
+        async with httpx.AsyncClient(base_url=baseUrl, limits=limits, timeout=60) as client:
+            yield client
+        return
+
+    from main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            yield client
+
+
+async def scoreMatch(client: httpx.AsyncClient, matchId: str, balls: int, interval: float, latencies: list) -> int:
+    errors = 0
+    for index in range(balls):
+        start = time.perf_counter()
+        response = await client.post(f"/matches/{matchId}/ball", json=buildBallPayload(index))
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200 or response.json().get("code") != 56:
+            errors += 1
+        # Always yield, so viewers get a turn even when the database never blocks (mongomock)
+        await asyncio.sleep(interval)
+    return errors
+
+
+async def pollScoreboards(client: httpx.AsyncClient, matchIds: list, interval: float, seed: int, done: asyncio.Event, latencies: list) -> dict:
+    """One viewer: poll random matches until scoring is done, revalidating with ETags."""
+    chooser = random.Random(seed)
+    etags = {}
+    counts = {"errors": 0, "notModified": 0}
+    while not done.is_set():
+        matchId = chooser.choice(matchIds)
+        headers = {"If-None-Match": etags[matchId]} if matchId in etags else {}
+        start = time.perf_counter()
+        response = await client.get(f"/matches/{matchId}/scoreboard", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code == 304:
+            counts["notModified"] += 1
+        elif response.status_code != 200 or response.json().get("code") != 44:
+            counts["errors"] += 1
+        elif "etag" in response.headers:
+            etags[matchId] = response.headers["etag"]
+        await asyncio.sleep(interval)
+    return counts
+
+
+async def runLoadTest(client: httpx.AsyncClient, matches: int, balls: int, viewers: int, ballInterval: float, pollInterval: float, seed: int, label: str) -> list:
+    matchIds = [await createMatch(client, index) for index in range(matches)]
+    ballLatencies = []
+    pollLatencies = []
+    done = asyncio.Event()
+
+    start = time.perf_counter()
+    pollers = [
+        asyncio.create_task(pollScoreboards(client, matchIds, pollInterval, seed + viewer, done, pollLatencies))
+        for viewer in range(viewers)
+    ]
+    scoringErrors = await asyncio.gather(*(scoreMatch(client, matchId, balls, ballInterval, ballLatencies) for matchId in matchIds))
+    elapsed = time.perf_counter() - start
+    done.set()
+    pollCounts = await asyncio.gather(*pollers)
+
+    results = [summarize(label, ballLatencies, elapsed, sum(scoringErrors), BALL_ENDPOINT)]
+    if viewers:
+        polls = summarize(label, pollLatencies, elapsed, sum(counts["errors"] for counts in pollCounts), SCOREBOARD_ENDPOINT)
+        polls["notModified"] = sum(counts["notModified"] for counts in pollCounts)
+        results.append(polls)
+    return results
+
+
+def timeCalls(name: str, function, iterations: int, rounds: int) -> dict:
+    """Per-call timings over `rounds` rounds of `iterations` calls each."""
+    perCall = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        perCall.append((time.perf_counter() - start) / iterations)
+    return microSummary(name, perCall, iterations, rounds)
+
+
+async def timeAsyncCalls(name: str, function, iterations: int, rounds: int) -> dict:
+    perCall = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await function()
+        perCall.append((time.perf_counter() - start) / iterations)
+    return microSummary(name, perCall, iterations, rounds)
+
+
+def microSummary(name: str, perCall: list, iterations: int, rounds: int) -> dict:
+    best = min(perCall)
+    return {
+        "name": name,
+        "iterations": iterations,
+        "rounds": rounds,
+        "perCallMicroseconds": {
+            "min": round(best * 1e6, 3),
+            "median": round(statistics.median(perCall) * 1e6, 3),
+            "mean": round(statistics.fmean(perCall) * 1e6, 3),
+        },
+        "callsPerSecond": round(1 / best, 1) if best > 0 else 0.0,
+    }
+
+
+def compactRoundTrip(balls: list) -> list:
+    """`balls` through a `CompactBallLog` and back; raises if any `BallEvent` field is lost on the way."""
+    from Models.compactBallModel import CompactBallLog
+
+    log = CompactBallLog()
+    for index, ball in enumerate(balls):
+        log.appendBallEvent(ball, innings=1, over=index // 6, ball=index % 6, eventIndex=index)
+    restored = list(log.toBallEvents())
+    for index, (ball, back) in enumerate(zip(balls, restored)):
+        if back != ball:
+            raise SystemExit(f"CompactBallLog round trip changed ball {index}: {ball!r} came back as {back!r}")
+    return restored
+
+
+async def runMicroBenchmarks(iterations: int, rounds: int) -> list:
+    from Models.ballModel import BallEvent
+    from Utils.scoreboardUtils import buildInitialScoreboard, initializeScoreboardFromMatch, updateScoreboardWithBall
+
+    match = buildMatchPayload(0)
+    match.update({
+        "id": "000000000000000000000000",
+        "openingPlayers": {"striker": "Striker", "nonStriker": "NonStriker", "bowler": "Bowler"},
+        "battingTeam": match["hostTeam"]["name"],
+        "bowlingTeam": match["visitorTeam"]["name"],
+    })
+    initial = buildInitialScoreboard(match)
+    balls = [BallEvent.model_validate(buildBallPayload(index)) for index in range(iterations)]
+
+    # Each round scores `iterations` deliveries into one match, like a live innings
+    perCall = []
+    for _ in range(rounds):
+        scoreboard = copy.deepcopy(initial)
+        start = time.perf_counter()
+        for ball in balls:
+            scoreboard = updateScoreboardWithBall(scoreboard, ball)
+        perCall.append((time.perf_counter() - start) / iterations)
+    summary = [microSummary("updateScoreboardWithBall", perCall, iterations, rounds)]
+
+    summary.append(timeCalls("buildInitialScoreboard", lambda: buildInitialScoreboard(match), iterations, rounds))
+
+    # One GET /matches/{matchId}/scoreboard body: FastAPI's default encoding, orjson, and a cached payload
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from Utils.payloadCache import CachedPayload, encodeResponse, payloadResponse
+    from Utils.utils import returnResponse
+    cached = CachedPayload(scoreboard.get("version"), float("inf"), encodeResponse(44, scoreboard), {"ETag": '"benchmark"'})
+    summary.append(timeCalls("scoreboardResponse.jsonableEncoder", lambda: JSONResponse(jsonable_encoder(returnResponse(44, result=scoreboard))), iterations, rounds))
+    summary.append(timeCalls("scoreboardResponse.orjson", lambda: payloadResponse(CachedPayload(None, 0, encodeResponse(44, scoreboard), {})), iterations, rounds))
+    summary.append(timeCalls("scoreboardResponse.cached", lambda: payloadResponse(cached), iterations, rounds))
+    # Every field a client can send, including seq and its absence, must survive the compact form
+    wicket = BallEvent(ballType="wicket", runs=0, isWicket=True, wicketType="caught", batsman="Striker", bowler="Bowler", newBatsman="Next")
+    varied = [
+        (wicket if index % 9 == 1 else ball).model_copy(update={"seq": index + 1 if index % 5 else None, "commentary": "edged" if index % 7 == 0 else None})
+        for index, ball in enumerate(balls)
+    ]
+    summary.append(timeCalls("compactBallLog.roundTrip", lambda: compactRoundTrip(varied), 1, rounds))
+    # Includes the scoreboard upsert, so it measures the configured database too
+    summary.append(await timeAsyncCalls("initializeScoreboardFromMatch", lambda: initializeScoreboardFromMatch(match), max(1, iterations // 10), rounds))
+    return summary
+
+
+async def runSuite(args) -> dict:
+    result = {
+        "label": args.label,
+        "environment": environment(),
+        "config": {
+            "target": "in-process" if args.in_process else args.base_url,
+            "database": "mongomock" if args.mongomock else ("configured" if args.in_process else "server"),
+            "matches": args.matches,
+            "ballsPerMatch": args.balls,
+            "viewers": args.viewers,
+            "ballIntervalSeconds": args.ball_interval,
+            "pollIntervalSeconds": args.poll_interval,
+            "seed": args.seed,
+        },
+    }
+    async with openClient(args.base_url, args.in_process, args.matches + args.viewers) as client:
+        if args.matches:
+            cpuStart = time.process_time()
+            result["endpoints"] = await runLoadTest(
+                client, args.matches, args.balls, args.viewers, args.ball_interval, args.poll_interval, args.seed, args.label,
+            )
+            if args.in_process:
+                # One event loop runs on one core, so requests per CPU second is requests per second per core.
+                # It includes the in-process client's own work, so it understates the server alone.
+                cpuSeconds = time.process_time() - cpuStart
+                requests = sum(endpoint["requests"] for endpoint in result["endpoints"])
+                result["cpu"] = {
+                    "processSeconds": round(cpuSeconds, 3),
+                    "requestsPerCpuSecond": round(requests / cpuSeconds, 1) if cpuSeconds > 0 else 0.0,
+                }
+        if args.micro:
+            result["micro"] = await runMicroBenchmarks(args.micro_iterations, args.micro_rounds)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring hot path load test and micro-benchmarks")
+    parser.add_argument("--base-url", default="http://localhost:9000", help="API to load, unless --in-process")
+    parser.add_argument("--in-process", action="store_true", help="run the app in this process instead of calling --base-url")
+    parser.add_argument("--mongomock", action="store_true", help="with --in-process, use an in-memory mongomock database")
+    parser.add_argument("--matches", type=int, default=20, help="matches scored concurrently (0 skips the load test)")
+    parser.add_argument("--balls", type=int, default=120, help="deliveries posted per match")
+    parser.add_argument("--viewers", type=int, default=50, help="concurrent scoreboard pollers")
+    parser.add_argument("--ball-interval", type=float, default=0.0, help="pause between deliveries of one match, seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="pause between polls of one viewer, seconds")
+    parser.add_argument("--micro", action="store_true", help="also run the micro-benchmarks (in this process)")
+    parser.add_argument("--micro-iterations", type=int, default=2000, help="calls per micro-benchmark round")
+    parser.add_argument("--micro-rounds", type=int, default=5, help="rounds per micro-benchmark")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the viewers' match choice")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--output", help="optional path to write the JSON result to")
+    args = parser.parse_args()
+    if args.mongomock and not args.in_process:
+        parser.error("--mongomock only applies with --in-process")
+    if args.mongomock:
+        useMongomock()
+
+    result = asyncio.run(runSuite(args))
+    payload = json.dumps(result, indent=2)
+    print(payload)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(payload)
+    failed = any(endpoint["errors"] for endpoint in result.get("endpoints", []))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Local multi-process harness for match-affinity sharding.
+
+Starts --nodes single-worker uvicorn processes on consecutive ports against
+the Mongo in MONGO_DB_URL, each with SHARD_SELF set to its own URL and
+LIVE_WRITE_THROUGH on, and scores --matches matches by sending every request
+to a randomly chosen node, as a plain load balancer would. Scoring runs in
+phases: a steady one, one during which --join more nodes are started, and
+one during which --leave of the original nodes are stopped, so matches
+change owner while they are being scored. Afterwards it reports:
+
+- per phase, which node served each request (X-Served-By) and how many were
+  served by the match's owner on the ring the nodes agreed on at its end,
+- how many matches changed owner at each change, against the share a
+  consistent hash ring should move,
+- the exactly-once check of Benchmarks/concurrencyStress for every match.
+
+    python -m Benchmarks.shardCluster --nodes 3 --join 1 --leave 1 --matches 30
+    python -m Benchmarks.shardCluster --nodes 4 --join 0 --leave 0 --mode redirect
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from Benchmarks.ballLatencyBenchmark import createMatch
+from Benchmarks.concurrencyStress import runScorer, verifyMatch, waitUntilHealthy
+from Benchmarks.scoringBenchmark import environment
+
+
+class Node:
+    """One uvicorn process taking part in the shard ring."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = None
+
+    def start(self, args):
+        env = dict(
+            os.environ, SHARD_SELF=self.url, SHARD_MODE=args.mode, LIVE_WRITE_THROUGH="true",
+            SHARD_HEARTBEAT_SECONDS=str(args.heartbeat), SHARD_MEMBER_TTL_SECONDS=str(args.heartbeat * 3),
+        )
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.port), "--log-level", "warning"]
+        self.process = subprocess.Popen(command, env=env)
+
+    def stop(self):
+        """SIGTERM lets the node leave the ring, flush and close before it exits."""
+        if self.process is None:
+            return
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.process = None
+
+
+class Cluster:
+    def __init__(self, args):
+        self.args = args
+        self.nextPort = args.port
+        self.live = []
+        self.stopped = []
+        self.clients = {}
+
+    async def startNodes(self, count: int) -> list:
+        nodes = []
+        for _ in range(count):
+            node = Node(self.nextPort)
+            self.nextPort += 1
+            node.start(self.args)
+            nodes.append(node)
+        for node in nodes:
+            await waitUntilHealthy(node.url, self.args.startup_timeout)
+            self.clients[node.url] = httpx.AsyncClient(base_url=node.url, timeout=60, follow_redirects=True)
+        self.live.extend(nodes)
+        await self.waitForRing()
+        return nodes
+
+    async def stopNodes(self, count: int) -> list:
+        leaving, self.live = self.live[:count], self.live[count:]
+        for node in leaving:
+            await asyncio.to_thread(node.stop)
+            await self.clients.pop(node.url).aclose()
+            self.stopped.append(node)
+        await self.waitForRing()
+        return leaving
+
+    def members(self) -> list:
+        return sorted(node.url for node in self.live)
+
+    async def waitForRing(self):
+        """Wait until every live node sees exactly the live nodes as members."""
+        deadline = time.monotonic() + self.args.startup_timeout
+        while True:
+            views = []
+            for node in self.live:
+                try:
+                    views.append((await self.clients[node.url].get("/shards")).json().get("members"))
+                except httpx.HTTPError:
+                    views.append(None)
+            if all(view == self.members() for view in views):
+                return
+            if time.monotonic() > deadline:
+                raise SystemExit(f"shard ring did not converge on {self.members()} within {self.args.startup_timeout}s: {views}")
+            await asyncio.sleep(self.args.heartbeat / 2)
+
+    def anyClient(self, chooser: random.Random) -> httpx.AsyncClient:
+        return self.clients[chooser.choice(self.live).url]
+
+    async def close(self):
+        for node in self.live:
+            await asyncio.to_thread(node.stop)
+        for client in self.clients.values():
+            await client.aclose()
+
+
+class ClusterScorer:
+    """Sends each request to a random live node and notes which node served it."""
+
+    def __init__(self, cluster: Cluster, chooser: random.Random, served: list):
+        self.cluster = cluster
+        self.chooser = chooser
+        self.served = served
+
+    async def _send(self, method: str, matchId: str, path: str, **kwargs):
+        response = await self.cluster.anyClient(self.chooser).request(method, path, **kwargs)
+        self.served.append((matchId, response.headers.get("x-served-by")))
+        return response.json()
+
+    async def recordBall(self, matchId: str, ball: dict):
+        body = await self._send("POST", matchId, f"/matches/{matchId}/ball", json=ball)
+        return body.get("code"), body.get("result")
+
+    async def undoLastBall(self, matchId: str):
+        body = await self._send("DELETE", matchId, f"/matches/{matchId}/ball/last")
+        return body.get("code"), (body.get("result") or {}).get("ball")
+
+
+def ownership(matchIds: list, members: list) -> dict:
+    from Utils.matchSharding import HashRing
+    from constants import shardVirtualNodes
+    ring = HashRing(members, shardVirtualNodes)
+    return {matchId: ring.owner(matchId) for matchId in matchIds}
+
+
+async def runPhase(cluster: Cluster, number: int, matchIds: list, ledgers: dict, change=None) -> dict:
+    """Score every match for one phase while `change` (if any) alters the membership."""
+    args = cluster.args
+    served = []
+    tasks = []
+    for matchNumber, matchId in enumerate(matchIds):
+        for scorerNumber in range(args.scorers):
+            seed = args.seed * 1_000_003 + number * 100_000 + matchNumber * 1000 + scorerNumber
+            scorer = ClusterScorer(cluster, random.Random(seed), served)
+            tasks.append(runScorer(scorer, matchId, f"p{number}s{scorerNumber}", args.balls, args.undo_rate, seed, ledgers[matchId]))
+
+    membersBefore = cluster.members()
+    before = ownership(matchIds, membersBefore)
+    start = time.perf_counter()
+    scoring = asyncio.gather(*tasks)
+    changed = None
+    if change is not None:
+        await asyncio.sleep(args.change_delay)
+        changed = [node.url for node in await change()]
+    await scoring
+    elapsed = time.perf_counter() - start
+
+    after = ownership(matchIds, cluster.members())
+    perNode = {}
+    for _, node in served:
+        perNode[node] = perNode.get(node, 0) + 1
+    phase = {
+        "members": cluster.members(),
+        "requests": len(served),
+        "servedByOwner": sum(1 for matchId, node in served if node == after[matchId]),
+        "servedPerNode": perNode,
+        "elapsedSeconds": round(elapsed, 3),
+    }
+    if change is not None:
+        moved = sum(1 for matchId in matchIds if before[matchId] != after[matchId])
+        phase["changedNodes"] = changed
+        phase["matchesMoved"] = moved
+        # A consistent hash ring moves only the share of the nodes that came or went
+        phase["expectedMoved"] = round(len(matchIds) * len(changed) / max(len(membersBefore), len(cluster.members())), 1)
+    return phase
+
+
+async def runCluster(args) -> dict:
+    cluster = Cluster(args)
+    try:
+        await cluster.startNodes(args.nodes)
+        chooser = random.Random(args.seed)
+        matchIds = [await createMatch(cluster.anyClient(chooser), index) for index in range(args.matches)]
+        ledgers = {matchId: {"acknowledged": {}, "undone": [], "conflicts": 0, "errors": 0} for matchId in matchIds}
+
+        phases = {"steady": await runPhase(cluster, 0, matchIds, ledgers)}
+        if args.join:
+            phases["join"] = await runPhase(cluster, 1, matchIds, ledgers, lambda: cluster.startNodes(args.join))
+        if args.leave:
+            phases["leave"] = await runPhase(cluster, 2, matchIds, ledgers, lambda: cluster.stopNodes(args.leave))
+    finally:
+        await cluster.close()
+
+    # Every node has flushed and exited; read what they left behind
+    from Database.mongoData import mongo
+    try:
+        problems = {matchId: await verifyMatch(matchId, ledgers[matchId]) for matchId in matchIds}
+    finally:
+        await mongo.close()
+    return {"ledgers": ledgers, "phases": phases, "problems": problems}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score matches across a local shard ring while nodes join and leave")
+    parser.add_argument("--nodes", type=int, default=3, help="nodes to start with")
+    parser.add_argument("--join", type=int, default=1, help="nodes started during the second phase")
+    parser.add_argument("--leave", type=int, default=1, help="original nodes stopped during the third phase")
+    parser.add_argument("--port", type=int, default=9200, help="port of the first node; the others follow")
+    parser.add_argument("--mode", choices=["forward", "redirect"], default="forward")
+    parser.add_argument("--heartbeat", type=float, default=0.5, help="SHARD_HEARTBEAT_SECONDS for the nodes")
+    parser.add_argument("--change-delay", type=float, default=1.0, help="seconds into a phase before nodes join or leave")
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--matches", type=int, default=20)
+    parser.add_argument("--scorers", type=int, default=2, help="concurrent scorers per match")
+    parser.add_argument("--balls", type=int, default=15, help="deliveries per scorer and phase (keep the total within one innings)")
+    parser.add_argument("--undo-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="optional path to write the JSON result to")
+    args = parser.parse_args()
+    if args.leave > args.nodes + args.join - 1:
+        parser.error("--leave must leave at least one node running")
+
+    outcome = asyncio.run(runCluster(args))
+    ledgers = outcome["ledgers"].values()
+    result = {
+        "environment": environment(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "phases": outcome["phases"],
+        "acknowledged": sum(len(ledger["acknowledged"]) for ledger in ledgers),
+        "undone": sum(len(ledger["undone"]) for ledger in ledgers),
+        "conflicts": sum(ledger["conflicts"] for ledger in ledgers),
+        "errors": sum(ledger["errors"] for ledger in ledgers),
+        "problems": {matchId: found for matchId, found in outcome["problems"].items() if found},
+    }
+    result["ok"] = not result["problems"] and not result["errors"]
+    payload = json.dumps(result, indent=2)
+    print(payload)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(payload)
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
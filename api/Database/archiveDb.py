@@ -0,0 +1,31 @@
+# Database/archiveDb.py
+"""
+One document per archived match, holding the compressed blob built by
+Utils/matchArchive.py.
+"""
+from Database.mongoData import matchArchivesCollection
+from Utils.metrics import instrumentDbModule
+
+def buildMatchArchiveQuery(matchId: str) -> dict:
+    return {"matchId": matchId}
+
+async def upsertMatchArchiveToDb(archive: dict):
+    return await matchArchivesCollection.replace_one(buildMatchArchiveQuery(archive["matchId"]), archive, upsert=True)
+
+async def getMatchArchiveFromDb(matchId: str):
+    return await matchArchivesCollection.find_one(buildMatchArchiveQuery(matchId), {"_id": 0})
+
+async def getArchivedMatchIdsFromDb():
+    cursor = matchArchivesCollection.find({}, {"_id": 0, "matchId": 1})
+    return [archive["matchId"] async for archive in cursor]
+
+async def streamMatchArchivesFromDb(batchSize: int = 20):
+    """Every archive with its blob, a few at a time, for bulk jobs."""
+    async for archive in matchArchivesCollection.find({}, {"_id": 0}).batch_size(batchSize):
+        yield archive
+
+async def deleteMatchArchiveFromDb(matchId: str):
+    return await matchArchivesCollection.delete_one(buildMatchArchiveQuery(matchId))
+
+
+instrumentDbModule(globals())
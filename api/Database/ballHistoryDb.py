@@ -0,0 +1,51 @@
+# Database/ballHistoryDb.py
+"""
+Ball history stored as one bucket document per (matchId, innings, over),
+so no single document grows with the length of the match.
+"""
+from pymongo import ASCENDING, UpdateOne
+from Database.mongoData import ballHistoryCollection
+from Utils.metrics import instrumentDbModule
+
+BALL_HISTORY_ORDER = [("over", ASCENDING)]
+
+def buildBallHistoryPageQuery(matchId: str, innings: int, afterOver: int = None) -> dict:
+    query = {"matchId": matchId, "innings": innings}
+    if afterOver is not None:
+        query["over"] = {"$gt": afterOver}
+    return query
+
+async def pushBallHistoryToDb(matchId: str, entries: list, unique: bool = False):
+    """
+    Append `(innings, over, ball)` entries to their buckets, in order. With
+    `unique`, entries already in the bucket are skipped, so replaying a batch
+    is harmless as long as each entry is distinguishable (e.g. by eventIndex).
+    """
+    operator = "$addToSet" if unique else "$push"
+    grouped = {}
+    for innings, over, ball in entries:
+        grouped.setdefault((innings, over), []).append(ball)
+    operations = [
+        UpdateOne({"matchId": matchId, "innings": innings, "over": over}, {operator: {"balls": {"$each": balls}}}, upsert=True)
+        for (innings, over), balls in grouped.items()
+    ]
+    if operations:
+        return await ballHistoryCollection.bulk_write(operations, ordered=True)
+
+async def popBallHistoryFromDb(matchId: str, innings: int, over: int):
+    return await ballHistoryCollection.update_one({"matchId": matchId, "innings": innings, "over": over}, {"$pop": {"balls": 1}})
+
+async def pullBallHistoryFromDb(matchId: str, innings: int, over: int, eventIndex: int):
+    """Remove the entry of one ball, wherever it sits in its bucket."""
+    return await ballHistoryCollection.update_one({"matchId": matchId, "innings": innings, "over": over}, {"$pull": {"balls": {"eventIndex": eventIndex}}})
+
+async def getBallHistoryPageFromDb(matchId: str, innings: int, afterOver: int = None, limit: int = 10):
+    query = buildBallHistoryPageQuery(matchId, innings, afterOver)
+    cursor = ballHistoryCollection.find(query, {"_id": 0}).sort(BALL_HISTORY_ORDER).limit(limit)
+    return await cursor.to_list(length=limit)
+
+async def deleteBallHistoryFromDb(matchId: str):
+    return await ballHistoryCollection.delete_many({"matchId": matchId})
+
+
+instrumentDbModule(globals())
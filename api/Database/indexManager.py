@@ -0,0 +1,178 @@
+# Database/indexManager.py
+"""
+Declares the indexes every collection needs, creates them idempotently at
+startup, and can explain each DB helper's query to flag collection scans.
+
+    python -m Database.indexManager --create
+    python -m Database.indexManager --explain
+"""
+import argparse
+import asyncio
+import json
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from yensiAuthentication import logger
+from Database.mongoData import matchesCollection, playersCollection, scoreboardsCollection, ballsCollection, snapshotsCollection, ballHistoryCollection, playerStatsCollection, matchArchivesCollection, shardMembersCollection
+from Database.matchDb import (
+    matchCache, buildMatchListQuery, buildBallQuery, buildBallsForReplayQuery, buildBallEventAtQuery, buildBallsBySeqQuery,
+    buildMatchBallsQuery, buildBallsOfOverQuery, MATCH_PAGE_ORDER, BALL_EVENT_ORDER, BALLS_BY_SEQ_ORDER, BALLS_BY_OVER_ORDER, LIVE_BALLS_QUERY,
+)
+from Database.scoreboardDb import scoreboardCache
+from Database.snapshotDb import buildLatestSnapshotQuery, LATEST_SNAPSHOT_ORDER
+from Database.ballHistoryDb import buildBallHistoryPageQuery, BALL_HISTORY_ORDER
+from Database.playerCreateDb import buildPlayerQuery
+from Database.playerStatsDb import buildPlayerStatsQuery
+from Database.archiveDb import buildMatchArchiveQuery
+from Database.shardMembersDb import buildLiveShardMembersQuery
+
+REQUIRED_INDEXES = [
+    (matchesCollection, [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("id", DESCENDING)], name="id_desc"),
+        IndexModel([("status", ASCENDING), ("id", DESCENDING)], name="status_id"),
+        IndexModel([("hostTeam.name", ASCENDING), ("id", DESCENDING)], name="hostTeam_id"),
+        IndexModel([("visitorTeam.name", ASCENDING), ("id", DESCENDING)], name="visitorTeam_id"),
+    ]),
+    (playersCollection, [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ]),
+    (scoreboardsCollection, [
+        IndexModel([("matchId", ASCENDING)], name="matchId_unique", unique=True),
+    ]),
+    (ballsCollection, [
+        IndexModel([("matchId", ASCENDING), ("innings", ASCENDING), ("over", ASCENDING), ("ball", ASCENDING)], name="matchId_innings_over_ball"),
+        # Balls recorded before event numbering have no eventIndex and are left out.
+        IndexModel(
+            [("matchId", ASCENDING), ("eventIndex", ASCENDING)], name="matchId_eventIndex_unique", unique=True,
+            partialFilterExpression={"eventIndex": {"$exists": True}},
+        ),
+        # Client sequence numbers are optional; balls sent without one store null and are left out.
+        IndexModel(
+            [("matchId", ASCENDING), ("innings", ASCENDING), ("seq", ASCENDING)], name="matchId_innings_seq_unique", unique=True,
+            partialFilterExpression={"seq": {"$gt": 0}},
+        ),
+    ]),
+    (snapshotsCollection, [
+        IndexModel([("matchId", ASCENDING), ("eventCount", DESCENDING)], name="matchId_eventCount_unique", unique=True),
+    ]),
+    (ballHistoryCollection, [
+        IndexModel([("matchId", ASCENDING), ("innings", ASCENDING), ("over", ASCENDING)], name="matchId_innings_over_unique", unique=True),
+    ]),
+    (playerStatsCollection, [
+        IndexModel([("playerName", ASCENDING)], name="playerName_unique", unique=True),
+    ]),
+    (matchArchivesCollection, [
+        IndexModel([("matchId", ASCENDING)], name="matchId_unique", unique=True),
+    ]),
+    (shardMembersCollection, [
+        IndexModel([("nodeId", ASCENDING)], name="nodeId_unique", unique=True),
+        # Nodes that died without deregistering are long out of the ring by then
+        IndexModel([("lastSeen", ASCENDING)], name="lastSeen_ttl", expireAfterSeconds=86400),
+    ]),
+]
+
+SAMPLE_ID = "000000000000000000000000"
+
+# (helper, collection, filter, sort) for the query each DB helper issues on a hot path. Filters and
+# sorts come from the same builders and constants the helpers use, so the plans cannot drift from them.
+# Match and scoreboard reads are the key lookups their read-through caches serve.
+QUERY_PLANS = [
+    ("matchDb.getMatchFromDb", matchesCollection, {matchCache.keyField: SAMPLE_ID}, None),
+    ("matchDb.getMatchPageFromDb", matchesCollection, buildMatchListQuery(SAMPLE_ID, None, None, None, None), MATCH_PAGE_ORDER),
+    ("matchDb.getMatchPageFromDb(status)", matchesCollection, buildMatchListQuery(None, "completed", None, None, None), MATCH_PAGE_ORDER),
+    ("matchDb.getMatchPageFromDb(active)", matchesCollection, buildMatchListQuery(None, "active", None, None, None), MATCH_PAGE_ORDER),
+    ("matchDb.getMatchPageFromDb(team)", matchesCollection, buildMatchListQuery(None, None, "Team", None, None), MATCH_PAGE_ORDER),
+    ("matchDb.getBallEventPageFromDb", ballsCollection, buildBallQuery(SAMPLE_ID, 1, 0, 5, None), BALL_EVENT_ORDER),
+    ("matchDb.getBallEventsForReplay", ballsCollection, buildBallsForReplayQuery(SAMPLE_ID, fromEventIndex=0), BALL_EVENT_ORDER),
+    ("matchDb.getBallEventsForReplay(asOf)", ballsCollection, buildBallsForReplayQuery(SAMPLE_ID, 0, 1, 5), BALL_EVENT_ORDER),
+    ("matchDb.getBallEventFromDb(undo)", ballsCollection, buildBallEventAtQuery(SAMPLE_ID, 0, undone=False), None),
+    ("matchDb.getBallEventFromDb(redo)", ballsCollection, buildBallEventAtQuery(SAMPLE_ID, 0, undone=True), None),
+    ("matchDb.getBallEventsBySeqFromDb", ballsCollection, buildBallsBySeqQuery(SAMPLE_ID, 1, [1]), BALLS_BY_SEQ_ORDER),
+    ("matchDb.countBallEventsByMatch", ballsCollection, buildMatchBallsQuery(SAMPLE_ID), None),
+    ("matchDb.getBallEventsByOverFromDb", ballsCollection, buildBallsOfOverQuery(SAMPLE_ID, 1, 0), None),
+    ("matchDb.streamAllBallEventsFromDb", ballsCollection, LIVE_BALLS_QUERY, BALLS_BY_OVER_ORDER),
+    ("playerCreateDb.getPlayerFromDb", playersCollection, buildPlayerQuery(SAMPLE_ID), None),
+    ("scoreboardDb.getScoreboardFromDb", scoreboardsCollection, {scoreboardCache.keyField: SAMPLE_ID}, None),
+    ("snapshotDb.getLatestSnapshotFromDb", snapshotsCollection, buildLatestSnapshotQuery(SAMPLE_ID), LATEST_SNAPSHOT_ORDER),
+    ("snapshotDb.getLatestSnapshotFromDb(asOf)", snapshotsCollection, buildLatestSnapshotQuery(SAMPLE_ID, 1, 5), LATEST_SNAPSHOT_ORDER),
+    ("playerStatsDb.getPlayerStatsFromDb", playerStatsCollection, buildPlayerStatsQuery("Player"), None),
+    ("archiveDb.getMatchArchiveFromDb", matchArchivesCollection, buildMatchArchiveQuery(SAMPLE_ID), None),
+    ("ballHistoryDb.getBallHistoryPageFromDb", ballHistoryCollection, buildBallHistoryPageQuery(SAMPLE_ID, 1, 0), BALL_HISTORY_ORDER),
+    ("shardMembersDb.getLiveShardMembersFromDb", shardMembersCollection, buildLiveShardMembersQuery(60), None),
+]
+
+
+async def ensureIndexes() -> dict:
+    """
+    Create every declared index. Existing indexes are left alone, so this is
+    safe to run on every start. A collection whose indexes cannot be built
+    (e.g. duplicates block a unique index) is logged and skipped.
+    """
+    report = {}
+    for collection, indexes in REQUIRED_INDEXES:
+        try:
+            report[collection.name] = await collection.create_indexes(indexes)
+        except PyMongoError as e:
+            logger.error(f"Could not create indexes on {collection.name}: {e}")
+            report[collection.name] = {"error": str(e)}
+    logger.info(f"Index bootstrap complete: {report}")
+    return report
+
+
+def planStages(plan) -> set:
+    """All stage names anywhere in an explain plan."""
+    stages = set()
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.add(plan["stage"])
+        for value in plan.values():
+            stages |= planStages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            stages |= planStages(item)
+    return stages
+
+
+async def explainQueries() -> list:
+    results = []
+    for helper, collection, query, sort in QUERY_PLANS:
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = planStages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        results.append({
+            "helper": helper,
+            "collection": collection.name,
+            "stages": sorted(stages),
+            "collscan": "COLLSCAN" in stages,
+        })
+        if "COLLSCAN" in stages:
+            logger.warning(f"COLLSCAN in {helper} on {collection.name}")
+    return results
+
+
+async def runCli(create: bool, explain: bool):
+    output = {}
+    if create:
+        output["indexes"] = await ensureIndexes()
+    if explain:
+        output["plans"] = await explainQueries()
+    print(json.dumps(output, indent=2, default=str))
+    return not any(plan["collscan"] for plan in output.get("plans", []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create required indexes and check query plans")
+    parser.add_argument("--create", action="store_true", help="create the declared indexes")
+    parser.add_argument("--explain", action="store_true", help="explain each helper query and flag COLLSCAN")
+    args = parser.parse_args()
+    if not (args.create or args.explain):
+        parser.error("nothing to do: pass --create and/or --explain")
+    ok = asyncio.run(runCli(args.create, args.explain))
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
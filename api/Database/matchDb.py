@@ -1,21 +1,193 @@
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
 from Database.mongoData import matchesCollection,ballsCollection
-def insertMatchToDb(matchData: dict):
-    return matchesCollection.insert_one(matchData)
+from Database.readCache import ReadThroughCache
+from Utils.metrics import instrumentDbModule
+from constants import matchCacheSize, matchCacheTtlSeconds
 
-def getMatchFromDb(query: dict):
-    return matchesCollection.find_one(query, {"_id": 0})
+# Match config (teams, settings, overs) rarely changes mid-game, but is read on every view
+matchCache = ReadThroughCache("match", "id", matchCacheSize, matchCacheTtlSeconds)
 
-def getAllMatchesFromDb(query: dict = {}):
-    return matchesCollection.find(query, {"_id": 0})
+# Filters and sort orders below are shared with Database/indexManager.py, which explains them at startup
+MATCH_PAGE_ORDER = [("id", DESCENDING)]
+BALL_EVENT_ORDER = [("eventIndex", ASCENDING), ("_id", ASCENDING)]
+BALLS_BY_SEQ_ORDER = [("seq", ASCENDING)]
+BALLS_BY_OVER_ORDER = [("matchId", ASCENDING), ("innings", ASCENDING), ("over", ASCENDING), ("ball", ASCENDING)]
+LIVE_BALLS_QUERY = {"undone": {"$ne": True}}
 
-def updateMatchInDb(query: dict, updateData: dict):
-    return matchesCollection.update_one(query, {"$set": updateData})
+MATCH_SUMMARY_PROJECTION = {
+    "_id": 0, "id": 1, "hostTeam.name": 1, "visitorTeam.name": 1, "tossWonBy": 1, "optedTo": 1, "overs": 1,
+    "status": 1, "currentInnings": 1, "battingTeam": 1, "bowlingTeam": 1, "createdAt": 1, "lastUpdated": 1,
+}
 
-def deleteMatchFromDb(query: dict):
-    return matchesCollection.delete_one(query)
+def buildMatchListQuery(cursor: Optional[str], status: Optional[str], team: Optional[str], fromDate: Optional[datetime], toDate: Optional[datetime]) -> dict:
+    # Match ids are ObjectIds, so the creation-date range is an `id` range on the same index as the cursor.
+    idRange = {}
+    if cursor:
+        idRange["$lt"] = cursor
+    if fromDate:
+        idRange["$gte"] = str(ObjectId.from_datetime(fromDate))
+    if toDate:
+        upper = str(ObjectId.from_datetime(toDate))
+        idRange["$lt"] = min(idRange.get("$lt", upper), upper)
 
+    query = {}
+    if idRange:
+        query["id"] = idRange
+    if status == "active":
+        # Older matches were stored without an explicit status
+        query["status"] = {"$in": ["active", None]}
+    elif status:
+        query["status"] = status
+    if team:
+        query["$or"] = [{"hostTeam.name": team}, {"visitorTeam.name": team}]
+    return query
 
-def insertBallEventToDb(event: dict):
-    return ballsCollection.insert_one(event)
-def getBallEventsByMatch(matchId: str):
-    return list(ballsCollection.find({"matchId": matchId}, {"_id": 0}))
\ No newline at end of file
+def buildBallQuery(matchId: str, innings: Optional[int], fromOver: Optional[int], toOver: Optional[int], cursor: Optional[int]) -> dict:
+    query = {"matchId": matchId, **LIVE_BALLS_QUERY}
+    if innings is not None:
+        query["innings"] = innings
+    overRange = {}
+    if fromOver is not None:
+        overRange["$gte"] = fromOver
+    if toOver is not None:
+        overRange["$lte"] = toOver
+    if overRange:
+        query["over"] = overRange
+    if cursor is not None:
+        query["eventIndex"] = {"$gt": cursor}
+    return query
+
+def buildMatchBallsQuery(matchId: str) -> dict:
+    return {"matchId": matchId, **LIVE_BALLS_QUERY}
+
+def buildBallEventAtQuery(matchId: str, eventIndex: int, undone: bool) -> dict:
+    """The ball event at `eventIndex`, either the live one or the undone one waiting to be redone."""
+    return {"matchId": matchId, "eventIndex": eventIndex, "undone": True if undone else {"$ne": True}}
+
+def buildBallsBySeqQuery(matchId: str, innings: int, seqs: list) -> dict:
+    return {"matchId": matchId, "innings": innings, "seq": {"$in": seqs}}
+
+def buildBallsForReplayQuery(matchId: str, fromEventIndex: int = None, innings: int = None, over: int = None) -> dict:
+    conditions = [buildMatchBallsQuery(matchId)]
+    if fromEventIndex is not None:
+        conditions.append({"eventIndex": {"$gte": fromEventIndex}})
+    if innings is not None:
+        conditions.append({"$or": [{"innings": {"$lt": innings}}, {"innings": innings, "over": {"$lt": over}}]})
+    return {"$and": conditions}
+
+def buildBallsOfOverQuery(matchId: str, innings: int, over: int) -> dict:
+    return {"matchId": matchId, "innings": innings, "over": over, **LIVE_BALLS_QUERY}
+
+
+async def insertMatchToDb(matchData: dict):
+    return await matchesCollection.insert_one(matchData)
+
+async def insertMatchesToDb(matches: list):
+    return await matchesCollection.insert_many(matches, ordered=False)
+
+async def getMatchFromDb(query: dict):
+    return await matchesCollection.find_one(query, {"_id": 0})
+
+async def getAllMatchesFromDb(query: dict = {}):
+    return await matchesCollection.find(query, {"_id": 0}).to_list(length=None)
+
+async def getMatchPageFromDb(query: dict, limit: int, projection: dict = None):
+    """One page of matches, newest first. Keyset pagination is on `id`, which is time-ordered."""
+    cursor = matchesCollection.find(query, projection or {"_id": 0}).sort(MATCH_PAGE_ORDER).limit(limit)
+    return await cursor.to_list(length=limit)
+
+async def updateMatchInDb(query: dict, updateData: dict):
+    return await matchesCollection.update_one(query, {"$set": updateData})
+
+async def deleteMatchFromDb(query: dict):
+    return await matchesCollection.delete_one(query)
+
+
+async def insertBallEventToDb(event: dict):
+    return await ballsCollection.insert_one(event)
+
+async def insertBallEventsToDb(events: list, ordered: bool = True):
+    return await ballsCollection.insert_many(events, ordered=ordered)
+
+async def getBallEventsByMatch(matchId: str):
+    return await ballsCollection.find(buildMatchBallsQuery(matchId), {"_id": 0, "undo": 0}).to_list(length=None)
+
+def _ballEventsCursor(query: dict, limit: int = 0):
+    return ballsCollection.find(query, {"_id": 0, "undo": 0}).sort(BALL_EVENT_ORDER).limit(limit)
+
+async def getBallEventPageFromDb(query: dict, limit: int):
+    return await _ballEventsCursor(query, limit).to_list(length=limit)
+
+async def streamBallEventsFromDb(query: dict, limit: int = 0):
+    """Yield ball events straight off the cursor, one batch in memory at a time."""
+    async for event in _ballEventsCursor(query, limit).batch_size(500):
+        yield event
+
+async def getBallEventFromDb(query: dict, projection: dict = {"_id": 0}):
+    return await ballsCollection.find_one(query, projection)
+
+async def updateBallEventInDb(query: dict, updateData: dict):
+    return await ballsCollection.update_one(query, {"$set": updateData})
+
+async def deleteBallEventsFromDb(query: dict):
+    return await ballsCollection.delete_many(query)
+
+async def countBallEventsByMatch(matchId: str):
+    return await ballsCollection.count_documents(buildMatchBallsQuery(matchId))
+
+async def getNextEventIndexFromDb(matchId: str) -> int:
+    """One past the highest eventIndex stored for a match, undone balls included."""
+    event = await ballsCollection.find_one(
+        {"matchId": matchId, "eventIndex": {"$exists": True}}, {"_id": 0, "eventIndex": 1}, sort=[("eventIndex", DESCENDING)],
+    )
+    return event["eventIndex"] + 1 if event else 0
+
+async def getBallEventKeysFromDb(query: dict):
+    """`_id`, eventIndex and flagVersion of the matching ball events, without their payload."""
+    cursor = ballsCollection.find(query, {"eventIndex": 1, "flagVersion": 1})
+    return await cursor.to_list(length=None)
+
+async def getBallEventsBySeqFromDb(matchId: str, innings: int, seqs: list):
+    query = buildBallsBySeqQuery(matchId, innings, seqs)
+    return await ballsCollection.find(query, {"_id": 0, "undo": 0}).sort(BALLS_BY_SEQ_ORDER).to_list(length=None)
+
+async def getBallEventsForReplay(matchId: str, fromEventIndex: int = None, innings: int = None, over: int = None):
+    """
+    Ball events of a match in delivery order, optionally starting at
+    `fromEventIndex` and stopping before `over` of `innings`.
+    """
+    query = buildBallsForReplayQuery(matchId, fromEventIndex, innings, over)
+    cursor = ballsCollection.find(query, {"_id": 0, "undo": 0}).sort(BALL_EVENT_ORDER)
+    return await cursor.to_list(length=None)
+
+async def getBallEventsByOverFromDb(matchId: str, innings: int, over: int):
+    query = buildBallsOfOverQuery(matchId, innings, over)
+    return await ballsCollection.find(query, {"_id": 0, "undo": 0}).to_list(length=None)
+
+async def streamAllBallEventsFromDb(batchSize: int = 1000):
+    """Every live ball event grouped by match, innings and over, for bulk jobs."""
+    cursor = ballsCollection.find(LIVE_BALLS_QUERY, {"_id": 0, "undo": 0, "commentary": 0})
+    cursor = cursor.sort(BALLS_BY_OVER_ORDER)
+    async for event in cursor.batch_size(batchSize):
+        yield event
+
+ANALYTICS_PROJECTION = {"_id": 0, "innings": 1, "over": 1, "ballType": 1, "runs": 1, "isWicket": 1, "batsman": 1, "eventIndex": 1}
+
+async def getBallColumnsFromDb(matchId: str):
+    """Only the fields analytics needs, in delivery order."""
+    cursor = ballsCollection.find(buildMatchBallsQuery(matchId), ANALYTICS_PROJECTION)
+    return await cursor.sort(BALL_EVENT_ORDER).to_list(length=None)
+
+async def getMatchBallDocumentsFromDb(matchId: str):
+    """Every stored ball document of a match, undone ones included, for archiving."""
+    cursor = ballsCollection.find({"matchId": matchId}, {"_id": 0}).sort(BALL_EVENT_ORDER)
+    return await cursor.to_list(length=None)
+
+
+instrumentDbModule(globals())
+getMatchFromDb = matchCache.readThrough(getMatchFromDb)
+updateMatchInDb = matchCache.invalidatedBy(updateMatchInDb)
+deleteMatchFromDb = matchCache.invalidatedBy(deleteMatchFromDb)
@@ -1,8 +1,217 @@
-from pymongo import MongoClient
-from constants import mongoUrl,mongoDatabase,mongoMatchesCollection,mongoPlayersCollection,mongoscoreboardsCollection,mongoballsCollection
-client = MongoClient(mongoUrl)
-db = client[mongoDatabase]
-matchesCollection = db[mongoMatchesCollection]
-playersCollection = db[mongoPlayersCollection]
-scoreboardsCollection = db[mongoscoreboardsCollection]
-ballsCollection = db[mongoballsCollection]
+# Database/mongoData.py
+"""
+The process-wide Mongo connection manager and the collections built on it.
+
+The client is created on first use, or by `mongo.connect()` in the FastAPI
+lifespan, never at import, so importing the Database layer does no I/O.
+Pool size and timeouts come from the MONGO_* settings in constants.py. The
+collection names below are handles that resolve to the current client on
+every call, so modules can keep importing them at module level.
+
+On shutdown `mongo.close()` waits (up to MONGO_DRAIN_SECONDS) for
+connections that are still checked out before closing the pool. Pool
+utilisation and check-out wait times are exported at /metrics and returned
+by `mongo.poolStats()`.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+import motor.motor_asyncio
+from pymongo import monitoring
+from yensiAuthentication import logger
+from Utils.metrics import mongoPoolConnections, mongoPoolCheckoutWait, mongoPoolCheckoutFailures
+from constants import (
+    mongoUrl, mongoDatabase, mongoMatchesCollection, mongoPlayersCollection, mongoscoreboardsCollection, mongoballsCollection,
+    mongoSnapshotsCollection, mongoBallHistoryCollection, mongoPlayerStatsCollection, mongoMatchArchivesCollection,
+    mongoShardMembersCollection,
+    mongoMaxPoolSize, mongoMinPoolSize, mongoMaxIdleTimeMs, mongoWaitQueueTimeoutMs, mongoConnectTimeoutMs,
+    mongoServerSelectionTimeoutMs, mongoHealthTimeoutSeconds, mongoDrainSeconds,
+)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts pool connections and check-outs. Events arrive on driver threads, hence the lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = 0
+        self.inUse = 0
+        self.checkOuts = 0
+        self.checkOutFailures = 0
+        self.waitSecondsTotal = 0.0
+        self.waitSecondsMax = 0.0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "open": self.open,
+                "inUse": self.inUse,
+                "checkOuts": self.checkOuts,
+                "checkOutFailures": self.checkOutFailures,
+                "averageWaitMs": round(self.waitSecondsTotal / self.checkOuts * 1000, 3) if self.checkOuts else 0.0,
+                "maxWaitMs": round(self.waitSecondsMax * 1000, 3),
+            }
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open -= 1
+
+    def connection_checked_out(self, event):
+        wait = event.duration or 0.0
+        with self.lock:
+            self.inUse += 1
+            self.checkOuts += 1
+            self.waitSecondsTotal += wait
+            self.waitSecondsMax = max(self.waitSecondsMax, wait)
+        mongoPoolCheckoutWait.observe(wait)
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.inUse -= 1
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.checkOutFailures += 1
+        mongoPoolCheckoutFailures.labels(str(event.reason)).inc()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+class MongoConnectionManager:
+    def __init__(self, url: str, databaseName: str, drainSeconds: float, healthTimeoutSeconds: float, **clientOptions):
+        self.url = url
+        self.databaseName = databaseName
+        self.drainSeconds = drainSeconds
+        self.healthTimeoutSeconds = healthTimeoutSeconds
+        self.clientOptions = clientOptions
+        self.poolListener = PoolStatsListener()
+        self._client = None
+        self._collections: Dict[str, object] = {}
+
+    @property
+    def client(self):
+        """The shared Motor client, created on first use. Creating it does not connect."""
+        if self._client is None:
+            self._client = motor.motor_asyncio.AsyncIOMotorClient(
+                self.url, event_listeners=[self.poolListener], **self.clientOptions,
+            )
+            options = ", ".join(f"{name}={value}" for name, value in self.clientOptions.items())
+            logger.info(f"Mongo client created for database {self.databaseName} ({options})")
+        return self._client
+
+    @property
+    def database(self):
+        return self.client[self.databaseName]
+
+    def collection(self, name: str):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = self.database[name]
+        return collection
+
+    def connect(self):
+        """Create the client up front, e.g. in the app lifespan. Connections are still opened lazily."""
+        return self.client
+
+    async def ping(self) -> float:
+        """Round trip of a `ping` through the shared pool, in seconds. Raises on failure or timeout."""
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.client.admin.command("ping"), self.healthTimeoutSeconds)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"ping timed out after {self.healthTimeoutSeconds}s")
+        return time.perf_counter() - start
+
+    def poolStats(self) -> dict:
+        stats = self.poolListener.snapshot()
+        stats["maxPoolSize"] = self.clientOptions.get("maxPoolSize")
+        stats["utilisation"] = round(stats["inUse"] / stats["maxPoolSize"], 3) if stats["maxPoolSize"] else None
+        return stats
+
+    async def close(self):
+        """
+        Close the pool once connections checked out by in-flight operations
+        are returned, or after `drainSeconds`. The next use creates a new client.
+        """
+        if self._client is None:
+            return
+        deadline = time.monotonic() + self.drainSeconds
+        while self.poolListener.snapshot()["inUse"] > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        inUse = self.poolListener.snapshot()["inUse"]
+        if inUse:
+            logger.warning(f"Closing Mongo client with {inUse} connections still in use after {self.drainSeconds}s")
+        self._client.close()
+        self._client = None
+        self._collections.clear()
+        logger.info("Mongo client closed")
+
+
+class CollectionHandle:
+    """Module-level stand-in for a collection; every attribute comes from the manager's current client."""
+
+    __slots__ = ("_manager", "_name")
+
+    def __init__(self, manager: MongoConnectionManager, name: str):
+        self._manager = manager
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._manager.collection(self._name), attribute)
+
+    def __repr__(self):
+        return f"CollectionHandle({self._manager.databaseName}.{self._name})"
+
+
+def _optional(value: int) -> Optional[int]:
+    # 0 leaves the driver default in place
+    return value or None
+
+
+mongo = MongoConnectionManager(
+    mongoUrl, mongoDatabase, drainSeconds=mongoDrainSeconds, healthTimeoutSeconds=mongoHealthTimeoutSeconds,
+    **{
+        name: value for name, value in {
+            "maxPoolSize": mongoMaxPoolSize,
+            "minPoolSize": mongoMinPoolSize,
+            "maxIdleTimeMS": _optional(mongoMaxIdleTimeMs),
+            "waitQueueTimeoutMS": _optional(mongoWaitQueueTimeoutMs),
+            "connectTimeoutMS": _optional(mongoConnectTimeoutMs),
+            "serverSelectionTimeoutMS": _optional(mongoServerSelectionTimeoutMs),
+        }.items() if value is not None
+    },
+)
+mongoPoolConnections.labels("open").set_function(lambda: mongo.poolListener.snapshot()["open"])
+mongoPoolConnections.labels("inUse").set_function(lambda: mongo.poolListener.snapshot()["inUse"])
+
+matchesCollection = CollectionHandle(mongo, mongoMatchesCollection)
+playersCollection = CollectionHandle(mongo, mongoPlayersCollection)
+scoreboardsCollection = CollectionHandle(mongo, mongoscoreboardsCollection)
+ballsCollection = CollectionHandle(mongo, mongoballsCollection)
+snapshotsCollection = CollectionHandle(mongo, mongoSnapshotsCollection)
+ballHistoryCollection = CollectionHandle(mongo, mongoBallHistoryCollection)
+playerStatsCollection = CollectionHandle(mongo, mongoPlayerStatsCollection)
+matchArchivesCollection = CollectionHandle(mongo, mongoMatchArchivesCollection)
+shardMembersCollection = CollectionHandle(mongo, mongoShardMembersCollection)
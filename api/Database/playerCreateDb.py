@@ -1,17 +1,24 @@
 from Database.mongoData import playersCollection
+from Utils.metrics import instrumentDbModule
 from typing import Dict, Any
 
-def insertPlayerToDb(playerData):
-    return playersCollection.insert_one(playerData)
+def buildPlayerQuery(playerId: str) -> Dict[str, Any]:
+    return {"id": playerId}
 
-def getPlayerFromDb(query):
-    return playersCollection.find_one(query)
+async def insertPlayerToDb(playerData):
+    return await playersCollection.insert_one(playerData)
 
-def getAllPlayersFromDb(query):
-    return playersCollection.find(query)
+async def getPlayerFromDb(query):
+    return await playersCollection.find_one(query)
 
-def updatePlayerInDb(query: Dict[str, Any], updateData: Dict[str, Any]):
-    return playersCollection.update_one(query, {"$set": updateData})
+async def getAllPlayersFromDb(query):
+    return await playersCollection.find(query).to_list(length=None)
 
-def deletePlayerFromDb(query: Dict[str, Any]):
-    return playersCollection.delete_one(query)
+async def updatePlayerInDb(query: Dict[str, Any], updateData: Dict[str, Any]):
+    return await playersCollection.update_one(query, {"$set": updateData})
+
+async def deletePlayerFromDb(query: Dict[str, Any]):
+    return await playersCollection.delete_one(query)
+
+
+instrumentDbModule(globals())
@@ -0,0 +1,37 @@
+# Database/playerStatsDb.py
+"""
+Career aggregates per player, one document per playerName, kept up to date
+with `$inc` as balls are scored so a profile is a single indexed read.
+"""
+from pymongo import UpdateOne, ReplaceOne
+from yensiDatetime.yensiDatetime import formatDateTime
+from Database.mongoData import playerStatsCollection
+from Utils.metrics import instrumentDbModule
+
+def buildPlayerStatsQuery(playerName: str) -> dict:
+    return {"playerName": playerName}
+
+async def incrementPlayerStatsInDb(deltas: dict):
+    """Apply `{playerName: {"battingStats.runs": n, ...}}` increments, creating missing players."""
+    updatedAt = formatDateTime()
+    operations = [
+        UpdateOne(buildPlayerStatsQuery(playerName), {"$inc": fields, "$set": {"updatedAt": updatedAt}}, upsert=True)
+        for playerName, fields in deltas.items() if fields
+    ]
+    if operations:
+        return await playerStatsCollection.bulk_write(operations, ordered=False)
+
+async def replacePlayerStatsInDb(statsDocs: list):
+    """Overwrite the aggregates of the given players, e.g. from a backfill."""
+    operations = [ReplaceOne(buildPlayerStatsQuery(doc["playerName"]), doc, upsert=True) for doc in statsDocs]
+    if operations:
+        return await playerStatsCollection.bulk_write(operations, ordered=False)
+
+async def getPlayerStatsFromDb(query: dict):
+    return await playerStatsCollection.find_one(query, {"_id": 0})
+
+async def deletePlayerStatsFromDb(query: dict):
+    return await playerStatsCollection.delete_many(query)
+
+
+instrumentDbModule(globals())
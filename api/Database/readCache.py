@@ -0,0 +1,125 @@
+# Database/readCache.py
+"""
+Bounded LRU caches with a TTL in front of single-document reads.
+
+A cache serves queries of the form `{keyField: value}` and passes any other
+query straight to Mongo. Writes made through the Database layer invalidate
+the affected key; a write whose query is not a plain key lookup clears the
+whole cache. Invalidation only reaches this process, so the TTL bounds how
+stale another worker's copy can get.
+
+Hits and misses are counted in the `scoremate_cache_*` metrics.
+"""
+import asyncio
+import copy
+import functools
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from Utils.metrics import cacheHits, cacheMisses
+
+
+class ReadThroughCache:
+    def __init__(self, name: str, keyField: str, maxSize: int, ttlSeconds: float):
+        self.name = name
+        self.keyField = keyField
+        self.maxSize = maxSize
+        self.ttlSeconds = ttlSeconds
+        # key -> (expiresAt, document); documents are never handed out, only copies
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Loads in flight; concurrent misses for one key share a load
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Called with the invalidated key, or None when the whole cache is cleared
+        self.listeners = []
+        self._hits = cacheHits.labels(name)
+        self._misses = cacheMisses.labels(name)
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxSize > 0 and self.ttlSeconds > 0
+
+    def keyOf(self, query: dict) -> Optional[str]:
+        if len(query) != 1:
+            return None
+        key = query.get(self.keyField)
+        return key if isinstance(key, str) else None
+
+    async def get(self, key: str, load):
+        """The cached document for `key`, calling `load()` on a miss. Missing documents are not cached."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self._hits.inc()
+                return copy.deepcopy(entry[1])
+            del self.entries[key]
+        self._misses.inc()
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            return copy.deepcopy(await asyncio.shield(pending))
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            document = await load()
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here, so asyncio does not log it when no other request was waiting
+            future.exception()
+            raise
+        finally:
+            # An invalidation during the load drops the future, so the result is not stored
+            current = self._loading.get(key) is future
+            if current:
+                del self._loading[key]
+        pristine = copy.deepcopy(document)
+        future.set_result(pristine)
+        if current and pristine is not None:
+            self.entries[key] = (time.monotonic() + self.ttlSeconds, pristine)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+        return document
+
+    def invalidate(self, query: dict):
+        key = self.keyOf(query)
+        if key is None:
+            self.clear()
+            return
+        self.entries.pop(key, None)
+        self._loading.pop(key, None)
+        for listener in self.listeners:
+            listener(key)
+
+    def clear(self):
+        self.entries.clear()
+        self._loading.clear()
+        for listener in self.listeners:
+            listener(None)
+
+    def readThrough(self, function):
+        """Wrap a `find_one`-style `function(query)` so key lookups go through the cache."""
+        if not self.enabled:
+            return function
+
+        @functools.wraps(function)
+        async def wrapper(query: dict):
+            key = self.keyOf(query)
+            if key is None:
+                return await function(query)
+            return await self.get(key, lambda: function(query))
+
+        return wrapper
+
+    def invalidatedBy(self, function):
+        """Wrap a write `function(query, ...)` so it invalidates what the query touches, even if it fails."""
+        @functools.wraps(function)
+        async def wrapper(query: dict, *args, **kwargs):
+            try:
+                return await function(query, *args, **kwargs)
+            finally:
+                self.invalidate(query)
+
+        return wrapper
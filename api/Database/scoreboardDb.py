@@ -1,12 +1,38 @@
 # Database/scoreboardDb.py
 
 from Database.mongoData import scoreboardsCollection
+from Database.readCache import ReadThroughCache
+from Utils.metrics import instrumentDbModule
+from constants import scoreboardCacheSize, scoreboardCacheTtlSeconds
 
-def getScoreboardFromDb(query: dict):
-    return scoreboardsCollection.find_one(query, {"_id": 0})
+# Live scoreboards are served from the live match engine; this covers matches that are not hot in this process
+scoreboardCache = ReadThroughCache("scoreboard", "matchId", scoreboardCacheSize, scoreboardCacheTtlSeconds)
 
-def updateScoreboardInDb(query: dict, updateData: dict):
-    return scoreboardsCollection.update_one(query, {"$set": updateData})
+async def getScoreboardFromDb(query: dict):
+    return await scoreboardsCollection.find_one(query, {"_id": 0})
 
-def insertScoreboardToDb(scoreboard: dict):
-    return scoreboardsCollection.insert_one(scoreboard)
+async def updateScoreboardInDb(query: dict, updateData: dict):
+    return await scoreboardsCollection.update_one(query, {"$set": updateData})
+
+async def insertScoreboardsToDb(scoreboards: list):
+    return await scoreboardsCollection.insert_many(scoreboards, ordered=False)
+
+async def insertScoreboardToDb(scoreboard: dict):
+    return await scoreboardsCollection.insert_one(scoreboard)
+
+async def replaceScoreboardInDb(query: dict, scoreboard: dict):
+    return await scoreboardsCollection.replace_one(query, scoreboard, upsert=True)
+
+async def applyScoreboardUpdateInDb(query: dict, update: dict):
+    return await scoreboardsCollection.update_one(query, update)
+
+async def deleteScoreboardFromDb(query: dict):
+    return await scoreboardsCollection.delete_one(query)
+
+
+instrumentDbModule(globals())
+getScoreboardFromDb = scoreboardCache.readThrough(getScoreboardFromDb)
+updateScoreboardInDb = scoreboardCache.invalidatedBy(updateScoreboardInDb)
+replaceScoreboardInDb = scoreboardCache.invalidatedBy(replaceScoreboardInDb)
+applyScoreboardUpdateInDb = scoreboardCache.invalidatedBy(applyScoreboardUpdateInDb)
+deleteScoreboardFromDb = scoreboardCache.invalidatedBy(deleteScoreboardFromDb)
@@ -0,0 +1,28 @@
+# Database/shardMembersDb.py
+"""
+Nodes taking part in match-affinity sharding, one document per node with
+the time of its last heartbeat. Nodes that stop heartbeating are ignored
+once their entry is older than the member TTL, and purged by a TTL index.
+"""
+from datetime import datetime, timedelta, timezone
+from Database.mongoData import shardMembersCollection
+from Utils.metrics import instrumentDbModule
+
+def buildLiveShardMembersQuery(ttlSeconds: float) -> dict:
+    return {"lastSeen": {"$gte": datetime.now(timezone.utc) - timedelta(seconds=ttlSeconds)}}
+
+async def heartbeatShardMemberInDb(nodeId: str):
+    now = datetime.now(timezone.utc)
+    return await shardMembersCollection.update_one(
+        {"nodeId": nodeId}, {"$set": {"lastSeen": now}, "$setOnInsert": {"joinedAt": now}}, upsert=True,
+    )
+
+async def getLiveShardMembersFromDb(ttlSeconds: float):
+    cursor = shardMembersCollection.find(buildLiveShardMembersQuery(ttlSeconds), {"_id": 0, "nodeId": 1})
+    return [member["nodeId"] async for member in cursor]
+
+async def deleteShardMemberFromDb(nodeId: str):
+    return await shardMembersCollection.delete_one({"nodeId": nodeId})
+
+
+instrumentDbModule(globals())
@@ -0,0 +1,32 @@
+# Database/snapshotDb.py
+
+from pymongo import DESCENDING
+from Database.mongoData import snapshotsCollection
+from Utils.metrics import instrumentDbModule
+
+LATEST_SNAPSHOT_ORDER = [("eventCount", DESCENDING)]
+
+def buildLatestSnapshotQuery(matchId: str, innings: int = None, over: int = None) -> dict:
+    query = {"matchId": matchId}
+    if innings is not None:
+        query["$or"] = [{"innings": {"$lt": innings}}, {"innings": innings, "over": {"$lte": over}}]
+    return query
+
+async def upsertSnapshotToDb(snapshot: dict):
+    return await snapshotsCollection.replace_one(
+        {"matchId": snapshot["matchId"], "eventCount": snapshot["eventCount"]}, snapshot, upsert=True
+    )
+
+async def getLatestSnapshotFromDb(matchId: str, innings: int = None, over: int = None):
+    """Latest snapshot taken at or before the end of `over` in `innings`."""
+    query = buildLatestSnapshotQuery(matchId, innings, over)
+    return await snapshotsCollection.find_one(query, {"_id": 0}, sort=LATEST_SNAPSHOT_ORDER)
+
+async def deleteSnapshotsFromDb(matchId: str):
+    return await snapshotsCollection.delete_many({"matchId": matchId})
+
+async def deleteSnapshotsAfterFromDb(matchId: str, eventCount: int):
+    return await snapshotsCollection.delete_many({"matchId": matchId, "eventCount": {"$gt": eventCount}})
+
+
+instrumentDbModule(globals())
@@ -1,5 +1,5 @@
 # Models/ballModel.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Literal
 
 
@@ -11,4 +11,7 @@ class BallEvent(BaseModel):
     batsman: Optional[str] = None
     bowler: Optional[str] = None
     newBatsman: Optional[str] = None
-    commentary: Optional[str] = None 
+    commentary: Optional[str] = None
+    # Client-assigned number of the ball within the innings, from 1; resubmitting it does not score it twice
+    seq: Optional[int] = Field(default=None, ge=1)
+
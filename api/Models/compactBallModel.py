@@ -0,0 +1,195 @@
+# Models/compactBallModel.py
+"""
+Compact in-memory forms of a delivery, for holding many balls at once.
+
+`CompactBall` is a slotted record: ball type, wicket type and the wicket
+flag are packed into one small int, and player names are interned to ids
+in a `PlayerTable`. Client sequence numbers start at 1, so a missing one is
+stored as 0. `CompactBallLog` stores a sequence of balls column-wise
+in `array` buffers, a few bytes per delivery. Both convert losslessly to
+and from `BallEvent`.
+"""
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from Models.ballModel import BallEvent
+
+BALL_TYPES = ("normal", "wide", "noBall", "bye", "legBye", "wicket")
+# Code 0 is "no wicket type"
+WICKET_TYPES = (None, "bowled", "caught", "lbw", "runout", "stumped", "hitwicket")
+
+BALL_TYPE_CODES = {ballType: code for code, ballType in enumerate(BALL_TYPES)}
+WICKET_TYPE_CODES = {wicketType: code for code, wicketType in enumerate(WICKET_TYPES)}
+
+# kind = ballType | wicketType << 3 | isWicket << 6
+WICKET_TYPE_SHIFT = 3
+IS_WICKET_BIT = 1 << 6
+
+# Position fields that are not known are stored as -1
+UNKNOWN = -1
+# Sequence numbers start at 1; 0 stands for none
+NO_SEQ = 0
+
+
+def packKind(ballType: str, wicketType: Optional[str], isWicket: bool) -> int:
+    return BALL_TYPE_CODES[ballType] | WICKET_TYPE_CODES[wicketType] << WICKET_TYPE_SHIFT | (IS_WICKET_BIT if isWicket else 0)
+
+
+def unpackKind(kind: int):
+    """`(ballType, wicketType, isWicket)` for a packed kind."""
+    return BALL_TYPES[kind & 0b111], WICKET_TYPES[(kind >> WICKET_TYPE_SHIFT) & 0b111], bool(kind & IS_WICKET_BIT)
+
+
+class PlayerTable:
+    """Interns player names to small ids; id 0 stands for no player."""
+
+    __slots__ = ("names", "ids")
+
+    def __init__(self):
+        self.names: List[Optional[str]] = [None]
+        self.ids: Dict[str, int] = {}
+
+    def intern(self, name: Optional[str]) -> int:
+        if name is None:
+            return 0
+        playerId = self.ids.get(name)
+        if playerId is None:
+            playerId = len(self.names)
+            self.names.append(name)
+            self.ids[name] = playerId
+        return playerId
+
+    def name(self, playerId: int) -> Optional[str]:
+        return self.names[playerId]
+
+    def __len__(self):
+        return len(self.names) - 1
+
+
+class CompactBall:
+    """One delivery with its position in the match, without per-instance dicts."""
+
+    __slots__ = ("kind", "runs", "batsman", "bowler", "newBatsman", "commentary", "seq", "innings", "over", "ball", "eventIndex")
+
+    def __init__(self, kind: int, runs: int, batsman: int = 0, bowler: int = 0, newBatsman: int = 0, commentary: Optional[str] = None,
+                 seq: int = NO_SEQ, innings: int = UNKNOWN, over: int = UNKNOWN, ball: int = UNKNOWN, eventIndex: int = UNKNOWN):
+        self.kind = kind
+        self.runs = runs
+        self.batsman = batsman
+        self.bowler = bowler
+        self.newBatsman = newBatsman
+        self.commentary = commentary
+        self.seq = seq
+        self.innings = innings
+        self.over = over
+        self.ball = ball
+        self.eventIndex = eventIndex
+
+    @classmethod
+    def fromBallEvent(cls, ballData: BallEvent, players: PlayerTable, innings: int = UNKNOWN, over: int = UNKNOWN,
+                      ball: int = UNKNOWN, eventIndex: int = UNKNOWN) -> "CompactBall":
+        return cls(
+            packKind(ballData.ballType, ballData.wicketType, ballData.isWicket),
+            ballData.runs,
+            players.intern(ballData.batsman),
+            players.intern(ballData.bowler),
+            players.intern(ballData.newBatsman),
+            ballData.commentary,
+            NO_SEQ if ballData.seq is None else ballData.seq,
+            innings, over, ball, eventIndex,
+        )
+
+    @classmethod
+    def fromEvent(cls, event: dict, players: PlayerTable) -> "CompactBall":
+        """From a stored ball event document, keeping its position fields."""
+        return cls.fromBallEvent(
+            BallEvent.model_validate(event), players,
+            *(UNKNOWN if event.get(field) is None else event[field] for field in ("innings", "over", "ball", "eventIndex")),
+        )
+
+    def toBallEvent(self, players: PlayerTable) -> BallEvent:
+        ballType, wicketType, isWicket = unpackKind(self.kind)
+        return BallEvent(
+            ballType=ballType,
+            runs=self.runs,
+            isWicket=isWicket,
+            wicketType=wicketType,
+            batsman=players.name(self.batsman),
+            bowler=players.name(self.bowler),
+            newBatsman=players.name(self.newBatsman),
+            commentary=self.commentary,
+            seq=None if self.seq == NO_SEQ else self.seq,
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactBall):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self):
+        return f"CompactBall({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
+
+
+class CompactBallLog:
+    """
+    Append-only sequence of deliveries stored column-wise in typed arrays.
+    Commentary is rare, so it is kept in a side dict keyed by position.
+    Logs can share a `PlayerTable`, e.g. one per season.
+    """
+
+    # field -> array typecode
+    COLUMNS = {
+        "kind": "B",
+        "runs": "h",
+        "batsman": "I",
+        "bowler": "I",
+        "newBatsman": "I",
+        "seq": "I",
+        "innings": "b",
+        "over": "h",
+        "ball": "b",
+        "eventIndex": "i",
+    }
+
+    __slots__ = ("players", "columns", "commentary")
+
+    def __init__(self, players: Optional[PlayerTable] = None):
+        self.players = players if players is not None else PlayerTable()
+        self.columns = {field: array(typecode) for field, typecode in self.COLUMNS.items()}
+        self.commentary: Dict[int, str] = {}
+
+    def append(self, ball: CompactBall):
+        if ball.commentary is not None:
+            self.commentary[len(self)] = ball.commentary
+        for field, column in self.columns.items():
+            column.append(getattr(ball, field))
+
+    def appendBallEvent(self, ballData: BallEvent, **position):
+        self.append(CompactBall.fromBallEvent(ballData, self.players, **position))
+
+    def extendEvents(self, events: Iterable[dict]):
+        """Append stored ball event documents, e.g. straight off a Mongo cursor."""
+        for event in events:
+            self.append(CompactBall.fromEvent(event, self.players))
+
+    def __len__(self):
+        return len(self.columns["kind"])
+
+    def __getitem__(self, index: int) -> CompactBall:
+        if index < 0:
+            index += len(self)
+        values = {field: column[index] for field, column in self.columns.items()}
+        return CompactBall(commentary=self.commentary.get(index), **values)
+
+    def __iter__(self) -> Iterator[CompactBall]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def toBallEvents(self) -> Iterator[BallEvent]:
+        for ball in self:
+            yield ball.toBallEvent(self.players)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the column buffers."""
+        return sum(column.itemsize * len(column) for column in self.columns.values())
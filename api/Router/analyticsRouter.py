@@ -0,0 +1,41 @@
+# Router/analyticsRouter.py
+from fastapi import APIRouter
+from typing import Literal
+from yensiAuthentication import logger
+from Utils.utils import returnResponse
+from Database.matchDb import getMatchFromDb, getBallColumnsFromDb
+from Utils.matchArchive import getArchivedBalls
+from Utils.matchAnalytics import (
+    buildBallColumns, computeWorm, computeManhattan, computePartnerships, computeDotBalls, computePhases, computeAnalytics,
+)
+
+router = APIRouter(tags=["Analytics"])
+
+CHARTS = {
+    "worm": lambda columns, overs: computeWorm(columns),
+    "manhattan": lambda columns, overs: computeManhattan(columns),
+    "partnerships": lambda columns, overs: computePartnerships(columns),
+    "dot-balls": lambda columns, overs: computeDotBalls(columns),
+    "phases": computePhases,
+    "summary": computeAnalytics,
+}
+
+
+@router.get("/matches/{matchId}/analytics/{chart}")
+async def getMatchAnalytics(matchId: str, chart: Literal["worm", "manhattan", "partnerships", "dot-balls", "phases", "summary"]):
+    """Charts computed from the match's ball events; `summary` returns all of them."""
+    try:
+        match = await getMatchFromDb({"id": matchId})
+        if not match:
+            logger.warning(f"Match not found for analytics: {matchId}")
+            return returnResponse(55)
+        events = await getBallColumnsFromDb(matchId)
+        if not events and match.get("archived"):
+            events = await getArchivedBalls(matchId, {"undone": {"$ne": True}}) or []
+        columns = buildBallColumns(events)
+        result = CHARTS[chart](columns, match.get("overs"))
+        logger.info(f"Analytics '{chart}' computed for match: {matchId}")
+        return returnResponse(76, result=result)
+    except Exception as e:
+        logger.error(f"Error computing analytics '{chart}' for match {matchId}: {e}", exc_info=True)
+        return returnResponse(77)
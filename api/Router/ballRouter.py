@@ -1,11 +1,13 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
 from Models.ballModel import BallEvent
 from yensiAuthentication import logger
-from yensiDatetime.yensiDatetime import formatDateTime
 from Utils.utils import returnResponse
 from Database.matchDb import *
-from Database.scoreboardDb import getScoreboardFromDb, updateScoreboardInDb
-from Utils.scoreboardUtils import updateScoreboardWithBall
+from Utils.liveMatchEngine import liveMatchEngine, ScoreboardConflict, BallAlreadyRecorded, BallSequenceGap
+from Utils.matchArchive import getArchivedBalls
+from Utils.payloadCache import payloadCache, payloadResponse, encodeResponse, encodeJson
 router = APIRouter(tags=["ball"])
 
 
@@ -13,50 +15,163 @@ router = APIRouter(tags=["ball"])
 async def recordBall(matchId: str, ballData: BallEvent):
     try:
         logger.info(f"Recording ball event for match: {matchId}")
-        match = getMatchFromDb({"id": matchId})
-        if not match:
+        state = await liveMatchEngine.getState(matchId)
+        if not state:
             logger.warning(f"Match not found: {matchId}")
             return returnResponse(55)
 
-        innings = match.get("currentInnings", 1)
-        over = match.get("currentOvers", 0)
-        ball = match.get("currentBalls", 0)
-
-        eventDict = ballData.model_dump()
-        eventDict.update({
-            "matchId": matchId,
-            "innings": innings,
-            "over": over,
-            "ball": ball,
-            "timestamp": formatDateTime()
-        })
-
-        insertBallEventToDb(eventDict)
-        eventDict.pop("_id", None)
-
-        # ✅ Update scoreboard
-        scoreboard = getScoreboardFromDb({"matchId": matchId})
-        if not scoreboard:
+        if not state.scoreboard:
             logger.warning(f"Scoreboard not found for match: {matchId}")
             return returnResponse(43)
 
-        updatedScoreboard = updateScoreboardWithBall(scoreboard, ballData)
-        updatedScoreboard["lastUpdated"] = formatDateTime()
-        updateScoreboardInDb({"matchId": matchId}, updatedScoreboard)
+        # ✅ Append the ball and update the in-memory scoreboard
+        eventDict = await liveMatchEngine.recordBall(state, ballData)
 
         logger.info(f"Ball and scoreboard updated for match: {matchId}")
         return returnResponse(56, result=eventDict)
 
+    except BallAlreadyRecorded as e:
+        # A retry of a ball that was recorded; acknowledge it with what is stored
+        logger.info(f"Resubmitted ball for match {matchId}: {e}")
+        event = e.events[0]
+        return returnResponse(81 if event["undone"] else 79, result=event)
+    except BallSequenceGap as e:
+        logger.warning(f"Ball out of sequence for match {matchId}: {e}")
+        return returnResponse(80, result={"expectedSeq": e.expected})
+    except ScoreboardConflict as e:
+        logger.warning(f"Scoreboard conflict recording ball for match {matchId}: {e}")
+        return returnResponse(78)
     except Exception as e:
         logger.error(f"Error recording ball for match {matchId}: {e}", exc_info=True)
         return returnResponse(57)
 
+@router.post("/matches/{matchId}/balls")
+async def recordBalls(matchId: str, balls: List[BallEvent]):
+    try:
+        logger.info(f"Recording {len(balls)} ball events for match: {matchId}")
+        if not balls:
+            return returnResponse(69)
+
+        state = await liveMatchEngine.getState(matchId)
+        if not state:
+            logger.warning(f"Match not found: {matchId}")
+            return returnResponse(55)
+
+        if not state.scoreboard:
+            logger.warning(f"Scoreboard not found for match: {matchId}")
+            return returnResponse(43)
+
+        events = await liveMatchEngine.recordBalls(state, balls)
+
+        logger.info(f"{len(events)} balls recorded and scoreboard updated for match: {matchId}")
+        return returnResponse(68, result=events)
+
+    except BallAlreadyRecorded as e:
+        logger.info(f"Resubmitted balls for match {matchId}: {e}")
+        return returnResponse(79, result=e.events)
+    except BallSequenceGap as e:
+        logger.warning(f"Balls out of sequence for match {matchId}: {e}")
+        return returnResponse(80, result={"expectedSeq": e.expected})
+    except ScoreboardConflict as e:
+        logger.warning(f"Scoreboard conflict recording balls for match {matchId}: {e}")
+        return returnResponse(78)
+    except Exception as e:
+        logger.error(f"Error recording balls for match {matchId}: {e}", exc_info=True)
+        return returnResponse(70)
+
+
+@router.delete("/matches/{matchId}/ball/last")
+async def undoLastBall(matchId: str):
+    try:
+        logger.info(f"Undoing last ball for match: {matchId}")
+        state = await liveMatchEngine.getState(matchId)
+        if not state:
+            logger.warning(f"Match not found: {matchId}")
+            return returnResponse(55)
+        if not state.scoreboard:
+            logger.warning(f"Scoreboard not found for match: {matchId}")
+            return returnResponse(43)
+
+        event = await liveMatchEngine.undoLastBall(state)
+        if not event:
+            logger.warning(f"No ball to undo for match: {matchId}")
+            return returnResponse(63)
+        return returnResponse(62, result={"ball": event, "scoreboard": state.scoreboard})
+
+    except ScoreboardConflict as e:
+        logger.warning(f"Scoreboard conflict undoing ball for match {matchId}: {e}")
+        return returnResponse(78)
+    except Exception as e:
+        logger.error(f"Error undoing ball for match {matchId}: {e}", exc_info=True)
+        return returnResponse(64)
+
+
+@router.post("/matches/{matchId}/ball/redo")
+async def redoBall(matchId: str):
+    try:
+        logger.info(f"Redoing ball for match: {matchId}")
+        state = await liveMatchEngine.getState(matchId)
+        if not state:
+            logger.warning(f"Match not found: {matchId}")
+            return returnResponse(55)
+        if not state.scoreboard:
+            logger.warning(f"Scoreboard not found for match: {matchId}")
+            return returnResponse(43)
+
+        event = await liveMatchEngine.redoBall(state)
+        if not event:
+            logger.warning(f"No ball to redo for match: {matchId}")
+            return returnResponse(66)
+        return returnResponse(65, result={"ball": event, "scoreboard": state.scoreboard})
+
+    except ScoreboardConflict as e:
+        logger.warning(f"Scoreboard conflict redoing ball for match {matchId}: {e}")
+        return returnResponse(78)
+    except Exception as e:
+        logger.error(f"Error redoing ball for match {matchId}: {e}", exc_info=True)
+        return returnResponse(67)
+
+
 @router.get("/matches/{matchId}/ball")
-async def getBalls(matchId: str):
+async def getBalls(
+    matchId: str,
+    innings: Optional[int] = Query(None, ge=1),
+    fromOver: Optional[int] = Query(None, ge=0),
+    toOver: Optional[int] = Query(None, ge=0),
+    cursor: Optional[int] = Query(None, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    format: Literal["json", "ndjson"] = "json",
+):
+    """
+    Ball-by-ball feed in delivery order. `cursor` is the eventIndex of the last
+    ball already seen. With `format=ndjson` every matching ball is streamed,
+    one JSON object per line, straight from the Mongo cursor; `limit` only
+    applies to JSON pages. Archived matches are served from their archive.
+    """
     try:
-        logger.info(f"Fetching all balls for match: {matchId}")
-        balls = getBallEventsByMatch(matchId)
-        return returnResponse(58, result=balls)
+        logger.info(f"Fetching balls for match: {matchId}")
+        query = buildBallQuery(matchId, innings, fromOver, toOver, cursor)
+
+        if format == "ndjson":
+            async def lines():
+                found = False
+                async for event in streamBallEventsFromDb(query):
+                    found = True
+                    yield encodeJson(event) + b"\n"
+                if not found:
+                    for event in await getArchivedBalls(matchId, query) or []:
+                        yield encodeJson(event) + b"\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        variant = ("balls", innings, fromOver, toOver, cursor, limit)
+        payload, token = payloadCache.get(matchId, variant)
+        if payload is None:
+            balls = await getBallEventPageFromDb(query, limit + 1)
+            if not balls:
+                balls = await getArchivedBalls(matchId, query, limit + 1) or []
+            nextCursor = balls[limit - 1].get("eventIndex") if len(balls) > limit else None
+            payload = payloadCache.put(matchId, variant, token, encodeResponse(58, {"balls": balls[:limit], "nextCursor": nextCursor}))
+        return payloadResponse(payload)
     except Exception as e:
         logger.error(f"Error fetching balls for match {matchId}: {e}", exc_info=True)
         return returnResponse(59)
@@ -1,17 +1,18 @@
-from fastapi import APIRouter
-from pymongo import MongoClient
+from typing import Optional
+from fastapi import APIRouter, Response
 import requests
-from constants import mongoUrl
 from yensiAuthentication.yensiConfig import logger
+from Database.mongoData import mongo
+from Utils.metrics import renderMetrics
+from Utils.matchSharding import matchShards
 
 router = APIRouter()
 
-mongoClient = MongoClient(mongoUrl)
-
 @router.get("/health")
 async def healthCheck():
     """
     Health check endpoint to verify MongoDB and Keycloak connectivity.
+    MongoDB is pinged through the shared connection pool, so probes do not open new connections.
     """
     health_status = {"status": "OK", "mongodb": "Unknown"}
 
@@ -20,13 +21,14 @@ async def healthCheck():
 
         # MongoDB Health Check
         try:
-            mongoClient = MongoClient(mongoUrl, serverSelectionTimeoutMS=3000)
-            mongoClient.admin.command("ping")
+            latency = await mongo.ping()
             health_status["mongodb"] = "Connected"
+            health_status["mongodbLatencyMs"] = round(latency * 1000, 2)
             logger.info("MongoDB is reachable.")
         except Exception as e:
             health_status["mongodb"] = "Not Connected"
             logger.error(f"MongoDB connection failed: {str(e)}")
+        health_status["mongodbPool"] = mongo.poolStats()
 
         # Overall Status
         if "Not Connected" in health_status.values() or "Not Authenticated" in health_status.values():
@@ -37,4 +39,17 @@ async def healthCheck():
 
     except Exception as e:
         logger.critical(f"Unexpected health check failure: {str(e)}", exc_info=True)
-        return {"status": "Critical", "mongodb": "Unknown", "keycloak": "Unknown"}
\ No newline at end of file
+        return {"status": "Critical", "mongodb": "Unknown", "keycloak": "Unknown"}
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Request and database latency metrics in Prometheus text format."""
+    body, contentType = renderMetrics()
+    return Response(content=body, media_type=contentType)
+
+
+@router.get("/shards")
+async def shardStatus(matchId: Optional[str] = None):
+    """This node's view of the shard ring and its hot matches; with `matchId`, also the node that owns that match."""
+    return matchShards.describe(matchId)
@@ -0,0 +1,61 @@
+# Router/liveRouter.py
+import asyncio
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from yensiAuthentication import logger
+from Database.scoreboardDb import getScoreboardFromDb
+from Utils.liveFeed import liveFeed, buildLiveDelta, encodeLiveDelta
+from Utils.liveMatchEngine import liveMatchEngine
+
+router = APIRouter(tags=["Live"])
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+async def currentDelta(matchId: str):
+    scoreboard = liveMatchEngine.peekScoreboard(matchId) or await getScoreboardFromDb({"matchId": matchId})
+    if not scoreboard:
+        return None
+    return encodeLiveDelta(buildLiveDelta(scoreboard, "snapshot"))
+
+
+@router.websocket("/matches/{matchId}/live")
+async def liveScoreboardSocket(websocket: WebSocket, matchId: str):
+    await websocket.accept()
+    queue = liveFeed.subscribe(matchId)
+    try:
+        initial = await currentDelta(matchId)
+        if initial:
+            await websocket.send_text(initial)
+        while True:
+            payload = await queue.get()
+            await websocket.send_text(payload)
+    except WebSocketDisconnect:
+        logger.info(f"Live websocket closed for match: {matchId}")
+    except Exception as e:
+        logger.error(f"Live websocket error for match {matchId}: {e}", exc_info=True)
+    finally:
+        liveFeed.unsubscribe(matchId, queue)
+
+
+@router.get("/matches/{matchId}/live/sse")
+async def liveScoreboardEvents(matchId: str, request: Request):
+    queue = liveFeed.subscribe(matchId)
+
+    async def eventStream():
+        try:
+            initial = await currentDelta(matchId)
+            if initial:
+                yield f"data: {initial}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+        finally:
+            liveFeed.unsubscribe(matchId, queue)
+            logger.info(f"Live event stream closed for match: {matchId}")
+
+    return StreamingResponse(eventStream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
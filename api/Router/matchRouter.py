@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, BackgroundTasks, Query
+from typing import Literal, Optional
+from datetime import datetime
 from Models.matchModel import *
 from Models.ballModel import BallEvent
 from yensiAuthentication import logger
@@ -7,6 +9,9 @@ from Utils.utils import returnResponse
 from Database.matchDb import *
 from bson import ObjectId
 from Utils.scoreboardUtils import initializeScoreboardFromMatch
+from Utils.liveMatchEngine import liveMatchEngine
+from Utils.matchArchive import archiveMatchInBackground
+from Utils.payloadCache import payloadCache, payloadResponse, encodeResponse
 
 router = APIRouter(tags=["Matches"])
 
@@ -33,8 +38,9 @@ async def createMatch(match: Match):
 
         # Update matchDict with computed team names
         matchDict.update({"id": str(ObjectId()), "createdAt": formatDateTime(), "lastUpdated": formatDateTime(), "battingTeam": battingTeam, "bowlingTeam": bowlingTeam})
+        matchDict.setdefault("status", "active")
 
-        insertMatchToDb(matchDict)
+        await insertMatchToDb(matchDict)
         matchDict.pop("_id", None)
         logger.info(f"New match created: {matchDict['id']}")
         return returnResponse(10, result=matchDict)
@@ -45,11 +51,26 @@ async def createMatch(match: Match):
 
 
 @router.get("/matches")
-async def listMatches():
+async def listMatches(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[Literal["active", "completed", "abandoned"]] = None,
+    team: Optional[str] = None,
+    fromDate: Optional[datetime] = None,
+    toDate: Optional[datetime] = None,
+    view: Literal["full", "summary"] = "full",
+):
+    """
+    Newest matches first, one page at a time. Pass the returned `nextCursor`
+    back as `cursor` for the next page; it is None on the last page.
+    """
     try:
-        matches = list(getAllMatchesFromDb({}))
+        query = buildMatchListQuery(cursor, status, team, fromDate, toDate)
+        projection = MATCH_SUMMARY_PROJECTION if view == "summary" else None
+        matches = await getMatchPageFromDb(query, limit + 1, projection)
+        nextCursor = matches[limit - 1]["id"] if len(matches) > limit else None
         logger.info("Matches fetched successfully")
-        return returnResponse(12, result=matches)
+        return returnResponse(12, result={"matches": matches[:limit], "nextCursor": nextCursor})
     except Exception as e:
         logger.error(f"Error fetching matches: {str(e)}", exc_info=True)
         return returnResponse(13)
@@ -58,27 +79,34 @@ async def listMatches():
 @router.get("/matches/{matchId}")
 async def getMatch(matchId: str):
     try:
-        match = getMatchFromDb({"id": matchId})
-        if not match:
-            logger.warning(f" Match not found: {matchId}")
-            return returnResponse(14)
+        payload, token = payloadCache.get(matchId, "match")
+        if payload is None:
+            match = await getMatchFromDb({"id": matchId})
+            if not match:
+                logger.warning(f" Match not found: {matchId}")
+                return returnResponse(14)
+            payload = payloadCache.put(matchId, "match", token, encodeResponse(15, match))
         logger.info(f" Match fetched: {matchId}")
-        return returnResponse(15, result=match)
+        return payloadResponse(payload)
     except Exception as e:
         logger.error(f"Error fetching match {matchId}: {str(e)}", exc_info=True)
         return returnResponse(16)
 
 
 @router.put("/matches/{matchId}")
-async def updateMatch(matchId: str, match: Match):
+async def updateMatch(matchId: str, match: Match, backgroundTasks: BackgroundTasks):
     try:
         updateData = match.model_dump()
         updateData["lastUpdated"] = formatDateTime()
 
-        result = updateMatchInDb({"id": matchId}, updateData)
+        await liveMatchEngine.release(matchId)
+        result = await updateMatchInDb({"id": matchId}, updateData)
         if result.modified_count == 0:
             logger.warning(f"Match not updated: {matchId}")
             return returnResponse(17)
+        if updateData["status"] == "completed":
+            # Move the finished match out of the hot collections once the response is sent
+            backgroundTasks.add_task(archiveMatchInBackground, matchId)
         logger.info(f"Match updated: {matchId}")
         return returnResponse(18)
     except Exception as e:
@@ -89,7 +117,8 @@ async def updateMatch(matchId: str, match: Match):
 @router.delete("/matches/{matchId}")
 async def deleteMatch(matchId: str):
     try:
-        result = deleteMatchFromDb({"id": matchId})
+        result = await deleteMatchFromDb({"id": matchId})
+        liveMatchEngine.evict(matchId)
         if result.deleted_count == 0:
             logger.warning(f"Match not found/deleted: {matchId}")
             return returnResponse(20)
@@ -107,7 +136,8 @@ async def deleteMatch(matchId: str):
 async def updateMatchSettings(matchId: str, settings: MatchSettings):
     try:
         logger.info(f"Updating settings for match: {matchId}")
-        result = updateMatchInDb({"id": matchId}, {"settings": settings.model_dump(), "lastUpdated": formatDateTime()})
+        await liveMatchEngine.release(matchId)
+        result = await updateMatchInDb({"id": matchId}, {"settings": settings.model_dump(), "lastUpdated": formatDateTime()})
         if result.modified_count == 0:
             logger.warning(f"No settings updated. Match may not exist: {matchId}")
             return returnResponse(50)
@@ -124,17 +154,20 @@ async def updateMatchSettings(matchId: str, settings: MatchSettings):
 async def setOpeningPlayers(matchId: str, opening: OpeningPlayers):
     try:
         logger.info(f"Setting opening players for match: {matchId}")
-        result = updateMatchInDb({"id": matchId}, {"openingPlayers": opening.model_dump(), "lastUpdated": formatDateTime()})
+        result = await updateMatchInDb({"id": matchId}, {"openingPlayers": opening.model_dump(), "lastUpdated": formatDateTime()})
         if result.modified_count == 0:
             logger.warning(f"No opening players updated. Match may not exist: {matchId}")
             return returnResponse(52)
 
-        match = getMatchFromDb({"id": matchId})
+        match = await getMatchFromDb({"id": matchId})
         if not match:
             logger.error(f"Match not found after updating opening players: {matchId}")
             return returnResponse(14)
 
-        scoreboard = initializeScoreboardFromMatch(match)
+        # Unflushed balls are dropped with the old scoreboard, but viewers may have seen their versions
+        previousVersion = liveMatchEngine.peekVersion(matchId)
+        liveMatchEngine.evict(matchId)
+        scoreboard = await initializeScoreboardFromMatch(match, previousVersion)
         if not scoreboard:
             logger.error(f"Failed to create scoreboard for match {matchId}")
             return returnResponse(42)
@@ -3,7 +3,9 @@ from typing import Optional, List
 from bson import ObjectId
 from yensiDatetime.yensiDatetime import formatDateTime
 from Models.playerCreateModel import PlayerCreate, PlayerUpdate, PlayerResponse
-from Database.playerCreateDb import insertPlayerToDb, getPlayerFromDb, getAllPlayersFromDb, updatePlayerInDb, deletePlayerFromDb
+from Database.playerCreateDb import insertPlayerToDb, getPlayerFromDb, getAllPlayersFromDb, updatePlayerInDb, deletePlayerFromDb, buildPlayerQuery
+from Database.playerStatsDb import getPlayerStatsFromDb, buildPlayerStatsQuery
+from Utils.playerStats import buildPlayerProfile
 from Utils.utils import returnResponse
 from yensiAuthentication import logger
 
@@ -16,7 +18,7 @@ async def createPlayer(player: PlayerCreate):
         playerData = player.model_dump()
         playerData["id"] = str(ObjectId)
         playerData["createdAt"] = formatDateTime()
-        result = insertPlayerToDb(playerData)
+        result = await insertPlayerToDb(playerData)
         result.pop("_id", None)
         logger.info("player created successfully")
         return returnResponse(23, result=result)
@@ -28,7 +30,7 @@ async def createPlayer(player: PlayerCreate):
 @router.get("/players")
 async def getAllPlayers():
     try:
-        players = List(getAllPlayersFromDb({}))
+        players = await getAllPlayersFromDb({})
         logger.info("players fetched successfully")
         return returnResponse(25, result=players)
     except Exception as e:
@@ -39,7 +41,7 @@ async def getAllPlayers():
 @router.get("/player/{playerId}")
 async def getSinglePlayer(playerId: str):
     try:
-        player = getPlayerFromDb({"id": playerId})
+        player = await getPlayerFromDb(buildPlayerQuery(playerId))
         if not player:
             logger.warning(f"Player not found with ID: {playerId}")
             return returnResponse(27)
@@ -51,6 +53,17 @@ async def getSinglePlayer(playerId: str):
         return returnResponse(29)
 
 
+@router.get("/players/{playerName}/stats")
+async def getPlayerStats(playerName: str):
+    try:
+        stats = await getPlayerStatsFromDb(buildPlayerStatsQuery(playerName))
+        logger.info(f"Player stats fetched successfully: {playerName}")
+        return returnResponse(74, result=buildPlayerProfile(stats, playerName))
+    except Exception as e:
+        logger.error(f"Error occurred while fetching stats for player {playerName}: {e}", exc_info=True)
+        return returnResponse(75)
+
+
 @router.put("/players/{playerId}")
 async def updatePlayer(playerId: str, updates: PlayerUpdate):
     try:
@@ -59,7 +72,7 @@ async def updatePlayer(playerId: str, updates: PlayerUpdate):
         updateData["updatedAt"] = formatDateTime()
         if not updateData:
             return returnResponse(31)
-        result = updatePlayerInDb({"id": playerId}, updateData)
+        result = await updatePlayerInDb(buildPlayerQuery(playerId), updateData)
         if result.modified_count == 0:
             logger.warning(f"player not updated or not found:Id:{playerId}")
             return returnResponse(32)
@@ -75,7 +88,7 @@ async def deletePlayer(playerId: str):
     try:
         logger.info(f"Attempting to delete player with ID: {playerId}")
 
-        result = deletePlayerFromDb({"id": playerId})
+        result = await deletePlayerFromDb(buildPlayerQuery(playerId))
         if result.deleted_count == 0:
             logger.warning(f"Player not found or already deleted: {playerId}")
             return returnResponse(36)  # Player not deleted
@@ -1,11 +1,18 @@
 # Routers/scoreboardRouter.py
 from bson import ObjectId
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request, Response
+from typing import Optional
 from Models.scoreboardModel import Scoreboard
-from Database.scoreboardDb import insertScoreboardToDb, getScoreboardFromDb, updateScoreboardInDb
-from Utils.utils import returnResponse
+from Database.scoreboardDb import insertScoreboardToDb, getScoreboardFromDb, applyScoreboardUpdateInDb
+from Utils.utils import returnResponse, scoreboardETag, etagMatches
 from yensiAuthentication import logger
 from yensiDatetime.yensiDatetime import formatDateTime
+from Utils.liveMatchEngine import liveMatchEngine
+from Utils.scoreboardReplay import rebuildScoreboard
+from Utils.matchArchive import getArchivedScoreboard, getArchivedScoreboardAsOf, getArchivedBallHistoryPage
+from Utils.payloadCache import payloadCache, payloadResponse, encodeResponse
+from Database.ballHistoryDb import pushBallHistoryToDb, getBallHistoryPageFromDb
+from constants import recentBallHistorySize
 
 router = APIRouter(tags=["Scoreboard"])
 
@@ -16,7 +23,7 @@ async def createScoreboard(scoreboard: Scoreboard):
         data = scoreboard.model_dump()
         data["id"] = str(ObjectId())
         data["lastUpdated"] = formatDateTime()
-        insertScoreboardToDb(data)
+        await insertScoreboardToDb(data)
         data.pop("_id", None)
         logger.info(f"Scoreboard created for match: {data['matchId']}")
         return returnResponse(41, result=data)
@@ -26,45 +33,111 @@ async def createScoreboard(scoreboard: Scoreboard):
 
 
 @router.get("/matches/{matchId}/scoreboard")
-async def getScoreboard(matchId: str):
+async def getScoreboard(
+    matchId: str, request: Request, response: Response,
+    sinceVersion: Optional[int] = Query(None, ge=0), scoreboardId: Optional[str] = None,
+):
+    """
+    Supports `If-None-Match` (304 when the scoreboard version is unchanged) and
+    `sinceVersion`, which returns only the fields and balls changed since then
+    when the match is live, and the full scoreboard otherwise. Pass the
+    scoreboard's `id` as `scoreboardId` to get the full scoreboard whenever
+    it was replaced since.
+    """
     try:
-        scoreboard = getScoreboardFromDb({"matchId": matchId})
-        if not scoreboard:
-            logger.warning(f"Scoreboard not found for match: {matchId}")
-            return returnResponse(43)
-        scoreboard.pop("_id", None)
-        return returnResponse(44, result=scoreboard)
+        # The encoded scoreboard is reused until the next ball or update
+        payload, token = payloadCache.get(matchId, "scoreboard")
+        if payload is None:
+            scoreboard = (
+                liveMatchEngine.peekScoreboard(matchId)
+                or await getScoreboardFromDb({"matchId": matchId})
+                or await getArchivedScoreboard(matchId)
+            )
+            if not scoreboard:
+                logger.warning(f"Scoreboard not found for match: {matchId}")
+                return returnResponse(43)
+            scoreboard.pop("_id", None)
+            etag = scoreboardETag(matchId, scoreboard.get("id"), scoreboard.get("version", 0))
+            payload = payloadCache.put(matchId, "scoreboard", token, encodeResponse(44, scoreboard), {"ETag": etag})
+
+        etag = payload.headers["ETag"]
+        if etagMatches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        if sinceVersion is not None:
+            changes = await liveMatchEngine.getChangesSince(matchId, sinceVersion, scoreboardId)
+            if changes is not None:
+                response.headers["ETag"] = etag
+                return returnResponse(71, result=changes)
+        return payloadResponse(payload)
     except Exception as e:
         logger.error(f"Error fetching scoreboard for match {matchId}: {e}", exc_info=True)
         return returnResponse(45)
 
 
+@router.get("/matches/{matchId}/scoreboard/as-of")
+async def getScoreboardAsOf(matchId: str, innings: int = Query(..., ge=1), over: int = Query(..., ge=0)):
+    """
+    Scoreboard as it stood after `over` completed overs of `innings`,
+    rebuilt from the ball events starting at the nearest snapshot, or from
+    the archived balls once the match is archived.
+    """
+    try:
+        scoreboard = await getArchivedScoreboardAsOf(matchId, innings, over) or await rebuildScoreboard(matchId, innings, over)
+        if not scoreboard:
+            logger.warning(f"Match not found for scoreboard rebuild: {matchId}")
+            return returnResponse(55)
+        scoreboard.pop("_id", None)
+        logger.info(f"Scoreboard rebuilt for match {matchId} as of innings {innings}, over {over}")
+        return returnResponse(60, result=scoreboard)
+    except Exception as e:
+        logger.error(f"Error rebuilding scoreboard for match {matchId}: {e}", exc_info=True)
+        return returnResponse(61)
+
+
+@router.get("/matches/{matchId}/ball-history")
+async def getBallHistory(matchId: str, innings: int = Query(1, ge=1), cursor: Optional[int] = Query(None, ge=0), limit: int = Query(10, ge=1, le=50)):
+    """
+    Full ball history, one bucket per over. `cursor` is the last over already
+    seen; pass back `nextCursor` for the next page.
+    """
+    try:
+        overs = await getBallHistoryPageFromDb(matchId, innings, cursor, limit)
+        if not overs:
+            overs = await getArchivedBallHistoryPage(matchId, innings, cursor, limit) or []
+        nextCursor = overs[-1]["over"] if len(overs) == limit else None
+        return returnResponse(72, result={"overs": overs, "nextCursor": nextCursor})
+    except Exception as e:
+        logger.error(f"Error fetching ball history for match {matchId}: {e}", exc_info=True)
+        return returnResponse(73)
+
+
 @router.put("/scoreboard/{matchId}")
 async def updateScoreboard(matchId: str, updatedData: Scoreboard):
     try:
         updateDict = updatedData.model_dump()
         updateDict["lastUpdated"] = formatDateTime()
 
-        existing = getScoreboardFromDb({"matchId": matchId})
-        if not existing:
-            logger.warning(f"⚠️ Scoreboard not found for update: {matchId}")
-            return returnResponse(46)
-
-        # Merge ballHistory if present
-        existingHistory = existing.get("ballHistory", [])
-        newHistory = updateDict.get("ballHistory", [])
+        # Persist any in-flight balls first; the hot copy is replaced below.
+        await liveMatchEngine.release(matchId)
 
+        # Full history lives in per-over buckets; the scoreboard keeps a bounded recent window
+        newHistory = updateDict.pop("ballHistory", None) or []
+        update = {"$set": updateDict, "$inc": {"version": 1}}
         if newHistory:
-            updateDict["ballHistory"] = existingHistory + newHistory
-        else:
-            updateDict["ballHistory"] = existingHistory  # retain existing if no new data
+            update["$push"] = {"ballHistory": {"$each": newHistory, "$slice": -recentBallHistorySize}}
 
-        result = updateScoreboardInDb({"matchId": matchId}, updateDict)
+        result = await applyScoreboardUpdateInDb({"matchId": matchId}, update)
 
-        if result.modified_count == 0:
-            logger.warning(f"⚠️ No scoreboard updated for match: {matchId}")
+        if result.matched_count == 0:
+            logger.warning(f"⚠️ Scoreboard not found for update: {matchId}")
             return returnResponse(46)
 
+        if newHistory:
+            innings = updateDict.get("currentInnings") or 1
+            over = updateDict.get("overs") or 0
+            await pushBallHistoryToDb(matchId, [(innings, over, ball) for ball in newHistory])
+
         logger.info(f"✅ Scoreboard updated for match: {matchId}")
         return returnResponse(47)
 
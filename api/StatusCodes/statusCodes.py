@@ -48,4 +48,26 @@ CUSTOM_STATUS_CODES = {
     57: {"code": 57, "message": "Error occurred while recording ball event."},
     58: {"code": 58, "message": "Ball events fetched successfully."},
     59: {"code": 59, "message": "Error occurred while fetching ball events."},
+    60: {"code": 60, "message": "Scoreboard rebuilt successfully."},
+    61: {"code": 61, "message": "Error occurred while rebuilding scoreboard."},
+    62: {"code": 62, "message": "Last ball undone successfully."},
+    63: {"code": 63, "message": "No ball to undo."},
+    64: {"code": 64, "message": "Error occurred while undoing ball."},
+    65: {"code": 65, "message": "Ball redone successfully."},
+    66: {"code": 66, "message": "No undone ball to redo."},
+    67: {"code": 67, "message": "Error occurred while redoing ball."},
+    68: {"code": 68, "message": "Balls recorded successfully."},
+    69: {"code": 69, "message": "No balls to record."},
+    70: {"code": 70, "message": "Error occurred while recording balls."},
+    71: {"code": 71, "message": "Scoreboard changes fetched successfully."},
+    72: {"code": 72, "message": "Ball history fetched successfully."},
+    73: {"code": 73, "message": "Error occurred while fetching ball history."},
+    74: {"code": 74, "message": "Player stats fetched successfully."},
+    75: {"code": 75, "message": "Error occurred while fetching player stats."},
+    76: {"code": 76, "message": "Match analytics computed successfully."},
+    77: {"code": 77, "message": "Error occurred while computing match analytics."},
+    78: {"code": 78, "message": "Scoreboard was changed by another request. Reload it and retry."},
+    79: {"code": 79, "message": "Ball with this sequence number was already recorded."},
+    80: {"code": 80, "message": "Earlier balls of the sequence have not arrived. Resend from the expected sequence number."},
+    81: {"code": 81, "message": "Ball with this sequence number was recorded and then undone."},
 }
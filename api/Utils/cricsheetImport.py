@@ -0,0 +1,504 @@
+# Utils/cricsheetImport.py
+"""
+Bulk import of historical matches from Cricsheet ball-by-ball files.
+
+JSON files are streamed with ijson, one delivery at a time, so a file is
+never held in memory whole; legacy YAML files are small and are parsed in
+one go. Each delivery becomes a `BallEvent` and is written like a live ball
+(matchId, innings, over, ball, eventIndex), and the scoreboard is built by
+replaying the balls with the live scoring rules.
+
+Those rules book a wide as one run and a no-ball's other runs as the
+batter's, so extra wides, byes or leg byes off a no-ball, and penalty runs
+cannot be replayed. Such runs are kept on the ball as `unbookedRuns` and
+per innings in the match's `source.unbookedRuns`, and every innings is
+checked against Cricsheet's totals: replayed plus unbooked runs must add up,
+or the file fails.
+
+Files are imported in chunks across a process pool. Balls are written with
+unordered `insert_many` batches; matches and scoreboards are written per
+chunk once all of its files are complete, so a half-imported match never
+shows up in listings. Finished files are appended to a checkpoint file and
+skipped on the next run; an interrupted file is cleaned up and imported
+again. Match ids are derived from the match date and file name, so
+re-imports are idempotent.
+
+    python -m Utils.cricsheetImport data/ --workers 4 --checkpoint import-state.jsonl
+
+Player career stats are not touched; run `python -m Utils.playerStats
+--backfill` after a large import.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timezone
+from typing import Iterator, List, Optional
+
+import ijson
+import yaml
+from bson import ObjectId
+from yensiAuthentication import logger
+from yensiDatetime.yensiDatetime import formatDateTime
+from Models.ballModel import BallEvent
+from Database.matchDb import insertMatchesToDb, insertBallEventsToDb, deleteBallEventsFromDb, deleteMatchFromDb
+from Database.scoreboardDb import insertScoreboardsToDb, deleteScoreboardFromDb
+from Database.ballHistoryDb import pushBallHistoryToDb, deleteBallHistoryFromDb
+from Utils.scoreboardUtils import buildInitialScoreboard
+from Utils.scoreboardReplay import applyBallEvent, historyBucketItem
+
+MATCH_FILE_EXTENSIONS = (".json", ".yaml", ".yml")
+DELIVERY_PREFIX = "innings.item.overs.item.deliveries.item"
+
+WICKET_TYPES = {
+    "bowled": "bowled",
+    "caught": "caught",
+    "caught and bowled": "caught",
+    "lbw": "lbw",
+    "run out": "runout",
+    "stumped": "stumped",
+    "hit wicket": "hitwicket",
+}
+# Listed by Cricsheet but not dismissals
+NOT_OUT_KINDS = ("retired hurt", "retired not out")
+
+
+def _iterJsonMatch(stream) -> Iterator[tuple]:
+    """
+    Yield `("info", info)` and then `("delivery", innings, team, over, delivery)`
+    for every delivery, building only one small object at a time.
+    """
+    builder = None
+    builderPrefix = None
+    innings = 0
+    team = None
+    over = None
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == builderPrefix and event == "end_map":
+                if builderPrefix == "info":
+                    yield "info", builder.value
+                else:
+                    yield "delivery", innings, team, over, builder.value
+                builder = None
+            continue
+        if event == "start_map" and prefix in ("info", DELIVERY_PREFIX):
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            builderPrefix = prefix
+        elif prefix == "innings.item" and event == "start_map":
+            innings += 1
+            team = None
+        elif prefix == "innings.item.team":
+            team = value
+        elif prefix == "innings.item.overs.item.over":
+            over = int(value)
+
+
+def _normalizeLegacyDelivery(delivery: dict) -> dict:
+    """Map a pre-2020 YAML delivery onto the JSON field names."""
+    runs = delivery.get("runs", {})
+    wickets = delivery.get("wicket") or []
+    return {
+        "batter": delivery.get("batsman"),
+        "bowler": delivery.get("bowler"),
+        "non_striker": delivery.get("non_striker"),
+        "runs": {"batter": runs.get("batsman", 0), "extras": runs.get("extras", 0), "total": runs.get("total", 0)},
+        "extras": delivery.get("extras") or {},
+        "wickets": wickets if isinstance(wickets, list) else [wickets],
+    }
+
+
+def _iterYamlMatch(stream) -> Iterator[tuple]:
+    data = yaml.safe_load(stream)
+    yield "info", data.get("info", {})
+    for innings, entry in enumerate(data.get("innings", []), 1):
+        (inningsData,) = entry.values()
+        for item in inningsData.get("deliveries", []):
+            ((position, delivery),) = item.items()
+            yield "delivery", innings, inningsData.get("team"), int(float(position)), _normalizeLegacyDelivery(delivery)
+
+
+def iterMatchFile(path: str) -> Iterator[tuple]:
+    with open(path, "rb") as stream:
+        if path.endswith(".json"):
+            yield from _iterJsonMatch(stream)
+        else:
+            yield from _iterYamlMatch(stream)
+
+
+def toBallEvent(delivery: dict, newBatsman: Optional[str] = None) -> BallEvent:
+    """
+    Map a Cricsheet delivery to a `BallEvent`. A wide's `runs` are all its
+    wide runs, as the scorer UI sends them; see `unbookedRuns` for what the
+    scoreboard makes of them.
+    """
+    runs = delivery.get("runs", {})
+    extras = delivery.get("extras") or {}
+    batterRuns = int(runs.get("batter", 0))
+    wickets = [wicket for wicket in delivery.get("wickets") or [] if wicket.get("kind") not in NOT_OUT_KINDS]
+
+    if "wides" in extras:
+        ballType, ballRuns = "wide", int(extras["wides"])
+    elif "noballs" in extras:
+        ballType, ballRuns = "noBall", batterRuns
+    elif "byes" in extras:
+        ballType, ballRuns = "bye", int(extras["byes"])
+    elif "legbyes" in extras:
+        ballType, ballRuns = "legBye", int(extras["legbyes"])
+    elif wickets and batterRuns == 0:
+        ballType, ballRuns = "wicket", 0
+    else:
+        ballType, ballRuns = "normal", batterRuns
+
+    return BallEvent(
+        ballType=ballType,
+        runs=ballRuns,
+        isWicket=bool(wickets),
+        wicketType=WICKET_TYPES.get(wickets[0].get("kind")) if wickets else None,
+        batsman=delivery.get("batter"),
+        bowler=delivery.get("bowler"),
+        newBatsman=newBatsman,
+    )
+
+
+def bookedRuns(ball: BallEvent) -> int:
+    """Runs the live scoring rules add to the score for `ball`."""
+    if ball.ballType == "wide":
+        return 1
+    if ball.ballType == "noBall":
+        return 1 + ball.runs
+    if ball.ballType == "wicket":
+        return 0
+    return ball.runs
+
+
+def unbookedRuns(delivery: dict, ball: BallEvent) -> int:
+    """Runs of a delivery, per Cricsheet's `runs.total`, that `ball` cannot carry."""
+    return int((delivery.get("runs") or {}).get("total", 0)) - bookedRuns(ball)
+
+
+def _matchDate(info: dict) -> datetime:
+    dates = info.get("dates") or []
+    first = dates[0] if dates else "1970-01-01"
+    if isinstance(first, str):
+        first = date.fromisoformat(first)
+    return datetime(first.year, first.month, first.day, tzinfo=timezone.utc)
+
+
+def buildMatchId(info: dict, path: str) -> str:
+    """Time-ordered like generated ids, but stable for a given file, so re-imports replace the match."""
+    timestamp = int(_matchDate(info).timestamp()).to_bytes(4, "big", signed=False)
+    return str(ObjectId(timestamp + hashlib.sha1(os.path.basename(path).encode()).digest()[:8]))
+
+
+def buildMatchDocument(info: dict, matchId: str, path: str) -> dict:
+    teams = info.get("teams") or ["Host", "Visitor"]
+    players = info.get("players") or {}
+    toss = info.get("toss") or {}
+    outcome = info.get("outcome") or {}
+    batFirst = teams[0]
+    if toss.get("winner") in teams:
+        other = teams[1] if toss["winner"] == teams[0] else teams[0]
+        batFirst = toss["winner"] if toss.get("decision") == "bat" else other
+    now = formatDateTime()
+    return {
+        "hostTeam": {"name": teams[0], "players": players.get(teams[0], [])},
+        "visitorTeam": {"name": teams[1], "players": players.get(teams[1], [])},
+        "tossWonBy": "visitor" if toss.get("winner") == teams[1] else "host",
+        "optedTo": "bowl" if toss.get("decision") == "field" else "bat",
+        "overs": int(info.get("overs") or 0),
+        "settings": {
+            "playersPerTeam": len(players.get(teams[0], [])) or 11,
+            "noBall": {"reball": True, "runs": 1},
+            "wideBall": {"reball": True, "runs": 1},
+        },
+        "openingPlayers": {"striker": None, "nonStriker": None, "bowler": None},
+        "currentInnings": 1,
+        "battingTeam": batFirst,
+        "bowlingTeam": teams[1] if batFirst == teams[0] else teams[0],
+        "status": "completed",
+        "id": matchId,
+        "createdAt": now,
+        "lastUpdated": now,
+        "result": describeOutcome(outcome),
+        "source": {"format": "cricsheet", "file": os.path.basename(path), "dates": [str(day) for day in info.get("dates") or []]},
+    }
+
+
+def describeOutcome(outcome: dict) -> Optional[str]:
+    if outcome.get("winner"):
+        by = outcome.get("by") or {}
+        margin = ", ".join(f"{value} {unit}" for unit, value in by.items())
+        return f"{outcome['winner']} won" + (f" by {margin}" if margin else "")
+    return outcome.get("result")
+
+
+class MatchFileImporter:
+    """Streams one Cricsheet file into ball documents and a final scoreboard."""
+
+    def __init__(self, path: str, batchSize: int):
+        self.path = path
+        self.batchSize = batchSize
+        self.match = None
+        self.scoreboard = None
+        self.innings = 0
+        self.over = None
+        self.legalInOver = 0
+        self.eventIndex = 0
+        self.events = []
+        self.history = []
+        # A wicket ball waits for the next delivery to learn who came in
+        self.pendingWicket = None
+        # Per innings: Cricsheet's total, and the part of it no ball could carry
+        self.inningsTotals = {}
+        self.inningsUnbooked = {}
+
+    async def run(self) -> Optional[dict]:
+        """Import the file. Returns the match and scoreboard documents, not yet written."""
+        for item in iterMatchFile(self.path):
+            if item[0] == "info":
+                await self._start(item[1])
+            else:
+                await self._delivery(*item[1:])
+        if self.match is None:
+            return None
+        await self._resolvePending(None)
+        self._checkInnings()
+        await self._writeBalls()
+        self.scoreboard.update({"isComplete": True, "result": self.match["result"], "version": self.eventIndex, "lastUpdated": formatDateTime()})
+        self.match["currentInnings"] = self.innings or 1
+        return {"match": self.match, "scoreboard": self.scoreboard, "balls": self.eventIndex}
+
+    async def _start(self, info: dict):
+        matchId = buildMatchId(info, self.path)
+        # Leftovers of an interrupted import of this file
+        await deleteBallEventsFromDb({"matchId": matchId})
+        await deleteBallHistoryFromDb(matchId)
+        await deleteScoreboardFromDb({"matchId": matchId})
+        await deleteMatchFromDb({"id": matchId})
+        self.match = buildMatchDocument(info, matchId, self.path)
+
+    def _startInnings(self, innings: int, team: Optional[str], delivery: dict):
+        previous = self.scoreboard
+        teams = [self.match["hostTeam"]["name"], self.match["visitorTeam"]["name"]]
+        battingTeam = team or self.match["battingTeam"]
+        opening = {"striker": delivery.get("batter"), "nonStriker": delivery.get("non_striker"), "bowler": delivery.get("bowler")}
+        if previous is None:
+            self.match["openingPlayers"] = opening
+        scoreboard = buildInitialScoreboard({
+            **self.match,
+            "currentInnings": innings,
+            "battingTeam": battingTeam,
+            "bowlingTeam": teams[1] if battingTeam == teams[0] else teams[0],
+            "openingPlayers": opening,
+            "target": previous["score"] + 1 if previous else 0,
+        })
+        scoreboard["id"] = str(ObjectId())
+        if previous:
+            scoreboard["eventCount"] = previous["eventCount"]
+            scoreboard["ballHistory"] = previous["ballHistory"]
+        else:
+            scoreboard["eventCount"] = 0
+        self.scoreboard = scoreboard
+        self.innings = innings
+        self.over = None
+
+    async def _delivery(self, innings: int, team: Optional[str], over: int, delivery: dict):
+        if self.match is None:
+            raise ValueError(f"{self.path}: deliveries before match info")
+        await self._resolvePending(delivery if innings == self.innings else None)
+        if innings != self.innings:
+            if self.scoreboard is not None:
+                self._checkInnings()
+            self._startInnings(innings, team, delivery)
+        if over != self.over:
+            self.over = over
+            self.legalInOver = 0
+
+        event = {
+            "matchId": self.match["id"],
+            "innings": innings,
+            "over": over,
+            "ball": self.legalInOver,
+        }
+        ballData = toBallEvent(delivery)
+        self.inningsTotals[innings] = self.inningsTotals.get(innings, 0) + int((delivery.get("runs") or {}).get("total", 0))
+        unbooked = unbookedRuns(delivery, ballData)
+        if unbooked:
+            event["unbookedRuns"] = unbooked
+            self.inningsUnbooked[innings] = self.inningsUnbooked.get(innings, 0) + unbooked
+        if ballData.ballType not in ("wide", "noBall"):
+            self.legalInOver += 1
+        if ballData.isWicket:
+            self.pendingWicket = (event, delivery)
+        else:
+            await self._append(event, ballData)
+
+    def _checkInnings(self):
+        """Replayed plus unbooked runs of the innings just finished must match Cricsheet's total."""
+        score = self.scoreboard.get("score", 0)
+        unbooked = self.inningsUnbooked.get(self.innings, 0)
+        total = self.inningsTotals.get(self.innings, 0)
+        if score + unbooked != total:
+            raise ValueError(f"{self.path}: innings {self.innings} replays to {score} runs + {unbooked} unbooked, Cricsheet has {total}")
+        if unbooked:
+            logger.warning(f"{self.path}: innings {self.innings} has {unbooked} runs the scoreboard cannot book")
+            self.match["source"].setdefault("unbookedRuns", {})[str(self.innings)] = unbooked
+
+    async def _resolvePending(self, nextDelivery: Optional[dict]):
+        if self.pendingWicket is None:
+            return
+        event, delivery = self.pendingWicket
+        self.pendingWicket = None
+        newBatsman = None
+        if nextDelivery is not None:
+            incoming = {nextDelivery.get("batter"), nextDelivery.get("non_striker")} - {delivery.get("batter"), delivery.get("non_striker")}
+            if len(incoming) == 1:
+                newBatsman = incoming.pop()
+        await self._append(event, toBallEvent(delivery, newBatsman))
+
+    async def _append(self, event: dict, ballData: BallEvent):
+        event.update(ballData.model_dump())
+        event["eventIndex"] = self.eventIndex
+        event["timestamp"] = self.match["createdAt"]
+        self.eventIndex += 1
+        self.scoreboard = applyBallEvent(self.scoreboard, ballData)
+        self.events.append(event)
+        self.history.append(historyBucketItem(event, ballData))
+        if len(self.events) >= self.batchSize:
+            await self._writeBalls()
+
+    async def _writeBalls(self):
+        if self.events:
+            await insertBallEventsToDb(self.events, ordered=False)
+            await pushBallHistoryToDb(self.match["id"], self.history)
+            self.events = []
+            self.history = []
+
+
+async def importFiles(paths: List[str], batchSize: int) -> List[dict]:
+    """
+    Import a chunk of files, then write their matches and scoreboards in one
+    unordered batch each. Returns one result per file; failed files carry
+    an `error` and are retried on the next run.
+    """
+    results = []
+    matches = []
+    scoreboards = []
+    for path in paths:
+        started = time.perf_counter()
+        try:
+            imported = await MatchFileImporter(path, batchSize).run()
+        except Exception as e:
+            logger.error(f"Failed to import {path}: {e}", exc_info=True)
+            results.append({"file": path, "error": str(e)})
+            continue
+        if imported is None:
+            results.append({"file": path, "error": "no match info"})
+            continue
+        matches.append(imported["match"])
+        scoreboards.append(imported["scoreboard"])
+        results.append({"file": path, "matchId": imported["match"]["id"], "balls": imported["balls"], "seconds": round(time.perf_counter() - started, 3)})
+    if matches:
+        try:
+            await insertMatchesToDb(matches)
+            await insertScoreboardsToDb(scoreboards)
+        except Exception as e:
+            # The files of this chunk are imported again on the next run; their leftovers are cleaned up then
+            logger.error(f"Failed to write the matches of a chunk of {len(matches)} files: {e}", exc_info=True)
+            imported = {match["id"] for match in matches}
+            results = [
+                {"file": result["file"], "error": f"writing matches: {e}"} if result.get("matchId") in imported else result
+                for result in results
+            ]
+    return results
+
+
+# One event loop per worker process, reused across chunks so the Mongo client stays on it
+_workerLoop = None
+
+
+def _initWorker():
+    global _workerLoop
+    _workerLoop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_workerLoop)
+
+
+def _importChunk(paths: List[str], batchSize: int) -> List[dict]:
+    return _workerLoop.run_until_complete(importFiles(paths, batchSize))
+
+
+def findMatchFiles(sources: List[str]) -> List[str]:
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                files.extend(os.path.join(root, name) for name in names if name.endswith(MATCH_FILE_EXTENSIONS))
+        else:
+            files.append(source)
+    return sorted(os.path.abspath(path) for path in files)
+
+
+def readCheckpoint(path: Optional[str]) -> set:
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as checkpoint:
+        return {json.loads(line)["file"] for line in checkpoint if line.strip()}
+
+
+def runImport(sources: List[str], workers: int, batchSize: int, chunkSize: int, checkpointPath: Optional[str]) -> dict:
+    done = readCheckpoint(checkpointPath)
+    files = [path for path in findMatchFiles(sources) if path not in done]
+    chunks = [files[start:start + chunkSize] for start in range(0, len(files), chunkSize)]
+    summary = {"files": 0, "skipped": len(done), "failed": [], "balls": 0}
+    started = time.perf_counter()
+
+    checkpoint = open(checkpointPath, "a") if checkpointPath else None
+    try:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_initWorker) as pool:
+            futures = [pool.submit(_importChunk, chunk, batchSize) for chunk in chunks]
+            for future in as_completed(futures):
+                for result in future.result():
+                    if "error" in result:
+                        summary["failed"].append(result)
+                        continue
+                    summary["files"] += 1
+                    summary["balls"] += result["balls"]
+                    if checkpoint:
+                        checkpoint.write(json.dumps(result) + "\n")
+                if checkpoint:
+                    checkpoint.flush()
+                elapsed = time.perf_counter() - started
+                print(f"{summary['files']}/{len(files)} files, {summary['balls']} balls, {summary['balls'] / elapsed:.0f} balls/s", file=sys.stderr)
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    summary["ballsPerSecond"] = round(summary["balls"] / summary["seconds"], 1) if summary["seconds"] else 0.0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Cricsheet ball-by-ball JSON/YAML files")
+    parser.add_argument("sources", nargs="+", help="match files or directories to scan")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--batch-size", type=int, default=1000, help="balls per insert_many")
+    parser.add_argument("--chunk-size", type=int, default=20, help="files per worker task; matches and scoreboards are written per chunk")
+    parser.add_argument("--checkpoint", default="cricsheet-import.jsonl", help="file recording imported files, for resuming")
+    args = parser.parse_args()
+    summary = runImport(args.sources, args.workers, args.batch_size, args.chunk_size, args.checkpoint)
+    print(json.dumps(summary, indent=2))
+    raise SystemExit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Utils/liveFeed.py
+"""
+Per-match fan-out of live scoreboard deltas to WebSocket and SSE subscribers.
+
+Each published delta is serialized once and the same string is queued for
+every subscriber of the match. Queues are bounded; a subscriber that falls
+behind loses its oldest messages, which is safe because every delta carries
+the current totals rather than increments.
+"""
+import asyncio
+import json
+from typing import Dict, Optional, Set
+
+from yensiAuthentication import logger
+
+SUBSCRIBER_QUEUE_SIZE = 32
+
+
+def buildLiveDelta(scoreboard: dict, event: str, lastBall: Optional[dict] = None) -> dict:
+    return {
+        "event": event,
+        "matchId": scoreboard.get("matchId"),
+        "version": scoreboard.get("version", 0),
+        "score": scoreboard.get("score", 0),
+        "wickets": scoreboard.get("wickets", 0),
+        "overs": scoreboard.get("overs", 0),
+        "balls": scoreboard.get("balls", 0),
+        "currentBatsmen": scoreboard.get("currentBatsmen", []),
+        "currentBowler": scoreboard.get("currentBowler"),
+        "lastBall": lastBall,
+    }
+
+
+def encodeLiveDelta(delta: dict) -> str:
+    return json.dumps(delta, separators=(",", ":"), default=str)
+
+
+class LiveFeed:
+    def __init__(self, queueSize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queueSize = queueSize
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, matchId: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queueSize)
+        self.subscribers.setdefault(matchId, set()).add(queue)
+        logger.info(f"Live subscriber added for match {matchId} ({len(self.subscribers[matchId])} total)")
+        return queue
+
+    def unsubscribe(self, matchId: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(matchId)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            self.subscribers.pop(matchId, None)
+
+    def subscriberCount(self, matchId: str) -> int:
+        return len(self.subscribers.get(matchId, ()))
+
+    def publish(self, matchId: str, delta: dict):
+        queues = self.subscribers.get(matchId)
+        if not queues:
+            return
+        payload = encodeLiveDelta(delta)
+        for queue in queues:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+
+liveFeed = LiveFeed()
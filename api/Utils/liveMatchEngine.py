@@ -0,0 +1,859 @@
+import asyncio
+import contextlib
+import copy
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from yensiAuthentication import logger
+from yensiDatetime.yensiDatetime import formatDateTime
+from Models.ballModel import BallEvent
+from Database.matchDb import (
+    getMatchFromDb, insertBallEventToDb, insertBallEventsToDb, countBallEventsByMatch, getBallEventsForReplay,
+    getBallEventFromDb, updateBallEventInDb, deleteBallEventsFromDb, getBallEventsByOverFromDb, getBallEventKeysFromDb,
+    getBallEventsBySeqFromDb, buildBallEventAtQuery,
+)
+from Database.scoreboardDb import getScoreboardFromDb, applyScoreboardUpdateInDb, scoreboardCache
+from Database.snapshotDb import upsertSnapshotToDb, deleteSnapshotsAfterFromDb
+from Database.ballHistoryDb import pushBallHistoryToDb, popBallHistoryFromDb, pullBallHistoryFromDb
+from Database.playerStatsDb import incrementPlayerStatsInDb
+from Utils.scoreboardDelta import buildScoreboardUpdate, applyScoreboardUpdate, changedFields, encodeUpdate, decodeUpdate
+from Utils.scoreboardReplay import applyBallEvent, replayBallEvents, snapshotIfDue, historyBucketItem, lastSequence
+from Utils.liveFeed import liveFeed, buildLiveDelta
+from Utils.playerStats import ballStatsDelta, mergeStatsDelta, bowlerConceded, isLegalDelivery
+from Utils.metrics import scoreboardWriteConflicts, ballSequence
+from constants import (
+    liveFlushIntervalSeconds, liveMatchIdleSeconds, scoreboardChangeLogSize, liveWriteThrough, scoreboardConflictRetries,
+    scoreboardConflictBackoffMs, staleBallEventSeconds, ballSeqWaitSeconds, ballSeqBufferSize,
+)
+
+
+class ScoreboardConflict(Exception):
+    """Another writer changed the stored scoreboard, or took the ball slot, since this process last read it."""
+
+
+class BallAlreadyRecorded(Exception):
+    """
+    Every ball submitted carries a sequence number that was applied before.
+    `events` are their stored events, each with its `undone` flag.
+    """
+
+    def __init__(self, events: List[dict]):
+        super().__init__(f"sequence numbers {[event.get('seq') for event in events]} already recorded")
+        self.events = events
+
+
+class BallSequenceGap(Exception):
+    """A ball's sequence number is ahead of `expected`, the next one the match can apply."""
+
+    def __init__(self, seq: int, expected: int):
+        super().__init__(f"sequence number {seq} is ahead of {expected}")
+        self.seq = seq
+        self.expected = expected
+
+
+class LiveMatchState:
+    """Hot, in-process state of one match that is being scored."""
+
+    def __init__(self, matchId: str, match: dict, scoreboard: dict):
+        self.matchId = matchId
+        self.match = match
+        self.scoreboard = scoreboard
+        # Last scoreboard known to be in Mongo; flushes send only the difference
+        self.persisted = copy.deepcopy(scoreboard)
+        self.pendingSnapshots = []
+        # (innings, over, ball) entries not yet appended to their history bucket
+        self.pendingHistory = []
+        # Career stat increments per player not yet written
+        self.pendingStats = {}
+        # Runs conceded so far in the over at overKey (innings, over); None until counted
+        self.overKey = None
+        self.overConceded = None
+        # Undone balls may exist in Mongo until the first new ball clears them
+        self.hasRedo = True
+        # (version, changed fields, eventCount) per version, for since-version patches
+        self.changeLog = deque(maxlen=scoreboardChangeLogSize)
+        # Futures of balls waiting for the sequence numbers before theirs, by sequence number
+        self.seqWaiters: Dict[int, asyncio.Future] = {}
+        self.dirty = False
+        self.lock = asyncio.Lock()
+        self.flushLock = asyncio.Lock()
+        self.lastTouched = time.monotonic()
+
+    def logChange(self, scoreboard: dict, fields):
+        self.changeLog.append((scoreboard.get("version", 0), frozenset(fields), scoreboard.get("eventCount", 0)))
+
+
+class LiveMatchEngine:
+    """
+    Keeps the scoreboard of every active match in memory.
+
+    A delivery is applied to the in-memory scoreboard and only the ball event
+    itself is written synchronously. Scoreboards are persisted write-behind:
+    a background task flushes dirty matches every `flushIntervalSeconds`, and
+    a match is flushed immediately when it completes or is evicted. With
+    `writeThrough` every ball is persisted before it is acknowledged.
+
+    Writes are optimistic. A ball claims its eventIndex through the unique
+    (matchId, eventIndex) index, and the scoreboard is only updated if its
+    stored version is still the one this process last read or wrote. A
+    write that loses to another process rebases the hot state on what is
+    stored and is retried up to `conflictRetries` times, after a random
+    backoff that starts at `conflictBackoffSeconds` and doubles each time.
+
+    Only write-through is safe with several writers per match. There a ball
+    counts once the stored eventCount covers it; events past eventCount
+    belong to writes that are still in flight or were lost, and are never
+    replayed; those older than `staleTailSeconds` are discarded. Write-behind replays them, because a crash inside the flush
+    window is the only way to leave them behind when there is one writer.
+
+    Balls may carry a client sequence number, counted per innings. The
+    scoreboard keeps the highest one applied, so a resubmitted ball is
+    answered with its stored event instead of being scored again, and the
+    unique (matchId, innings, seq) index stops two writers from storing it
+    twice. A single ball that arrives ahead of its turn waits up to
+    `seqWaitSeconds` for the ones before it, with at most `seqBufferSize`
+    waiting per match.
+    """
+
+    def __init__(
+        self, flushIntervalSeconds: float, idleSeconds: float, writeThrough: bool = False,
+        conflictRetries: int = 3, conflictBackoffSeconds: float = 0.005, staleTailSeconds: float = 5.0,
+        seqWaitSeconds: float = 10.0, seqBufferSize: int = 64,
+    ):
+        self.flushIntervalSeconds = flushIntervalSeconds
+        self.idleSeconds = idleSeconds
+        self.writeThrough = writeThrough
+        self.conflictRetries = conflictRetries
+        self.conflictBackoffSeconds = conflictBackoffSeconds
+        self.staleTailSeconds = staleTailSeconds
+        self.seqWaitSeconds = seqWaitSeconds
+        self.seqBufferSize = seqBufferSize
+        self.matches: Dict[str, LiveMatchState] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._flushTask: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._flushTask is None:
+            self._flushTask = asyncio.create_task(self._flushLoop())
+            logger.info(f"Live match engine started, flush interval {self.flushIntervalSeconds}s")
+
+    async def stop(self):
+        if self._flushTask is not None:
+            self._flushTask.cancel()
+            try:
+                await self._flushTask
+            except asyncio.CancelledError:
+                pass
+            self._flushTask = None
+        await self.flushAll()
+        logger.info("Live match engine stopped")
+
+    async def getState(self, matchId: str) -> Optional[LiveMatchState]:
+        """
+        Return the hot state for a match, loading it from Mongo on first use.
+        Returns None if the match does not exist. A state whose scoreboard is
+        None is returned (but not cached) when the match has no scoreboard yet.
+        """
+        state = self.matches.get(matchId)
+        if state is not None:
+            state.lastTouched = time.monotonic()
+            return state
+
+        # Concurrent first requests for a match share one load.
+        pending = self._loading.get(matchId)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[matchId] = future
+        try:
+            state = await self._load(matchId)
+            future.set_result(state)
+            return state
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here, so asyncio does not log it when no other request was waiting
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(matchId, None)
+
+    async def _load(self, matchId: str) -> Optional[LiveMatchState]:
+        match = await getMatchFromDb({"id": matchId})
+        if not match:
+            return None
+        scoreboard = await getScoreboardFromDb({"matchId": matchId})
+        state = LiveMatchState(matchId, match, scoreboard)
+        if scoreboard is not None:
+            await self._recover(state)
+            state.logChange(state.scoreboard, ())
+            self.matches[matchId] = state
+            logger.info(f"Live state loaded for match: {matchId}")
+        return state
+
+    async def _recover(self, state: LiveMatchState):
+        """
+        Catch the loaded scoreboard up with balls that were appended but never
+        flushed, e.g. after a crash inside the write-behind window.
+        """
+        scoreboard = state.scoreboard
+        lastUndoFlag = scoreboard.get("lastUndoFlag")
+        if lastUndoFlag:
+            # An undo writes the scoreboard before the flag; finish it if that second write never happened
+            await self._flagBall(lastUndoFlag["ballId"], lastUndoFlag["undone"], lastUndoFlag["version"])
+        if "eventCount" not in scoreboard:
+            # Scoreboard predates event numbering; start counting after the existing balls.
+            scoreboard["eventCount"] = await countBallEventsByMatch(state.matchId)
+            state.dirty = True
+            return
+
+        if self.writeThrough:
+            await self._discardTail(state)
+            return
+
+        tail = await getBallEventsForReplay(state.matchId, fromEventIndex=scoreboard["eventCount"])
+        for position, event in enumerate(tail):
+            if event.get("eventIndex") != scoreboard["eventCount"] + position:
+                # Only a ball inserted after a concurrent undo can leave a gap; its
+                # writer's scoreboard update fails, so it was never acknowledged.
+                logger.warning(f"Discarding {len(tail) - position} ball events after a gap at {event.get('eventIndex')} for match: {state.matchId}")
+                await deleteBallEventsFromDb({"matchId": state.matchId, "eventIndex": {"$gte": event.get("eventIndex")}, "undone": {"$ne": True}})
+                tail = tail[:position]
+                break
+        if tail:
+            for event in tail:
+                ballData = BallEvent.model_validate(event)
+                state.pendingHistory.append(historyBucketItem(event, ballData))
+                mergeStatsDelta(state.pendingStats, ballStatsDelta(ballData, event.get("maiden", False)))
+            state.scoreboard = replayBallEvents(scoreboard, tail)
+            state.scoreboard["version"] = scoreboard.get("version", 0) + len(tail)
+            state.dirty = True
+            logger.warning(f"Recovered {len(tail)} unflushed balls for match: {state.matchId}")
+
+    async def _discardTail(self, state: LiveMatchState):
+        """
+        Remove ball events past the stored eventCount that a write-through
+        writer left behind and has not written for `staleTailSeconds`. The
+        stored version is moved on first, so a writer that is only slow cannot
+        count its ball any more. Redone balls go back to being undone; new
+        balls are deleted. Younger events are left to the writer still
+        holding them.
+        """
+        query = {"matchId": state.matchId, "eventIndex": {"$gte": state.scoreboard["eventCount"]}, "undone": {"$ne": True}}
+        now = datetime.now(timezone.utc)
+        tail = [
+            event for event in await getBallEventKeysFromDb(query)
+            if (now - event["_id"].generation_time).total_seconds() >= self.staleTailSeconds
+        ]
+        if not tail:
+            return
+        fenced = dict(state.scoreboard)
+        fenced["version"] = fenced.get("version", 0) + 1
+        fenced["lastUpdated"] = formatDateTime()
+        state.scoreboard = fenced
+        state.dirty = True
+        await self._persist(state, *self._takeDirty(state))
+
+        for event in tail:
+            if "flagVersion" in event:
+                await updateBallEventInDb({"_id": event["_id"], "flagVersion": {"$lte": fenced["version"]}}, {"undone": True, "flagVersion": fenced["version"]})
+        await self._deleteEvents([event for event in tail if "flagVersion" not in event])
+        logger.warning(f"Discarded {len(tail)} unacknowledged ball events past eventCount {fenced['eventCount']} for match: {state.matchId}")
+
+    def peekScoreboard(self, matchId: str) -> Optional[dict]:
+        """Current in-memory scoreboard of a hot match, without touching Mongo."""
+        state = self.matches.get(matchId)
+        if state is None or state.scoreboard is None:
+            return None
+        return dict(state.scoreboard)
+
+    def peekVersion(self, matchId: str) -> Optional[int]:
+        """Scoreboard version of a hot match, or None if the match is not hot in this process."""
+        state = self.matches.get(matchId)
+        if state is None or state.scoreboard is None:
+            return None
+        return state.scoreboard.get("version", 0)
+
+    def isChanging(self, matchId: str) -> bool:
+        """True while a ball, undo or redo of a hot match is being written."""
+        state = self.matches.get(matchId)
+        return state is not None and state.lock.locked()
+
+    def _overKey(self, state: LiveMatchState, scoreboard: dict):
+        return scoreboard.get("currentInnings") or state.match.get("currentInnings", 1), scoreboard.get("overs", 0)
+
+    async def _countOver(self, state: LiveMatchState):
+        """Make sure runs conceded in the current over are known, for maiden detection."""
+        key = self._overKey(state, state.scoreboard)
+        if state.overKey != key or state.overConceded is None:
+            events = await getBallEventsByOverFromDb(state.matchId, *key)
+            state.overKey = key
+            state.overConceded = sum(bowlerConceded(BallEvent.model_validate(event)) for event in events)
+
+    def _checkpoint(self, state: LiveMatchState):
+        return (
+            list(state.pendingSnapshots), list(state.pendingHistory), copy.deepcopy(state.pendingStats),
+            state.overKey, state.overConceded,
+        )
+
+    def _restore(self, state: LiveMatchState, checkpoint):
+        state.pendingSnapshots, state.pendingHistory, state.pendingStats, state.overKey, state.overConceded = checkpoint
+
+    def _applyBall(self, state: LiveMatchState, scoreboard: dict, ballData: BallEvent):
+        """
+        Build the ball event for a delivery bowled against `scoreboard` and
+        the scoreboard after it. Neither is persisted here.
+        """
+        innings, over = self._overKey(state, scoreboard)
+        eventDict = ballData.model_dump()
+        eventDict.update({
+            "matchId": state.matchId,
+            "innings": innings,
+            "over": over,
+            "ball": scoreboard.get("balls", 0),
+            "eventIndex": scoreboard.get("eventCount", 0),
+            "timestamp": formatDateTime()
+        })
+
+        updatedScoreboard = applyBallEvent(copy.deepcopy(scoreboard), ballData)
+        updatedScoreboard["lastUpdated"] = formatDateTime()
+        updatedScoreboard["version"] = scoreboard.get("version", 0) + 1
+        # Inverse delta, so the ball can be undone without a replay
+        undo = buildScoreboardUpdate(updatedScoreboard, scoreboard)
+        eventDict["undo"] = encodeUpdate(undo)
+
+        snapshot = snapshotIfDue(scoreboard, updatedScoreboard)
+        if snapshot:
+            state.pendingSnapshots.append(snapshot)
+        state.pendingHistory.append(historyBucketItem(eventDict, ballData))
+
+        if state.overKey != (innings, over):
+            state.overKey, state.overConceded = (innings, over), None
+        if state.overConceded is not None:
+            state.overConceded += bowlerConceded(ballData)
+        maiden = False
+        if isLegalDelivery(ballData) and eventDict["ball"] == 5:
+            maiden = state.overConceded == 0
+            state.overKey, state.overConceded = (innings, over + 1), 0
+        if maiden:
+            eventDict["maiden"] = True
+        mergeStatsDelta(state.pendingStats, ballStatsDelta(ballData, maiden))
+        return eventDict, updatedScoreboard, changedFields(undo)
+
+    async def _clearRedo(self, state: LiveMatchState):
+        if state.hasRedo:
+            # A new ball invalidates anything that was undone before it. Balls
+            # below eventCount are counted, even if another writer is still flagging them.
+            await deleteBallEventsFromDb({"matchId": state.matchId, "undone": True, "eventIndex": {"$gte": state.scoreboard.get("eventCount", 0)}})
+            state.hasRedo = False
+
+    async def _flagBall(self, ballId: str, undone: bool, version: int, query: Optional[dict] = None):
+        """
+        Set a ball's `undone` flag on behalf of scoreboard `version`, unless a
+        write for a later version got there first.
+        """
+        flagQuery = {"_id": ObjectId(ballId), "$or": [{"flagVersion": {"$lt": version}}, {"flagVersion": {"$exists": False}}]}
+        flagQuery.update(query or {})
+        return await updateBallEventInDb(flagQuery, {"undone": undone, "flagVersion": version})
+
+    @contextlib.asynccontextmanager
+    async def _writing(self, state: LiveMatchState):
+        """`state.lock`, and also `state.flushLock` when balls are written through."""
+        if self.writeThrough:
+            async with state.flushLock, state.lock:
+                yield
+        else:
+            async with state.lock:
+                yield
+
+    def _sequenced(self, state: LiveMatchState, balls: List[BallEvent]):
+        """
+        Split `balls` into the ones still to apply and the sequence numbers
+        of those applied before. Raises BallSequenceGap at the first ball
+        that is ahead of its turn.
+        """
+        lastSeq = lastSequence(state.scoreboard)
+        expected = lastSeq + 1
+        pending, replayed = [], []
+        for ballData in balls:
+            if ballData.seq is None:
+                pending.append(ballData)
+            elif ballData.seq == expected:
+                pending.append(ballData)
+                expected += 1
+            elif ballData.seq > expected:
+                # A batch is applied whole or not at all, so the client resends from the first ball after lastSeq
+                raise BallSequenceGap(ballData.seq, lastSeq + 1)
+            elif ballData.seq <= lastSeq:
+                replayed.append(ballData.seq)
+        return pending, replayed
+
+    def _wakeWaiters(self, state: LiveMatchState):
+        """Let waiting balls whose turn has come, or gone, try again."""
+        expected = lastSequence(state.scoreboard) + 1
+        for seq in [seq for seq in state.seqWaiters if seq <= expected]:
+            waiter = state.seqWaiters.pop(seq)
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _appendBalls(self, state: LiveMatchState, balls: List[BallEvent], kind: str) -> List[dict]:
+        """
+        Insert the ball events of `balls` and fold them into the hot
+        scoreboard. If another writer gets in first, the events this call
+        inserted are deleted again before ScoreboardConflict is raised.
+        Resubmitted balls are left out, and BallAlreadyRecorded is raised if
+        no other ball remains.
+        """
+        async with self._writing(state):
+            balls, replayed = self._sequenced(state, balls)
+            if replayed:
+                ballSequence.labels("resubmitted").inc(len(replayed))
+            if not balls:
+                innings = self._overKey(state, state.scoreboard)[0]
+                stored = {event["seq"]: event for event in await getBallEventsBySeqFromDb(state.matchId, innings, replayed)}
+                events = []
+                for seq in replayed:
+                    # An undone ball is deleted once the next ball is recorded; its sequence number stays used
+                    event = stored.get(seq) or {"matchId": state.matchId, "innings": innings, "seq": seq, "undone": True}
+                    event.setdefault("undone", False)
+                    events.append(event)
+                raise BallAlreadyRecorded(events)
+            await self._countOver(state)
+            checkpoint = self._checkpoint(state)
+            scoreboard = state.scoreboard
+            events = []
+            changes = []
+            for ballData in balls:
+                eventDict, scoreboard, fields = self._applyBall(state, scoreboard, ballData)
+                events.append(eventDict)
+                changes.append((scoreboard, fields))
+            try:
+                await self._clearRedo(state)
+                if len(events) == 1:
+                    await insertBallEventToDb(events[0])
+                else:
+                    await insertBallEventsToDb(events)
+            except DuplicateKeyError as e:
+                self._restore(state, checkpoint)
+                raise ScoreboardConflict(f"eventIndex {events[0]['eventIndex']} or its sequence number of match {state.matchId} is taken") from e
+            except BulkWriteError as e:
+                self._restore(state, checkpoint)
+                await self._deleteEvents(events[:e.details.get("nInserted", 0)])
+                if any(error.get("code") == 11000 for error in e.details.get("writeErrors", [])):
+                    raise ScoreboardConflict(f"eventIndex or sequence number taken in a batch for match {state.matchId}") from e
+                raise
+            except Exception:
+                self._restore(state, checkpoint)
+                raise
+
+            state.scoreboard = scoreboard
+            for changedScoreboard, fields in changes:
+                state.logChange(changedScoreboard, fields)
+            state.dirty = True
+            # The stored scoreboard is now behind until the next flush
+            scoreboardCache.invalidate({"matchId": state.matchId})
+            state.lastTouched = time.monotonic()
+            if self.writeThrough:
+                try:
+                    await self._persist(state, *self._takeDirty(state))
+                except ScoreboardConflict:
+                    # Nobody else counts balls past the stored eventCount, so these are safe to remove
+                    await self._deleteEvents(events)
+                    raise
+            for eventDict in events:
+                eventDict.pop("_id", None)
+                eventDict.pop("undo", None)
+            self._wakeWaiters(state)
+            liveFeed.publish(state.matchId, buildLiveDelta(scoreboard, kind, events[-1]))
+        return events
+
+    async def _deleteEvents(self, events: List[dict]):
+        if events:
+            await deleteBallEventsFromDb({"_id": {"$in": [event["_id"] for event in events]}})
+
+    async def _retryOnConflict(self, state: LiveMatchState, operation: str, attempt):
+        """
+        Run `attempt()` and, whenever it loses to another writer, rebase
+        `state` and run it again, up to `conflictRetries` times. When the
+        retries run out the state is dropped, so the next request reloads it.
+        """
+        for retry in range(self.conflictRetries + 1):
+            try:
+                if retry:
+                    await asyncio.sleep(random.uniform(0, self.conflictBackoffSeconds * 2 ** (retry - 1)))
+                    async with state.flushLock, state.lock:
+                        await self._rebase(state)
+                return await attempt()
+            except ScoreboardConflict as e:
+                scoreboardWriteConflicts.labels(operation).inc()
+                if retry == self.conflictRetries:
+                    if self.matches.get(state.matchId) is state:
+                        self.matches.pop(state.matchId, None)
+                    raise
+                logger.warning(f"{operation} for match {state.matchId} lost to another writer, rebasing (attempt {retry + 1}): {e}")
+
+    async def _rebase(self, state: LiveMatchState):
+        """
+        Reload a hot state that is behind the stored scoreboard. Caller holds
+        `state.flushLock` and `state.lock`. Pending history, stats and
+        snapshots are dropped: the writer that moved the stored scoreboard
+        wrote them up to its eventCount, and recovery deals with the balls after it.
+        """
+        scoreboardCache.invalidate({"matchId": state.matchId})
+        scoreboard = await getScoreboardFromDb({"matchId": state.matchId})
+        if scoreboard is None:
+            if self.matches.get(state.matchId) is state:
+                self.matches.pop(state.matchId, None)
+            raise ScoreboardConflict(f"scoreboard of match {state.matchId} was deleted")
+        state.scoreboard = scoreboard
+        state.persisted = copy.deepcopy(scoreboard)
+        state.pendingSnapshots, state.pendingHistory, state.pendingStats = [], [], {}
+        state.overKey = state.overConceded = None
+        state.hasRedo = True
+        state.dirty = False
+        # Versions from before the rebase may not be in the stored history; since-version readers fall back to the full scoreboard
+        state.changeLog.clear()
+        await self._recover(state)
+        state.logChange(state.scoreboard, ())
+        self._wakeWaiters(state)
+        logger.info(f"Live state rebased on stored version {scoreboard.get('version', 0)} for match: {state.matchId}")
+
+    async def recordBall(self, state: LiveMatchState, ballData: BallEvent) -> dict:
+        """
+        Append a delivery durably and apply it to the hot scoreboard.
+        Returns the stored ball event. A ball whose sequence number was
+        applied before raises BallAlreadyRecorded; one ahead of its turn
+        waits for the balls before it, or raises BallSequenceGap.
+        """
+        append = lambda: self._retryOnConflict(state, "ball", lambda: self._appendBalls(state, [ballData], "ball"))
+        if ballData.seq is None:
+            eventDict = (await append())[0]
+        else:
+            eventDict = (await self._inTurn(state, ballData.seq, append))[0]
+
+        if state.scoreboard.get("isComplete"):
+            await self.release(state.matchId)
+        elif self.matches.get(state.matchId) is not state:
+            # Released while this ball was in flight; persist it directly.
+            await self.flush(state)
+        return eventDict
+
+    async def _inTurn(self, state: LiveMatchState, seq: int, append):
+        """
+        Run `append()` once the ball with sequence number `seq` is next,
+        waiting while the balls before it are recorded by other requests. A
+        write-through writer also looks at the stored scoreboard every
+        `flushIntervalSeconds`, as another process may have recorded them.
+        """
+        deadline = time.monotonic() + self.seqWaitSeconds
+        refreshed = False
+        waiter = None
+        try:
+            while True:
+                try:
+                    return await append()
+                except BallSequenceGap:
+                    if self.writeThrough and not refreshed:
+                        refreshed = True
+                        async with state.flushLock, state.lock:
+                            await self._rebase(state)
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or (seq not in state.seqWaiters and len(state.seqWaiters) >= self.seqBufferSize):
+                        ballSequence.labels("gap").inc()
+                        raise
+                    if waiter is None:
+                        ballSequence.labels("waited").inc()
+                    waiter = state.seqWaiters.get(seq)
+                    if waiter is None:
+                        waiter = state.seqWaiters[seq] = asyncio.get_running_loop().create_future()
+                    try:
+                        await asyncio.wait_for(asyncio.shield(waiter), min(remaining, self.flushIntervalSeconds) if self.writeThrough else remaining)
+                    except asyncio.TimeoutError:
+                        refreshed = False
+        finally:
+            if waiter is not None and state.seqWaiters.get(seq) is waiter and not waiter.done():
+                state.seqWaiters.pop(seq, None)
+
+    async def recordBalls(self, state: LiveMatchState, balls: List[BallEvent]) -> List[dict]:
+        """
+        Append an ordered batch of deliveries with one insert, fold them into
+        the scoreboard in memory, and write the scoreboard once.
+        Returns the stored ball events. Resubmitted balls are left out; a
+        batch does not wait for missing sequence numbers but raises
+        BallSequenceGap.
+        """
+        events = await self._retryOnConflict(state, "balls", lambda: self._appendBalls(state, balls, "balls"))
+
+        if state.scoreboard.get("isComplete"):
+            await self.release(state.matchId)
+        else:
+            await self.flush(state)
+        return events
+
+    async def undoLastBall(self, state: LiveMatchState) -> Optional[dict]:
+        """
+        Revert the latest delivery by applying the inverse delta stored with it.
+        The ball is marked as undone so it can be redone. Returns the undone
+        ball event, or None if there is nothing to undo.
+        """
+        return await self._retryOnConflict(state, "undo", lambda: self._undo(state))
+
+    async def _undo(self, state: LiveMatchState) -> Optional[dict]:
+        async with state.flushLock:
+            async with state.lock:
+                eventIndex = state.scoreboard.get("eventCount", 0) - 1
+                # Balls before firstEventIndex belong to a scoreboard that was replaced by re-setting the openers
+                if eventIndex < state.scoreboard.get("firstEventIndex", 0):
+                    return None
+                eventQuery = buildBallEventAtQuery(state.matchId, eventIndex, undone=False)
+                event = await getBallEventFromDb(eventQuery, None)
+                if not event or "undo" not in event:
+                    return None
+                ballId = str(event.pop("_id"))
+
+                before = state.scoreboard
+                undo = decodeUpdate(event["undo"])
+                restored = applyScoreboardUpdate(copy.deepcopy(before), undo)
+                restored["lastUpdated"] = formatDateTime()
+                # Versions only move forward, even when the ball is taken back
+                restored["version"] = before.get("version", 0) + 1
+                if "lastSeq" in before:
+                    # An undone ball's sequence number stays used, so a late resubmission cannot score it again
+                    restored["lastSeq"] = before["lastSeq"]
+                restored["lastUndoFlag"] = {"ballId": ballId, "undone": True, "version": restored["version"]}
+                state.scoreboard = restored
+                state.logChange(restored, changedFields(undo))
+                state.pendingSnapshots = [snapshot for snapshot in state.pendingSnapshots if snapshot["eventCount"] <= eventIndex]
+                state.dirty = True
+                historyPending = bool(state.pendingHistory)
+                if historyPending:
+                    state.pendingHistory.pop()
+                mergeStatsDelta(state.pendingStats, ballStatsDelta(BallEvent.model_validate(event), event.get("maiden", False)), sign=-1)
+                state.overConceded = None
+
+                # Scoreboard first: it carries lastUndoFlag, so a reload finishes the flag if it is never written.
+                # Nothing else is written before it, so losing the version check leaves no trace.
+                await self._persist(state, *self._takeDirty(state))
+                if self.writeThrough:
+                    # Write-through appends history after the scoreboard, so buckets of concurrent writers may interleave
+                    await pullBallHistoryFromDb(state.matchId, event["innings"], event["over"], eventIndex)
+                elif not historyPending:
+                    await popBallHistoryFromDb(state.matchId, event["innings"], event["over"])
+                if snapshotIfDue(restored, before):
+                    await deleteSnapshotsAfterFromDb(state.matchId, eventIndex)
+                await self._flagBall(ballId, True, restored["version"])
+                state.hasRedo = True
+                event.pop("undo", None)
+                liveFeed.publish(state.matchId, buildLiveDelta(restored, "undo", event))
+
+        logger.info(f"Ball {eventIndex} undone for match: {state.matchId}")
+        return event
+
+    async def redoBall(self, state: LiveMatchState) -> Optional[dict]:
+        """
+        Re-apply the most recently undone delivery. Returns the ball event, or
+        None if there is nothing to redo.
+        """
+        return await self._retryOnConflict(state, "redo", lambda: self._redo(state))
+
+    async def _redo(self, state: LiveMatchState) -> Optional[dict]:
+        async with state.flushLock:
+            async with state.lock:
+                eventIndex = state.scoreboard.get("eventCount", 0)
+                eventQuery = buildBallEventAtQuery(state.matchId, eventIndex, undone=True)
+                event = await getBallEventFromDb(eventQuery, None)
+                if not event:
+                    state.hasRedo = False
+                    return None
+                ballId = str(event.pop("_id"))
+                version = state.scoreboard.get("version", 0) + 1
+                # Flag first, so a writer clearing undone balls cannot delete it while the scoreboard is written
+                flagged = await self._flagBall(ballId, False, version, {"undone": True})
+                if flagged.matched_count == 0:
+                    raise ScoreboardConflict(f"ball {eventIndex} of match {state.matchId} is no longer undone")
+
+                before = state.scoreboard
+                ballData = BallEvent.model_validate(event)
+                redone = applyBallEvent(copy.deepcopy(before), ballData)
+                redone["lastUpdated"] = formatDateTime()
+                redone["version"] = version
+                redone["lastUndoFlag"] = {"ballId": ballId, "undone": False, "version": redone["version"]}
+                snapshot = snapshotIfDue(before, redone)
+                if snapshot:
+                    state.pendingSnapshots.append(snapshot)
+                state.pendingHistory.append(historyBucketItem(event, ballData))
+                mergeStatsDelta(state.pendingStats, ballStatsDelta(ballData, event.get("maiden", False)))
+                state.overConceded = None
+                state.scoreboard = redone
+                state.logChange(redone, changedFields(buildScoreboardUpdate(before, redone)))
+                state.dirty = True
+
+                event.pop("undo", None)
+                event["undone"] = False
+                try:
+                    await self._persist(state, *self._takeDirty(state))
+                except ScoreboardConflict:
+                    # Put the flag back unless a rebase of another writer already did
+                    await updateBallEventInDb({"_id": ObjectId(ballId), "flagVersion": version}, {"undone": True})
+                    raise
+                liveFeed.publish(state.matchId, buildLiveDelta(redone, "redo", event))
+
+        logger.info(f"Ball {eventIndex} redone for match: {state.matchId}")
+        return event
+
+    async def getChangesSince(self, matchId: str, sinceVersion: int, scoreboardId: Optional[str] = None) -> Optional[dict]:
+        """
+        Fields changed and balls added since `sinceVersion`, for a hot match
+        whose change log still reaches back that far and, if `scoreboardId`
+        is given, whose scoreboard is still that one. Returns None when the
+        caller should fall back to the full scoreboard.
+
+        Balls are returned from `fromEventIndex` on; the client drops its own
+        balls from that index (they may have been undone) and appends these.
+        """
+        state = self.matches.get(matchId)
+        if state is None or not state.changeLog:
+            return None
+        scoreboard = state.scoreboard
+        version = scoreboard.get("version", 0)
+        if sinceVersion > version or sinceVersion < state.changeLog[0][0]:
+            return None
+        if scoreboardId is not None and scoreboardId != scoreboard.get("id"):
+            return None
+
+        entries = [entry for entry in state.changeLog if entry[0] >= sinceVersion]
+        fields = set().union(*(entry[1] for entry in entries if entry[0] > sinceVersion))
+        fromEventIndex = min(entry[2] for entry in entries)
+        eventCount = scoreboard.get("eventCount", 0)
+
+        balls = []
+        if fromEventIndex < eventCount:
+            balls = await getBallEventsForReplay(matchId, fromEventIndex=fromEventIndex)
+        return {
+            "matchId": matchId,
+            "id": scoreboard.get("id"),
+            "version": version,
+            "sinceVersion": sinceVersion,
+            "changes": {field: scoreboard.get(field) for field in sorted(fields)},
+            "fromEventIndex": fromEventIndex,
+            "balls": balls,
+        }
+
+    async def flush(self, state: LiveMatchState):
+        async with state.flushLock:
+            async with state.lock:
+                pending = self._takeDirty(state)
+            # state.lock is released so balls keep flowing while the write is on the wire
+            try:
+                await self._persist(state, *pending)
+            except ScoreboardConflict as e:
+                scoreboardWriteConflicts.labels("flush").inc()
+                logger.warning(f"Flush of match {state.matchId} lost to another writer, rebasing: {e}")
+                async with state.lock:
+                    await self._rebase(state)
+
+    def _takeDirty(self, state: LiveMatchState):
+        """Capture what needs persisting. Caller holds `state.lock`."""
+        if not state.dirty:
+            return None, [], [], {}
+        snapshots, state.pendingSnapshots = state.pendingSnapshots, []
+        history, state.pendingHistory = state.pendingHistory, []
+        stats, state.pendingStats = state.pendingStats, {}
+        state.dirty = False
+        return copy.deepcopy(state.scoreboard), snapshots, history, stats
+
+    def _storedQuery(self, state: LiveMatchState) -> dict:
+        """Matches the stored scoreboard only if it is still the one `state.persisted` was read or written as."""
+        persisted = state.persisted
+        query = {"matchId": state.matchId, "version": persisted["version"] if "version" in persisted else {"$exists": False}}
+        if "id" in persisted:
+            # Re-initialising a match restarts its version at 0
+            query["id"] = persisted["id"]
+        return query
+
+    async def _persist(self, state: LiveMatchState, current: Optional[dict], snapshots: list, history: list, stats: dict):
+        """
+        Write the scoreboard difference, history buckets, player stats and
+        snapshots. Caller holds `state.flushLock`.
+        """
+        if current is None:
+            return
+        update = buildScoreboardUpdate(state.persisted, current)
+        try:
+            # Write-behind appends history before the scoreboard: after a crash in
+            # between, recovery replays these balls and re-appends them, which is a
+            # no-op. Write-through never replays, and a write that loses the version
+            # check must leave nothing behind, so there history comes after.
+            if history and not self.writeThrough:
+                await pushBallHistoryToDb(state.matchId, history, unique=True)
+                history = []
+            if update:
+                result = await applyScoreboardUpdateInDb(self._storedQuery(state), update)
+                if result.matched_count == 0:
+                    raise ScoreboardConflict(f"stored scoreboard of match {state.matchId} is no longer version {state.persisted.get('version')}")
+            state.persisted = current
+            if history:
+                await pushBallHistoryToDb(state.matchId, history, unique=True)
+                history = []
+            # Stats after the scoreboard: recovery re-adds only balls the scoreboard never saw.
+            if stats:
+                await incrementPlayerStatsInDb(stats)
+                stats = {}
+            while snapshots:
+                await upsertSnapshotToDb(snapshots[0])
+                snapshots.pop(0)
+        except Exception:
+            state.dirty = True
+            state.pendingSnapshots[:0] = snapshots
+            state.pendingHistory[:0] = history
+            mergeStatsDelta(state.pendingStats, stats)
+            raise
+
+    async def flushAll(self):
+        for state in list(self.matches.values()):
+            try:
+                await self.flush(state)
+            except Exception as e:
+                logger.error(f"Failed to flush scoreboard for match {state.matchId}: {e}", exc_info=True)
+
+    async def release(self, matchId: str):
+        """
+        Flush a match and drop it from memory. Used when a match completes and
+        whenever its match document changes, so the next ball reloads it.
+        """
+        state = self.matches.get(matchId)
+        if state is None:
+            return
+        await self.flush(state)
+        self.matches.pop(matchId, None)
+        logger.info(f"Live state flushed and released for match: {matchId}")
+
+    def evict(self, matchId: str):
+        """
+        Drop a match without flushing. Used when the persisted match or
+        scoreboard is replaced directly, so the hot copy is no longer valid.
+        """
+        if self.matches.pop(matchId, None) is not None:
+            logger.info(f"Live state discarded for match: {matchId}")
+
+    async def _flushLoop(self):
+        while True:
+            await asyncio.sleep(self.flushIntervalSeconds)
+            await self.flushAll()
+            now = time.monotonic()
+            for matchId, state in list(self.matches.items()):
+                if not state.dirty and now - state.lastTouched > self.idleSeconds:
+                    self.matches.pop(matchId, None)
+
+
+liveMatchEngine = LiveMatchEngine(
+    liveFlushIntervalSeconds, liveMatchIdleSeconds, liveWriteThrough,
+    scoreboardConflictRetries, scoreboardConflictBackoffMs / 1000, staleBallEventSeconds,
+    ballSeqWaitSeconds, ballSeqBufferSize,
+)
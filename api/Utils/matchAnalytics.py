@@ -0,0 +1,206 @@
+# Utils/matchAnalytics.py
+"""
+Match analytics over columnar NumPy arrays.
+
+A match's ball events are loaded once into one array per field; every chart
+is then a handful of vectorized passes (bincount, cumsum, digitize) instead
+of a Python loop over ball dicts. Loops only run per innings or per
+partnership, never per ball.
+"""
+from typing import Tuple
+
+import numpy as np
+
+BALL_TYPES = ("normal", "wide", "noBall", "bye", "legBye", "wicket")
+BALL_TYPE_CODES = {ballType: code for code, ballType in enumerate(BALL_TYPES)}
+
+# Indexed by ball type code, mirroring how updateScoreboardWithBall books a delivery
+PENALTY_RUNS = np.array([0, 1, 1, 0, 0, 0], dtype=np.int32)
+COUNTS_RUNS = np.array([1, 0, 1, 1, 1, 0], dtype=np.int32)
+BAT_RUNS = np.array([1, 0, 1, 0, 0, 0], dtype=np.int32)
+LEGAL = np.array([True, False, False, True, True, True])
+
+# T20 phases (overs 1-6, 7-15, 16-20); other formats are scaled to their length
+T20_OVERS = 20
+T20_POWERPLAY_OVERS = 6
+T20_DEATH_FROM_OVER = 15
+PHASES = ("powerplay", "middle", "death")
+
+
+def buildBallColumns(events: list) -> dict:
+    """Columnar arrays for a match's ball events, in delivery order."""
+    count = len(events)
+    ballType = np.fromiter((BALL_TYPE_CODES[event["ballType"]] for event in events), dtype=np.int8, count=count)
+    runs = np.fromiter((event.get("runs") or 0 for event in events), dtype=np.int32, count=count)
+    batsmanNames, batsman = np.unique(np.array([event.get("batsman") or "" for event in events], dtype=object), return_inverse=True)
+    return {
+        "innings": np.fromiter((event.get("innings") or 1 for event in events), dtype=np.int32, count=count),
+        "over": np.fromiter((event.get("over") or 0 for event in events), dtype=np.int32, count=count),
+        "ballType": ballType,
+        "runs": runs,
+        "total": runs * COUNTS_RUNS[ballType] + PENALTY_RUNS[ballType],
+        "legal": LEGAL[ballType],
+        "isWicket": np.fromiter((bool(event.get("isWicket")) for event in events), dtype=bool, count=count),
+        "batsman": batsman.reshape(-1),
+        "batsmanNames": batsmanNames,
+    }
+
+
+def _byInnings(columns: dict):
+    """Yield `(innings, columns of that innings)`."""
+    for innings in np.unique(columns["innings"]):
+        mask = columns["innings"] == innings
+        yield int(innings), {key: value if key == "batsmanNames" else value[mask] for key, value in columns.items()}
+
+
+def _runRate(runs, balls):
+    """Runs per over, 0 where no legal ball has been bowled."""
+    runs = np.asarray(runs, dtype=np.float64)
+    balls = np.asarray(balls, dtype=np.float64)
+    return np.round(np.divide(runs * 6, balls, out=np.zeros_like(runs), where=balls > 0), 2)
+
+
+def _percent(part, whole):
+    part = np.asarray(part, dtype=np.float64)
+    whole = np.asarray(whole, dtype=np.float64)
+    return np.round(np.divide(part * 100, whole, out=np.zeros_like(part), where=whole > 0), 2)
+
+
+def _perOver(columns: dict, values):
+    overs = int(columns["over"].max()) + 1 if len(columns["over"]) else 0
+    return np.bincount(columns["over"], weights=values, minlength=overs)
+
+
+def computeWorm(columns: dict) -> list:
+    """Cumulative runs, wickets and run rate at the end of every over."""
+    worms = []
+    for innings, inningsColumns in _byInnings(columns):
+        runs = np.cumsum(_perOver(inningsColumns, inningsColumns["total"])).astype(np.int64)
+        wickets = np.cumsum(_perOver(inningsColumns, inningsColumns["isWicket"])).astype(np.int64)
+        balls = np.cumsum(_perOver(inningsColumns, inningsColumns["legal"]))
+        worms.append({
+            "innings": innings,
+            "overs": list(range(1, len(runs) + 1)),
+            "runs": runs.tolist(),
+            "wickets": wickets.tolist(),
+            "runRate": _runRate(runs, balls).tolist(),
+        })
+    return worms
+
+
+def computeManhattan(columns: dict) -> list:
+    """Runs, extras and wickets in each over."""
+    manhattans = []
+    for innings, inningsColumns in _byInnings(columns):
+        runs = _perOver(inningsColumns, inningsColumns["total"]).astype(np.int64)
+        batRuns = inningsColumns["runs"] * BAT_RUNS[inningsColumns["ballType"]]
+        manhattans.append({
+            "innings": innings,
+            "overs": list(range(1, len(runs) + 1)),
+            "runs": runs.tolist(),
+            "extras": (runs - _perOver(inningsColumns, batRuns).astype(np.int64)).tolist(),
+            "wickets": _perOver(inningsColumns, inningsColumns["isWicket"]).astype(np.int64).tolist(),
+        })
+    return manhattans
+
+
+def computePartnerships(columns: dict) -> list:
+    """Runs and balls of every partnership; a wicket ball closes the partnership it ends."""
+    partnerships = []
+    for innings, inningsColumns in _byInnings(columns):
+        isWicket = inningsColumns["isWicket"]
+        if not len(isWicket):
+            continue
+        partnershipId = np.concatenate(([0], np.cumsum(isWicket)[:-1]))
+        count = int(partnershipId[-1]) + 1
+        runs = np.bincount(partnershipId, weights=inningsColumns["total"], minlength=count).astype(np.int64)
+        balls = np.bincount(partnershipId, weights=inningsColumns["legal"], minlength=count).astype(np.int64)
+        starts = np.searchsorted(partnershipId, np.arange(count))
+        ends = np.append(starts[1:], len(partnershipId))
+        ended = np.bincount(partnershipId, weights=isWicket, minlength=count) > 0
+        for index in range(count):
+            batsmen = inningsColumns["batsmanNames"][np.unique(inningsColumns["batsman"][starts[index]:ends[index]])]
+            partnerships.append({
+                "innings": innings,
+                "wicket": index + 1,
+                "batsmen": [name for name in batsmen.tolist() if name],
+                "runs": int(runs[index]),
+                "balls": int(balls[index]),
+                "runRate": float(_runRate(runs[index], balls[index])),
+                "fromOver": int(inningsColumns["over"][starts[index]]) + 1,
+                "toOver": int(inningsColumns["over"][ends[index] - 1]) + 1,
+                "unbroken": not bool(ended[index]),
+            })
+    return partnerships
+
+
+def computeDotBalls(columns: dict) -> list:
+    """Legal deliveries that added nothing to the total, per innings."""
+    dots = []
+    for innings, inningsColumns in _byInnings(columns):
+        legal = inningsColumns["legal"]
+        dotBalls = int(np.count_nonzero(legal & (inningsColumns["total"] == 0)))
+        legalBalls = int(np.count_nonzero(legal))
+        dots.append({
+            "innings": innings,
+            "dotBalls": dotBalls,
+            "legalBalls": legalBalls,
+            "dotBallPercent": float(_percent(dotBalls, legalBalls)),
+        })
+    return dots
+
+
+def phaseOvers(matchOvers: int) -> int:
+    """Overs of the match the phases are split over; a match without overs is split like a T20."""
+    return max(int(matchOvers or T20_OVERS), 1)
+
+
+def phaseBoundaries(matchOvers: int) -> Tuple[int, int]:
+    """Overs at which the middle and death phases start, scaled from T20. `matchOvers` comes from `phaseOvers`."""
+    powerplay = max(1, round(matchOvers * T20_POWERPLAY_OVERS / T20_OVERS))
+    death = max(powerplay, round(matchOvers * T20_DEATH_FROM_OVER / T20_OVERS))
+    return powerplay, death
+
+
+def computePhases(columns: dict, matchOvers: int) -> list:
+    """Runs, wickets, run rate and dot-ball % for powerplay, middle and death overs."""
+    matchOvers = phaseOvers(matchOvers)
+    powerplay, death = phaseBoundaries(matchOvers)
+    splits = []
+    for innings, inningsColumns in _byInnings(columns):
+        phase = np.digitize(inningsColumns["over"], [powerplay, death])
+        legal = inningsColumns["legal"]
+        runs = np.bincount(phase, weights=inningsColumns["total"], minlength=3).astype(np.int64)
+        balls = np.bincount(phase, weights=legal, minlength=3).astype(np.int64)
+        wickets = np.bincount(phase, weights=inningsColumns["isWicket"], minlength=3).astype(np.int64)
+        dotBalls = np.bincount(phase, weights=legal & (inningsColumns["total"] == 0), minlength=3)
+        runRate = _runRate(runs, balls)
+        dotPercent = _percent(dotBalls, balls)
+        ranges = ((0, powerplay), (powerplay, death), (death, matchOvers))
+        splits.append({
+            "innings": innings,
+            "phases": [
+                {
+                    "phase": name,
+                    "fromOver": ranges[index][0] + 1,
+                    "toOver": ranges[index][1],
+                    "runs": int(runs[index]),
+                    "balls": int(balls[index]),
+                    "wickets": int(wickets[index]),
+                    "runRate": float(runRate[index]),
+                    "dotBallPercent": float(dotPercent[index]),
+                }
+                for index, name in enumerate(PHASES)
+            ],
+        })
+    return splits
+
+
+def computeAnalytics(columns: dict, matchOvers: int) -> dict:
+    return {
+        "worm": computeWorm(columns),
+        "manhattan": computeManhattan(columns),
+        "partnerships": computePartnerships(columns),
+        "dotBalls": computeDotBalls(columns),
+        "phases": computePhases(columns, matchOvers),
+    }
@@ -0,0 +1,302 @@
+# Utils/matchArchive.py
+"""
+Archival of completed matches.
+
+A completed match's scoreboard and ball events are packed into one
+compressed blob in matchArchives, and the hot scoreboard, ball, snapshot
+and ball-history documents are deleted. Ball fields are stored column-wise
+(one array per field) before compression, so repeated values such as ball
+types and player names compress well. The match document itself stays in
+matchesCollection, flagged `archived`, so listings and filters keep working.
+
+The scoreboard, as-of, ball and ball-history GET endpoints fall back to
+the archive, and rehydration restores the hot documents:
+
+    python -m Utils.matchArchive --archive-completed
+    python -m Utils.matchArchive --rehydrate MATCH_ID [MATCH_ID ...]
+    python -m Utils.matchArchive --rehydrate-all
+"""
+import argparse
+import asyncio
+import copy
+import json
+import operator
+import zlib
+from collections import OrderedDict
+from typing import List, Optional
+
+import bson
+from bson import Binary
+from yensiAuthentication import logger
+from yensiDatetime.yensiDatetime import formatDateTime
+from Models.ballModel import BallEvent
+from Database.matchDb import (
+    getMatchFromDb, getAllMatchesFromDb, insertMatchToDb, updateMatchInDb, getMatchBallDocumentsFromDb,
+    insertBallEventsToDb, deleteBallEventsFromDb,
+)
+from Database.scoreboardDb import getScoreboardFromDb, replaceScoreboardInDb, deleteScoreboardFromDb
+from Database.snapshotDb import deleteSnapshotsFromDb
+from Database.ballHistoryDb import pushBallHistoryToDb, deleteBallHistoryFromDb
+from Database.archiveDb import upsertMatchArchiveToDb, getMatchArchiveFromDb, getArchivedMatchIdsFromDb, deleteMatchArchiveFromDb
+from Utils.liveMatchEngine import liveMatchEngine
+from Utils.scoreboardReplay import historyBucketItem, replayBallEvents
+from Utils.scoreboardUtils import buildInitialScoreboard
+from constants import matchArchiveCacheSize
+
+ARCHIVE_FORMAT = 1
+COMPRESSION_LEVEL = 6
+
+QUERY_OPERATORS = {
+    "$ne": operator.ne,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
+# Archives never change once written, so decoded ones are kept in a small LRU
+_archiveCache: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def packMatchArchive(match: dict, scoreboard: Optional[dict], balls: List[dict]) -> bytes:
+    """Compressed BSON of the match, its scoreboard and its balls stored column-wise."""
+    fields = list(dict.fromkeys(field for ball in balls for field in ball))
+    payload = {
+        "format": ARCHIVE_FORMAT,
+        "match": match,
+        "scoreboard": scoreboard,
+        "ballCount": len(balls),
+        "columns": {field: [ball.get(field) for ball in balls] for field in fields},
+        # Positions of balls that lack a field, so absent and None stay distinct
+        "absent": {},
+    }
+    for field in fields:
+        missing = [index for index, ball in enumerate(balls) if field not in ball]
+        if missing:
+            payload["absent"][field] = missing
+    return zlib.compress(bson.encode(payload), COMPRESSION_LEVEL)
+
+
+def unpackMatchArchive(blob: bytes) -> dict:
+    """Inverse of `packMatchArchive`: `{"match", "scoreboard", "balls", ...}`."""
+    payload = bson.decode(zlib.decompress(blob))
+    columns = payload.pop("columns")
+    absent = payload.pop("absent")
+    balls = [{} for _ in range(payload["ballCount"])]
+    for field, values in columns.items():
+        missing = set(absent.get(field, ()))
+        for index, value in enumerate(values):
+            if index not in missing:
+                balls[index][field] = value
+    payload["balls"] = balls
+    return payload
+
+
+def matchesQuery(document: dict, query: dict) -> bool:
+    """Evaluate the equality and comparison filters used by the ball GET against one document."""
+    for field, condition in query.items():
+        value = document.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for op, operand in condition.items():
+            if op != "$ne" and value is None:
+                return False
+            if not QUERY_OPERATORS[op](value, operand):
+                return False
+    return True
+
+
+async def loadMatchArchive(matchId: str) -> Optional[dict]:
+    payload = _archiveCache.get(matchId)
+    if payload is not None:
+        _archiveCache.move_to_end(matchId)
+        return payload
+    archive = await getMatchArchiveFromDb(matchId)
+    if not archive:
+        return None
+    payload = unpackMatchArchive(archive["blob"])
+    _archiveCache[matchId] = payload
+    if len(_archiveCache) > matchArchiveCacheSize:
+        _archiveCache.popitem(last=False)
+    return payload
+
+
+async def getArchivedScoreboard(matchId: str) -> Optional[dict]:
+    if matchId in liveMatchEngine.matches:
+        return None
+    payload = await loadMatchArchive(matchId)
+    if not payload or not payload["scoreboard"]:
+        return None
+    return copy.deepcopy(payload["scoreboard"])
+
+
+async def getArchivedBalls(matchId: str, query: dict, limit: int = 0) -> Optional[List[dict]]:
+    """
+    Archived balls matching a ball GET query, in delivery order, or None if
+    the match is not archived. Hot matches are never looked up.
+    """
+    if matchId in liveMatchEngine.matches:
+        return None
+    payload = await loadMatchArchive(matchId)
+    if not payload:
+        return None
+    balls = []
+    for ball in payload["balls"]:
+        if matchesQuery(ball, query):
+            balls.append({field: value for field, value in ball.items() if field != "undo"})
+            if limit and len(balls) == limit:
+                break
+    return balls
+
+
+async def getArchivedScoreboardAsOf(matchId: str, innings: int, over: int) -> Optional[dict]:
+    """
+    Scoreboard of an archived match after `over` completed overs of
+    `innings`, replayed from its archived balls, or None if it is not archived.
+    """
+    if matchId in liveMatchEngine.matches:
+        return None
+    payload = await loadMatchArchive(matchId)
+    if not payload:
+        return None
+    balls = [
+        ball for ball in payload["balls"]
+        if not ball.get("undone") and (ball.get("innings", 1) < innings or (ball.get("innings", 1) == innings and ball.get("over", 0) < over))
+    ]
+    return replayBallEvents(buildInitialScoreboard(payload["match"]), balls)
+
+
+async def getArchivedBallHistoryPage(matchId: str, innings: int, afterOver: Optional[int], limit: int) -> Optional[List[dict]]:
+    """Ball-history buckets of an archived match, shaped like the hot ones, or None if it is not archived."""
+    if matchId in liveMatchEngine.matches:
+        return None
+    payload = await loadMatchArchive(matchId)
+    if not payload:
+        return None
+    buckets = OrderedDict()
+    for ball in payload["balls"]:
+        if ball.get("undone") or ball.get("innings", 1) != innings:
+            continue
+        _, over, entry = historyBucketItem(ball, BallEvent.model_validate(ball))
+        if afterOver is None or over > afterOver:
+            buckets.setdefault(over, []).append(entry)
+    return [
+        {"matchId": matchId, "innings": innings, "over": over, "balls": balls}
+        for over, balls in sorted(buckets.items())[:limit]
+    ]
+
+
+async def archiveMatch(matchId: str) -> Optional[dict]:
+    """
+    Archive a completed match. The archive is written before anything is
+    deleted, so an interrupted run leaves the hot documents in place and
+    can simply be repeated. Returns a summary, or None if the match is not
+    completed or already archived.
+    """
+    match = await getMatchFromDb({"id": matchId})
+    if not match or match.get("status") != "completed" or match.get("archived"):
+        return None
+    await liveMatchEngine.release(matchId)
+
+    scoreboard = await getScoreboardFromDb({"matchId": matchId})
+    if scoreboard:
+        scoreboard.pop("_id", None)
+    balls = await getMatchBallDocumentsFromDb(matchId)
+    blob = packMatchArchive(match, scoreboard, balls)
+    archivedAt = formatDateTime()
+    await upsertMatchArchiveToDb({
+        "matchId": matchId,
+        "format": ARCHIVE_FORMAT,
+        "ballCount": len(balls),
+        "archivedAt": archivedAt,
+        "blob": Binary(blob),
+    })
+
+    await updateMatchInDb({"id": matchId}, {"archived": True, "archivedAt": archivedAt})
+    await deleteScoreboardFromDb({"matchId": matchId})
+    await deleteBallEventsFromDb({"matchId": matchId})
+    await deleteSnapshotsFromDb(matchId)
+    await deleteBallHistoryFromDb(matchId)
+    logger.info(f"Match archived: {matchId}, {len(balls)} balls in {len(blob)} bytes")
+    return {"matchId": matchId, "balls": len(balls), "bytes": len(blob)}
+
+
+async def archiveMatchInBackground(matchId: str):
+    try:
+        await archiveMatch(matchId)
+    except Exception as e:
+        logger.error(f"Failed to archive match {matchId}: {e}", exc_info=True)
+
+
+async def rehydrateMatch(matchId: str) -> Optional[dict]:
+    """
+    Restore an archived match's scoreboard, balls and ball-history buckets
+    to the hot collections and drop the archive. Snapshots are not restored;
+    rebuilds replay from the first ball until new ones are taken.
+    """
+    archive = await getMatchArchiveFromDb(matchId)
+    if not archive:
+        return None
+    payload = unpackMatchArchive(archive["blob"])
+    balls = payload["balls"]
+
+    if not await getMatchFromDb({"id": matchId}):
+        await insertMatchToDb(payload["match"])
+    if payload["scoreboard"]:
+        await replaceScoreboardInDb({"matchId": matchId}, payload["scoreboard"])
+    await deleteBallEventsFromDb({"matchId": matchId})
+    if balls:
+        await insertBallEventsToDb(balls)
+    await deleteBallHistoryFromDb(matchId)
+    history = [historyBucketItem(ball, BallEvent.model_validate(ball)) for ball in balls if not ball.get("undone")]
+    await pushBallHistoryToDb(matchId, history)
+
+    await updateMatchInDb({"id": matchId}, {"archived": False})
+    await deleteMatchArchiveFromDb(matchId)
+    _archiveCache.pop(matchId, None)
+    logger.info(f"Match rehydrated: {matchId}, {len(balls)} balls")
+    return {"matchId": matchId, "balls": len(balls)}
+
+
+async def archiveCompletedMatches() -> list:
+    matches = await getAllMatchesFromDb({"status": "completed", "archived": {"$ne": True}})
+    results = []
+    for match in matches:
+        result = await archiveMatch(match["id"])
+        if result:
+            results.append(result)
+    return results
+
+
+async def rehydrateMatches(matchIds: Optional[List[str]] = None) -> list:
+    """Rehydrate the given matches, or every archived match."""
+    if matchIds is None:
+        matchIds = await getArchivedMatchIdsFromDb()
+    results = []
+    for matchId in matchIds:
+        result = await rehydrateMatch(matchId)
+        if result:
+            results.append(result)
+        else:
+            logger.warning(f"No archive found for match: {matchId}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive completed matches or restore archived ones")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--archive-completed", action="store_true", help="archive every completed match that is still hot")
+    group.add_argument("--rehydrate", nargs="+", metavar="MATCH_ID", help="restore the given archived matches")
+    group.add_argument("--rehydrate-all", action="store_true", help="restore every archived match")
+    args = parser.parse_args()
+    if args.archive_completed:
+        results = asyncio.run(archiveCompletedMatches())
+    else:
+        results = asyncio.run(rehydrateMatches(args.rehydrate))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
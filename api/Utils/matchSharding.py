@@ -0,0 +1,324 @@
+# Utils/matchSharding.py
+"""
+Match-affinity sharding: each live match is scored by one node.
+
+Every process started with SHARD_SELF registers in the shard members
+collection and heartbeats every SHARD_HEARTBEAT_SECONDS. Match ids are
+placed on a consistent hash ring of the nodes seen within
+SHARD_MEMBER_TTL_SECONDS, so when a node joins or leaves only the matches on
+the ring segments it takes or gives up change owner. After every heartbeat a
+node releases (flushes and drops) the hot matches it no longer owns; the new
+owner loads them from Mongo on their next request.
+
+`MatchShardMiddleware` sends requests for `/matches/{matchId}/...` and
+`/scoreboard/{matchId}` to the owner, either proxied (including the live
+websocket and event stream) or as a 307 redirect. A request that was
+forwarded once is served wherever it lands, so nodes whose views of the
+ring briefly differ cannot bounce it around; the version-guarded scoreboard
+writes keep such overlaps safe with LIVE_WRITE_THROUGH. A request whose
+owner cannot be reached is served locally as well. OPTIONS requests are
+always served locally; the middleware sits inside CORSMiddleware, so
+preflights never leave the node and redirects carry the CORS headers.
+"""
+import asyncio
+import bisect
+import hashlib
+import re
+import time
+from typing import Optional
+
+import httpx
+from websockets.asyncio.client import connect as connectWebsocket
+from websockets.exceptions import ConnectionClosed
+from yensiAuthentication import logger
+from Database.shardMembersDb import heartbeatShardMemberInDb, getLiveShardMembersFromDb, deleteShardMemberFromDb
+from Utils.liveMatchEngine import liveMatchEngine
+from Utils.metrics import shardRequests, shardForwardLatency, shardMembers
+from constants import shardSelf, shardVirtualNodes, shardHeartbeatSeconds, shardMemberTtlSeconds, shardForwardTimeoutSeconds
+
+FORWARDED_HEADER = b"x-shard-forwarded-by"
+SERVED_BY_HEADER = b"x-served-by"
+MATCH_PATH = re.compile(r"^/(?:matches|scoreboard)/([^/]+)")
+# Connection-specific headers a proxy must not pass on (RFC 9110, section 7.6.1)
+HOP_BY_HOP_HEADERS = {b"connection", b"keep-alive", b"proxy-connection", b"te", b"trailer", b"transfer-encoding", b"upgrade"}
+# httpx sets these itself for the upstream request
+REQUEST_SKIPPED_HEADERS = HOP_BY_HOP_HEADERS | {b"host", b"content-length"}
+
+
+def _ringPoint(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring with `virtualNodes` points per node, so load evens out and a change moves about 1/n of the keys."""
+
+    def __init__(self, nodes, virtualNodes: int = 64):
+        self.nodes = sorted(set(nodes))
+        points = sorted((_ringPoint(f"{node}#{replica}"), node) for node in self.nodes for replica in range(virtualNodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        return self._owners[bisect.bisect(self._points, _ringPoint(key)) % len(self._points)]
+
+
+class MatchShards:
+    """This node's view of the shard ring, kept current by a heartbeat task. Disabled when `selfNode` is empty."""
+
+    def __init__(
+        self, selfNode: str, engine, virtualNodes: int = 64, heartbeatSeconds: float = 2.0,
+        memberTtlSeconds: float = 10.0, forwardTimeoutSeconds: float = 30.0,
+    ):
+        self.selfNode = selfNode
+        self.engine = engine
+        self.virtualNodes = virtualNodes
+        self.heartbeatSeconds = heartbeatSeconds
+        self.memberTtlSeconds = memberTtlSeconds
+        self.forwardTimeoutSeconds = forwardTimeoutSeconds
+        self.ring = HashRing([selfNode] if selfNode else [], virtualNodes)
+        # Shared by forwarded requests, so connections to the other nodes are reused
+        self.client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.selfNode)
+
+    def owner(self, matchId: str) -> Optional[str]:
+        return self.ring.owner(matchId) if self.enabled else None
+
+    def isOwner(self, matchId: str) -> bool:
+        owner = self.owner(matchId)
+        return owner is None or owner == self.selfNode
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self.client = httpx.AsyncClient(timeout=self.forwardTimeoutSeconds)
+        await self.refresh()
+        self._task = asyncio.create_task(self._heartbeatLoop())
+        logger.info(f"Joined the shard ring as {self.selfNode}, members: {self.ring.nodes}")
+
+    async def stop(self):
+        """Leave the ring, so the other nodes take over this node's matches at their next heartbeat."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await deleteShardMemberFromDb(self.selfNode)
+        except Exception as e:
+            logger.error(f"Could not leave the shard ring as {self.selfNode}: {e}", exc_info=True)
+        await self.client.aclose()
+        self.client = None
+        logger.info(f"Left the shard ring as {self.selfNode}")
+
+    async def refresh(self):
+        """Heartbeat, rebuild the ring if the members changed, and hand off matches this node no longer owns."""
+        await heartbeatShardMemberInDb(self.selfNode)
+        members = set(await getLiveShardMembersFromDb(self.memberTtlSeconds))
+        members.add(self.selfNode)
+        if sorted(members) != self.ring.nodes:
+            previous = self.ring.nodes
+            self.ring = HashRing(members, self.virtualNodes)
+            logger.info(f"Shard ring changed from {previous} to {self.ring.nodes}")
+        shardMembers.set(len(self.ring.nodes))
+        await self.handOff()
+
+    async def handOff(self):
+        """
+        Release hot matches owned by another node. Also catches matches
+        loaded here by a request forwarded while the ring was changing.
+        """
+        for matchId in [matchId for matchId in self.engine.matches if not self.isOwner(matchId)]:
+            try:
+                await self.engine.release(matchId)
+                logger.info(f"Match {matchId} handed off to {self.owner(matchId)}")
+            except Exception as e:
+                logger.error(f"Failed to hand off match {matchId}: {e}", exc_info=True)
+
+    async def _heartbeatLoop(self):
+        while True:
+            await asyncio.sleep(self.heartbeatSeconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Shard heartbeat of {self.selfNode} failed: {e}", exc_info=True)
+
+    def describe(self, matchId: Optional[str] = None) -> dict:
+        status = {
+            "enabled": self.enabled,
+            "self": self.selfNode or None,
+            "members": self.ring.nodes,
+            "hotMatches": sorted(self.engine.matches),
+        }
+        if matchId:
+            status["matchId"] = matchId
+            status["owner"] = self.owner(matchId) or self.selfNode or None
+        return status
+
+
+async def _readBody(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _replayBody(body: bytes, receive):
+    """A `receive` that hands out an already read body first, for serving a request after all."""
+    pending = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def replay():
+        return pending.pop() if pending else await receive()
+    return replay
+
+
+async def _waitForDisconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class MatchShardMiddleware:
+    """
+    ASGI middleware sending every request for a match to the node that owns
+    it. Each response names the node that served it in X-Served-By.
+    """
+
+    def __init__(self, app, shards: MatchShards, mode: str = "forward"):
+        self.app = app
+        self.shards = shards
+        self.redirect = mode == "redirect"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or not self.shards.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        match = MATCH_PATH.match(scope["path"])
+        if match is None or scope.get("method") == "OPTIONS":
+            await self._serveLocally(scope, receive, send)
+            return
+        owner = self.shards.owner(match.group(1))
+        if owner == self.shards.selfNode:
+            shardRequests.labels("local").inc()
+            await self._serveLocally(scope, receive, send)
+            return
+        if any(name == FORWARDED_HEADER for name, _ in scope["headers"]):
+            # Forwarded by a node with another view of the ring; serve it rather than pass it on again
+            shardRequests.labels("stale").inc()
+            await self._serveLocally(scope, receive, send)
+            return
+
+        # No route runs here; the metrics middleware outside labels the request by this instead
+        scope["shardOwner"] = owner
+        if scope["type"] == "websocket":
+            await self._forwardWebsocket(scope, receive, send, owner)
+        elif self.redirect:
+            shardRequests.labels("redirected").inc()
+            await self._redirect(scope, send, owner)
+        else:
+            await self._forward(scope, receive, send, owner)
+
+    def _target(self, scope) -> str:
+        target = (scope.get("raw_path") or scope["path"].encode()).decode("latin-1")
+        if scope.get("query_string"):
+            target += "?" + scope["query_string"].decode("latin-1")
+        return target
+
+    async def _serveLocally(self, scope, receive, send):
+        servedBy = (SERVED_BY_HEADER, self.shards.selfNode.encode())
+
+        async def sendServedBy(message):
+            if message["type"] in ("http.response.start", "websocket.accept"):
+                message = {**message, "headers": [*message.get("headers", []), servedBy]}
+            await send(message)
+
+        await self.app(scope, receive, sendServedBy)
+
+    async def _redirect(self, scope, send, owner: str):
+        headers = [(b"location", (owner + self._target(scope)).encode("latin-1")), (b"content-length", b"0"), (SERVED_BY_HEADER, self.shards.selfNode.encode())]
+        await send({"type": "http.response.start", "status": 307, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _forward(self, scope, receive, send, owner: str):
+        body = await _readBody(receive)
+        headers = [(name, value) for name, value in scope["headers"] if name not in REQUEST_SKIPPED_HEADERS]
+        headers.append((FORWARDED_HEADER, self.shards.selfNode.encode()))
+        # The live event stream stays open for as long as the client listens
+        timeout = httpx.Timeout(self.shards.forwardTimeoutSeconds, read=None) if scope["path"].endswith("/live/sse") else self.shards.forwardTimeoutSeconds
+        request = self.shards.client.build_request(scope["method"], owner + self._target(scope), headers=headers, content=body, timeout=timeout)
+        start = time.perf_counter()
+        try:
+            response = await self.shards.client.send(request, stream=True)
+        except httpx.TransportError as e:
+            logger.warning(f"Owner {owner} of {scope['path']} is unreachable, serving it here: {e}")
+            shardRequests.labels("fallback").inc()
+            await self._serveLocally(scope, _replayBody(body, receive), send)
+            return
+
+        shardRequests.labels("forwarded").inc()
+        disconnected = asyncio.create_task(_waitForDisconnect(receive))
+        try:
+            responseHeaders = [(name.lower(), value) for name, value in response.headers.raw if name.lower() not in HOP_BY_HOP_HEADERS]
+            await send({"type": "http.response.start", "status": response.status_code, "headers": responseHeaders})
+            async for chunk in response.aiter_raw():
+                if disconnected.done():
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+            await response.aclose()
+            shardForwardLatency.observe(time.perf_counter() - start)
+
+    async def _forwardWebsocket(self, scope, receive, send, owner: str):
+        # Live deltas are published in the owner's process, so subscribers have to be connected there
+        url = "ws" + owner[len("http"):] + self._target(scope)
+        try:
+            upstream = await connectWebsocket(
+                url, additional_headers={FORWARDED_HEADER.decode(): self.shards.selfNode}, open_timeout=self.shards.forwardTimeoutSeconds,
+            )
+        except Exception as e:
+            logger.warning(f"Owner {owner} of {scope['path']} is unreachable, serving it here: {e}")
+            shardRequests.labels("fallback").inc()
+            await self._serveLocally(scope, receive, send)
+            return
+
+        shardRequests.labels("forwarded").inc()
+        await receive()  # websocket.connect
+        await send({"type": "websocket.accept", "headers": [(SERVED_BY_HEADER, owner.encode())]})
+
+        async def clientToOwner():
+            while True:
+                message = await receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                await upstream.send(message["text"] if message.get("text") is not None else message.get("bytes", b""))
+
+        async def ownerToClient():
+            try:
+                async for message in upstream:
+                    await send({"type": "websocket.send", **({"text": message} if isinstance(message, str) else {"bytes": message})})
+            except ConnectionClosed:
+                pass
+            await send({"type": "websocket.close", "code": 1000})
+
+        pumps = [asyncio.create_task(clientToOwner()), asyncio.create_task(ownerToClient())]
+        try:
+            await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for pump in pumps:
+                pump.cancel()
+            await upstream.close()
+
+
+matchShards = MatchShards(shardSelf, liveMatchEngine, shardVirtualNodes, shardHeartbeatSeconds, shardMemberTtlSeconds, shardForwardTimeoutSeconds)
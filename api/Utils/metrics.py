@@ -0,0 +1,235 @@
+# Utils/metrics.py
+"""
+Request and database timing, exposed in Prometheus format at GET /metrics.
+
+`MetricsMiddleware` records the latency of every HTTP request per route
+template (so `/matches/{matchId}/ball`, not one series per match). The
+Database modules wrap their functions with `instrumentDbModule`, which
+times every call and counts the documents it returned and the bytes it
+wrote. While a request is running its database calls are also collected,
+and requests slower than SLOW_REQUEST_THRESHOLD_MS are logged with that
+breakdown (a sample of them, see SLOW_REQUEST_SAMPLE_RATE).
+
+With several uvicorn workers each worker keeps its own counters; run
+prometheus_client in multiprocess mode (PROMETHEUS_MULTIPROC_DIR) to
+aggregate them.
+"""
+import functools
+import inspect
+import random
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+import bson
+from bson.errors import InvalidDocument
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from pymongo.results import InsertOneResult, InsertManyResult, UpdateResult, BulkWriteResult
+from yensiAuthentication import logger
+from constants import slowRequestThresholdMs, slowRequestSampleRate
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Results of calls that write documents; deletes are not counted as bytes written
+WRITE_RESULTS = (InsertOneResult, InsertManyResult, UpdateResult, BulkWriteResult)
+
+requestLatency = Histogram(
+    "scoremate_http_request_duration_seconds", "HTTP request latency until the response is complete",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+slowRequests = Counter("scoremate_http_slow_requests_total", "Requests slower than the slow-request threshold", ["method", "route"])
+dbCallLatency = Histogram("scoremate_db_call_duration_seconds", "Latency of Database layer calls", ["function"], buckets=LATENCY_BUCKETS)
+dbDocumentsReturned = Counter("scoremate_db_documents_returned_total", "Documents returned by Database layer calls", ["function"])
+dbBytesWritten = Counter("scoremate_db_bytes_written_total", "BSON bytes passed to Database layer write calls", ["function"])
+dbCallErrors = Counter("scoremate_db_call_errors_total", "Database layer calls that raised", ["function"])
+cacheHits = Counter("scoremate_cache_hits_total", "Read-through cache hits", ["cache"])
+cacheMisses = Counter("scoremate_cache_misses_total", "Read-through cache misses", ["cache"])
+scoreboardWriteConflicts = Counter(
+    "scoremate_scoreboard_write_conflicts_total", "Scoreboard writes and ball inserts that lost to another writer", ["operation"],
+)
+ballSequence = Counter(
+    "scoremate_ball_sequence_total", "Sequenced balls that were resubmitted, waited for a gap, or gave up waiting", ["outcome"],
+)
+shardRequests = Counter("scoremate_shard_requests_total", "Requests for a match, by how this node handled them", ["outcome"])
+shardForwardLatency = Histogram("scoremate_shard_forward_seconds", "Time to forward a request to the owning node", buckets=LATENCY_BUCKETS)
+shardMembers = Gauge("scoremate_shard_members", "Nodes in this node's view of the shard ring")
+mongoPoolConnections = Gauge("scoremate_mongo_pool_connections", "Mongo pool connections, open and checked out", ["state"])
+mongoPoolCheckoutWait = Histogram("scoremate_mongo_pool_checkout_wait_seconds", "Time spent waiting for a pool connection", buckets=LATENCY_BUCKETS)
+mongoPoolCheckoutFailures = Counter("scoremate_mongo_pool_checkout_failures_total", "Failed pool check-outs", ["reason"])
+
+# Database calls of the request being served, as (function, seconds, documents, bytes written)
+_requestDbCalls: ContextVar[Optional[List[tuple]]] = ContextVar("requestDbCalls", default=None)
+
+
+def renderMetrics():
+    """`(body, content type)` of the Prometheus exposition."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def returnedDocuments(result) -> int:
+    if result is None or isinstance(result, (int, float, str, bytes)):
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return 1
+    return 0
+
+
+def writtenBytes(result, args: tuple, kwargs: dict) -> int:
+    """BSON size of the documents, updates and filters handed to a write call."""
+    if not isinstance(result, WRITE_RESULTS):
+        return 0
+    payload = [value for value in (*args, *kwargs.values()) if isinstance(value, (dict, list, tuple))]
+    if not payload:
+        return 0
+    try:
+        return len(bson.encode({"payload": payload}))
+    except (InvalidDocument, TypeError, OverflowError):
+        return 0
+
+
+def _timedCoroutine(name: str, function):
+    latency = dbCallLatency.labels(name)
+    documentsReturned = dbDocumentsReturned.labels(name)
+    bytesWritten = dbBytesWritten.labels(name)
+    errors = dbCallErrors.labels(name)
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await function(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            latency.observe(time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+        latency.observe(elapsed)
+        documents = returnedDocuments(result)
+        written = writtenBytes(result, args, kwargs)
+        if documents:
+            documentsReturned.inc(documents)
+        if written:
+            bytesWritten.inc(written)
+        calls = _requestDbCalls.get()
+        if calls is not None:
+            calls.append((name, elapsed, documents, written))
+        return result
+
+    return wrapper
+
+
+def _timedGenerator(name: str, function):
+    """Times only the waits for the next document, not the consumer's work between them."""
+    latency = dbCallLatency.labels(name)
+    documentsReturned = dbDocumentsReturned.labels(name)
+    errors = dbCallErrors.labels(name)
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        generator = function(*args, **kwargs)
+        elapsed = 0.0
+        documents = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = await generator.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - start
+                documents += 1
+                yield item
+        finally:
+            await generator.aclose()
+            latency.observe(elapsed)
+            documentsReturned.inc(documents)
+            calls = _requestDbCalls.get()
+            if calls is not None:
+                calls.append((name, elapsed, documents, 0))
+
+    return wrapper
+
+
+def instrumentDbModule(namespace: dict):
+    """
+    Replace every public async function defined in a Database module with a
+    timed wrapper. Call it at the end of the module with `globals()`, so
+    importers of the module get the wrapped functions.
+    """
+    moduleName = namespace["__name__"]
+    shortName = moduleName.rsplit(".", 1)[-1]
+    for attribute, function in list(namespace.items()):
+        if attribute.startswith("_") or getattr(function, "__module__", None) != moduleName:
+            continue
+        name = f"{shortName}.{attribute}"
+        if inspect.isasyncgenfunction(function):
+            namespace[attribute] = _timedGenerator(name, function)
+        elif inspect.iscoroutinefunction(function):
+            namespace[attribute] = _timedCoroutine(name, function)
+
+
+def logSlowRequest(method: str, route: str, status: int, elapsed: float, calls: List[tuple]):
+    dbSeconds = sum(call[1] for call in calls)
+    breakdown = ", ".join(
+        f"{name} {seconds * 1000:.1f}ms/{documents} docs" + (f"/{written} bytes" if written else "")
+        for name, seconds, documents, written in calls
+    )
+    logger.warning(
+        f"Slow request: {method} {route} -> {status} in {elapsed * 1000:.1f}ms; "
+        f"{len(calls)} db calls took {dbSeconds * 1000:.1f}ms, other {max(elapsed - dbSeconds, 0) * 1000:.1f}ms"
+        + (f" [{breakdown}]" if breakdown else "")
+    )
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency, and logging the database
+    breakdown of sampled slow requests. Latency runs until the last body
+    chunk is sent, so streamed responses count in full and background tasks
+    do not count at all.
+    """
+
+    def __init__(self, app, thresholdMs: float = slowRequestThresholdMs, sampleRate: float = slowRequestSampleRate):
+        self.app = app
+        self.threshold = thresholdMs / 1000 if thresholdMs and thresholdMs > 0 else None
+        self.sampleRate = sampleRate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        calls = [] if self.threshold is not None else None
+        token = _requestDbCalls.set(calls)
+        state = {"status": 500, "elapsed": None, "calls": None}
+
+        async def sendWithTiming(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and state["elapsed"] is None:
+                state["elapsed"] = time.perf_counter() - start
+                if calls is not None:
+                    state["calls"] = len(calls)
+
+        try:
+            await self.app(scope, receive, sendWithTiming)
+        finally:
+            _requestDbCalls.reset(token)
+            elapsed = state["elapsed"] if state["elapsed"] is not None else time.perf_counter() - start
+            route = scope.get("route")
+            # Requests the shard middleware sent to another node never reach a route here
+            routePath = getattr(route, "path", None) or ("forwarded" if "shardOwner" in scope else "unmatched")
+            method = scope["method"]
+            requestLatency.labels(method, routePath, str(state["status"])).observe(elapsed)
+            if self.threshold is not None and elapsed >= self.threshold:
+                slowRequests.labels(method, routePath).inc()
+                if self.sampleRate >= 1 or random.random() < self.sampleRate:
+                    logSlowRequest(method, routePath, state["status"], elapsed, calls[:state["calls"]])
@@ -0,0 +1,125 @@
+# Utils/payloadCache.py
+"""
+Serialized response bodies of the match, scoreboard and ball GETs.
+
+Viewers of a popular match ask for the same scoreboard many times between
+two balls, so the encoded bytes are kept per match and served as they are.
+An entry is tied to the scoreboard version it was built from when the
+match is hot in this process, so a recorded ball or a scoreboard update
+makes it stale at once. Other entries are dropped whenever the match or
+scoreboard read caches invalidate the match, and expire with the
+scoreboard cache TTL. Bodies read while the match was changing are served
+but not stored.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import orjson
+from fastapi import Response
+from Database.matchDb import matchCache
+from Database.scoreboardDb import scoreboardCache
+from Utils.liveMatchEngine import liveMatchEngine
+from Utils.metrics import cacheHits, cacheMisses
+from Utils.utils import returnResponse
+from constants import payloadCacheSize, payloadCacheVariants, scoreboardCacheTtlSeconds
+
+
+def encodeJson(content) -> bytes:
+    # str() covers ObjectId and anything else the stored documents may carry
+    return orjson.dumps(content, default=str)
+
+
+def encodeResponse(code: int, result=None) -> bytes:
+    return encodeJson(returnResponse(code, result=result))
+
+
+def payloadResponse(payload: "CachedPayload") -> Response:
+    return Response(content=payload.body, media_type="application/json", headers=payload.headers)
+
+
+class CachedPayload:
+    __slots__ = ("version", "expiresAt", "body", "headers")
+
+    def __init__(self, version: Optional[int], expiresAt: float, body: bytes, headers: Dict[str, str]):
+        self.version = version
+        self.expiresAt = expiresAt
+        self.body = body
+        self.headers = headers
+
+
+class PayloadCache:
+    """
+    LRU of matches, each holding up to `variants` payloads keyed by what was
+    asked for, e.g. `("scoreboard",)` or a ball page's query parameters.
+    """
+
+    def __init__(self, maxMatches: int, variants: int, ttlSeconds: float):
+        self.maxMatches = maxMatches
+        self.variants = variants
+        self.ttlSeconds = ttlSeconds
+        self.matches: "OrderedDict[str, OrderedDict[Hashable, CachedPayload]]" = OrderedDict()
+        # Bumped by every invalidation, so a body read across a write is not stored
+        self.generation = 0
+        self._hits = cacheHits.labels("payload")
+        self._misses = cacheMisses.labels("payload")
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxMatches > 0 and self.ttlSeconds > 0
+
+    def get(self, matchId: str, variant: Hashable):
+        """
+        `(payload or None, token)` for `variant`. On a miss, build the body and
+        hand the token back to `put`. Payloads of a hot match are only served
+        for the scoreboard version they were built from.
+        """
+        version = liveMatchEngine.peekVersion(matchId)
+        token = (version, self.generation, liveMatchEngine.isChanging(matchId))
+        payloads = self.matches.get(matchId)
+        payload = payloads.get(variant) if payloads is not None else None
+        if payload is None or payload.version != version or payload.expiresAt <= time.monotonic():
+            self._misses.inc()
+            return None, token
+        self.matches.move_to_end(matchId)
+        self._hits.inc()
+        return payload, token
+
+    def put(self, matchId: str, variant: Hashable, token: tuple, body: bytes, headers: Optional[Dict[str, str]] = None) -> CachedPayload:
+        """
+        Store a body built after `get` returned `token`, unless the match
+        changed while it was being read: a new version or a write in progress
+        for hot matches, any invalidation for the others.
+        """
+        version, generation, changing = token
+        payload = CachedPayload(version, time.monotonic() + self.ttlSeconds, body, headers or {})
+        if version is None:
+            current = generation == self.generation
+        else:
+            current = not changing and liveMatchEngine.peekVersion(matchId) == version and not liveMatchEngine.isChanging(matchId)
+        if not self.enabled or not current:
+            return payload
+        payloads = self.matches.get(matchId)
+        if payloads is None:
+            payloads = self.matches[matchId] = OrderedDict()
+        payloads[variant] = payload
+        payloads.move_to_end(variant)
+        while len(payloads) > self.variants:
+            payloads.popitem(last=False)
+        self.matches.move_to_end(matchId)
+        while len(self.matches) > self.maxMatches:
+            self.matches.popitem(last=False)
+        return payload
+
+    def invalidate(self, matchId: Optional[str]):
+        """Drop every payload of `matchId`, or of all matches when it is None."""
+        self.generation += 1
+        if matchId is None:
+            self.matches.clear()
+        else:
+            self.matches.pop(matchId, None)
+
+
+payloadCache = PayloadCache(payloadCacheSize, payloadCacheVariants, scoreboardCacheTtlSeconds)
+matchCache.listeners.append(payloadCache.invalidate)
+scoreboardCache.listeners.append(payloadCache.invalidate)
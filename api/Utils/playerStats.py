@@ -0,0 +1,192 @@
+# Utils/playerStats.py
+"""
+Career batting and bowling aggregates derived from ball events.
+
+Each delivery maps to a set of `$inc` deltas per player; the live engine
+folds them into `playerStats` as balls are scored, undone and redone.
+Aggregates are keyed by player name: ball events and team lists only carry
+names, and nothing links them to a players-collection id. The backfill
+rebuilds every player's aggregates from the balls collection and the
+match archives, and drops documents from before the name key:
+
+    python -m Utils.playerStats --backfill
+"""
+import argparse
+import asyncio
+import json
+from typing import Dict, Optional
+
+from yensiAuthentication import logger
+from yensiDatetime.yensiDatetime import formatDateTime
+from Models.ballModel import BallEvent
+from Database.matchDb import streamAllBallEventsFromDb
+from Database.archiveDb import streamMatchArchivesFromDb
+from Database.playerStatsDb import replacePlayerStatsInDb, deletePlayerStatsFromDb
+
+BATTING_FIELDS = ("runs", "balls", "fours", "sixes", "dismissals")
+BOWLING_FIELDS = ("balls", "runs", "wickets", "maidens")
+
+# Dismissals that are not credited to the bowler
+NON_BOWLER_WICKETS = ("runout",)
+
+
+def isLegalDelivery(ball: BallEvent) -> bool:
+    return ball.ballType in ["normal", "bye", "legBye", "wicket"]
+
+
+def bowlerConceded(ball: BallEvent) -> int:
+    """Runs charged to the bowler, matching how the scoreboard books them."""
+    if ball.ballType == "normal":
+        return ball.runs
+    if ball.ballType == "wide":
+        return 1
+    if ball.ballType == "noBall":
+        return 1 + ball.runs
+    return 0
+
+
+def ballStatsDelta(ball: BallEvent, maiden: bool = False) -> Dict[str, Dict[str, int]]:
+    """`{playerName: {field: increment}}` for one delivery. `maiden` marks the ball that completed a maiden over."""
+    delta = {}
+    if ball.batsman:
+        batting = {}
+        if ball.ballType in ["normal", "noBall"] and ball.runs:
+            batting["battingStats.runs"] = ball.runs
+            if ball.runs == 4:
+                batting["battingStats.fours"] = 1
+            elif ball.runs == 6:
+                batting["battingStats.sixes"] = 1
+        if ball.ballType != "wide":
+            batting["battingStats.balls"] = 1
+        if ball.isWicket:
+            batting["battingStats.dismissals"] = 1
+        delta[ball.batsman] = batting
+    if ball.bowler:
+        bowling = delta.setdefault(ball.bowler, {})
+        if isLegalDelivery(ball):
+            bowling["bowlingStats.balls"] = 1
+        if bowlerConceded(ball):
+            bowling["bowlingStats.runs"] = bowlerConceded(ball)
+        if ball.isWicket and ball.wicketType not in NON_BOWLER_WICKETS:
+            bowling["bowlingStats.wickets"] = 1
+        if maiden:
+            bowling["bowlingStats.maidens"] = 1
+    return delta
+
+
+def mergeStatsDelta(target: dict, delta: dict, sign: int = 1) -> dict:
+    """Fold `delta` into `target` in place; `sign=-1` takes a ball back out."""
+    for playerName, fields in delta.items():
+        merged = target.setdefault(playerName, {})
+        for field, value in fields.items():
+            merged[field] = merged.get(field, 0) + sign * value
+            if merged[field] == 0:
+                merged.pop(field)
+    return target
+
+
+def buildPlayerProfile(stats: Optional[dict], playerName: str) -> dict:
+    """Stored aggregates plus the rates derived from them."""
+    stats = stats or {}
+    batting = {field: stats.get("battingStats", {}).get(field, 0) for field in BATTING_FIELDS}
+    bowling = {field: stats.get("bowlingStats", {}).get(field, 0) for field in BOWLING_FIELDS}
+
+    batting["strikeRate"] = round(batting["runs"] / batting["balls"] * 100, 2) if batting["balls"] else 0.0
+    batting["average"] = round(batting["runs"] / batting["dismissals"], 2) if batting["dismissals"] else None
+    # Overs in cricket notation, e.g. 12.3 is twelve overs and three balls
+    bowling["overs"] = bowling["balls"] // 6 + (bowling["balls"] % 6) / 10
+    bowling["economy"] = round(bowling["runs"] / (bowling["balls"] / 6), 2) if bowling["balls"] else 0.0
+    return {
+        "playerName": playerName,
+        "battingStats": batting,
+        "bowlingStats": bowling,
+        "updatedAt": stats.get("updatedAt"),
+    }
+
+
+def _overTotals(overEvents: list, totals: dict):
+    """Add the balls of one over to `totals`, crediting a maiden to its bowler."""
+    conceded = 0
+    legal = 0
+    lastBall = None
+    for event in overEvents:
+        ball = BallEvent.model_validate(event)
+        mergeStatsDelta(totals, ballStatsDelta(ball))
+        conceded += bowlerConceded(ball)
+        if isLegalDelivery(ball):
+            legal += 1
+            lastBall = ball
+    if legal == 6 and conceded == 0 and lastBall.bowler:
+        mergeStatsDelta(totals, {lastBall.bowler: {"bowlingStats.maidens": 1}})
+
+
+async def _backfillBallEvents(batchSize: int, counts: dict):
+    """Live ball events of the balls collection, then those of every archived match."""
+    # Imported here: matchArchive imports the live engine, which imports this module
+    from Utils.matchArchive import unpackMatchArchive
+
+    hotMatchIds = set()
+    async for event in streamAllBallEventsFromDb(batchSize):
+        hotMatchIds.add(event.get("matchId"))
+        yield event
+    async for archive in streamMatchArchivesFromDb():
+        # A match archived during the pass may already have been read from the balls collection
+        if archive["matchId"] in hotMatchIds:
+            continue
+        counts["archivedMatches"] += 1
+        for event in unpackMatchArchive(archive["blob"])["balls"]:
+            if not event.get("undone"):
+                yield event
+
+
+async def backfillPlayerStats(batchSize: int = 1000) -> dict:
+    """
+    Recompute every player's aggregates from the balls collection and the
+    match archives in one streaming pass and overwrite the stored documents.
+    Run it while no match is being scored or archived, otherwise in-flight
+    increments may be overwritten.
+    """
+    totals = {}
+    overKey = None
+    overEvents = []
+    counts = {"balls": 0, "archivedMatches": 0}
+    async for event in _backfillBallEvents(batchSize, counts):
+        key = (event.get("matchId"), event.get("innings"), event.get("over"))
+        if key != overKey and overEvents:
+            _overTotals(overEvents, totals)
+            overEvents = []
+        overKey = key
+        overEvents.append(event)
+        counts["balls"] += 1
+    if overEvents:
+        _overTotals(overEvents, totals)
+
+    updatedAt = formatDateTime()
+    statsDocs = []
+    for playerName, fields in totals.items():
+        doc = {"playerName": playerName, "battingStats": {}, "bowlingStats": {}, "updatedAt": updatedAt}
+        for field, value in fields.items():
+            group, name = field.split(".")
+            doc[group][name] = value
+        statsDocs.append(doc)
+    for start in range(0, len(statsDocs), batchSize):
+        await replacePlayerStatsInDb(statsDocs[start:start + batchSize])
+    # Documents keyed by the old `playerId` field would also block the unique index
+    await deletePlayerStatsFromDb({"playerName": {"$exists": False}})
+
+    logger.info(f"Player stats backfilled for {len(statsDocs)} players from {counts['balls']} balls, {counts['archivedMatches']} archived matches included")
+    return {"players": len(statsDocs), **counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain career player statistics")
+    parser.add_argument("--backfill", action="store_true", help="rebuild all player stats from the balls collection and match archives")
+    parser.add_argument("--batch-size", type=int, default=1000, help="balls fetched and players written per round trip")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do: pass --backfill")
+    print(json.dumps(asyncio.run(backfillPlayerStats(args.batch_size)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
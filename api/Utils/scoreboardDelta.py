@@ -0,0 +1,141 @@
+# Utils/scoreboardDelta.py
+"""
+Builds minimal MongoDB update documents from two versions of a scoreboard.
+
+Counters are sent as `$inc`, the current batsmen as positional `$set`s,
+append-only lists as `$push`, and everything else that changed as `$set`.
+Fields that did not change are not sent at all.
+"""
+import copy
+
+INCREMENT_FIELDS = {
+    "score",
+    "wickets",
+    "eventCount",
+    "version",
+    "extras.byes",
+    "extras.legByes",
+    "extras.wides",
+    "extras.noBalls",
+    "extras.penalties",
+    "extras.total",
+    "currentBowler.runs",
+    "currentBowler.wickets",
+    "currentBowler.maidens",
+}
+APPEND_FIELDS = {"fallOfWickets", "ballHistory"}
+POSITIONAL_FIELDS = {"currentBatsmen"}
+NESTED_FIELDS = {"extras", "currentBowler"}
+
+_MISSING = object()
+
+
+def _isCounter(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _diffList(path: str, old: list, new: list, update: dict):
+    if path in APPEND_FIELDS:
+        if len(new) == len(old) - 1 and old[:-1] == new:
+            update["$pop"][path] = 1
+            return
+        # Appended to, possibly with the oldest items dropped (a bounded window)
+        for dropped in range(len(old) + 1):
+            kept = len(old) - dropped
+            if len(new) > kept and new[:kept] == old[dropped:]:
+                push = {"$each": new[kept:]}
+                if dropped:
+                    push["$slice"] = -len(new)
+                update["$push"][path] = push
+                return
+    if path in POSITIONAL_FIELDS and len(new) == len(old):
+        for index, (oldItem, newItem) in enumerate(zip(old, new)):
+            if oldItem != newItem:
+                update["$set"][f"{path}.{index}"] = newItem
+        return
+    update["$set"][path] = new
+
+
+def _diff(before: dict, after: dict, prefix: str, update: dict):
+    for key, new in after.items():
+        path = f"{prefix}{key}"
+        old = before.get(key, _MISSING)
+        if old == new:
+            continue
+        if path in INCREMENT_FIELDS and _isCounter(old) and _isCounter(new):
+            update["$inc"][path] = new - old
+        elif isinstance(old, list) and isinstance(new, list):
+            _diffList(path, old, new, update)
+        elif path in NESTED_FIELDS and isinstance(old, dict) and isinstance(new, dict) and old.get("name") == new.get("name"):
+            _diff(old, new, f"{path}.", update)
+        else:
+            update["$set"][path] = new
+
+    for key in before:
+        if key not in after:
+            update["$unset"][f"{prefix}{key}"] = ""
+
+
+def buildScoreboardUpdate(before: dict, after: dict) -> dict:
+    """
+    Return the update document that turns `before` into `after`, or an empty
+    dict when nothing changed.
+    """
+    update = {"$set": {}, "$inc": {}, "$push": {}, "$pop": {}, "$unset": {}}
+    _diff(before, after, "", update)
+    return {operator: fields for operator, fields in update.items() if fields}
+
+
+def changedFields(update: dict) -> set:
+    """Top-level scoreboard fields touched by an update document."""
+    return {path.split(".")[0] for fields in update.values() for path in fields}
+
+
+def encodeUpdate(update: dict) -> list:
+    """
+    Flatten an update document into `[operator, path, value]` triples so it
+    can be stored inside another document (field names may not start with $).
+    """
+    return [[operator, path, value] for operator, fields in update.items() for path, value in fields.items()]
+
+
+def decodeUpdate(encoded: list) -> dict:
+    update = {}
+    for operator, path, value in encoded:
+        update.setdefault(operator, {})[path] = value
+    return update
+
+
+def _resolve(document: dict, path: str):
+    """Return the container holding the last segment of a dotted path, and that segment."""
+    *parents, last = path.split(".")
+    container = document
+    for part in parents:
+        container = container[int(part)] if isinstance(container, list) else container.setdefault(part, {})
+    if isinstance(container, list):
+        last = int(last)
+    return container, last
+
+
+def applyScoreboardUpdate(scoreboard: dict, update: dict) -> dict:
+    """Apply an update document produced by buildScoreboardUpdate to a scoreboard in memory."""
+    for path, value in update.get("$set", {}).items():
+        container, key = _resolve(scoreboard, path)
+        container[key] = copy.deepcopy(value)
+    for path, value in update.get("$inc", {}).items():
+        container, key = _resolve(scoreboard, path)
+        container[key] = container.get(key, 0) + value
+    for path, value in update.get("$push", {}).items():
+        container, key = _resolve(scoreboard, path)
+        items = container.setdefault(key, [])
+        items.extend(copy.deepcopy(value["$each"]))
+        if "$slice" in value:
+            del items[:max(0, len(items) + value["$slice"])]
+    for path, value in update.get("$pop", {}).items():
+        container, key = _resolve(scoreboard, path)
+        if container.get(key):
+            container[key].pop(-1 if value == 1 else 0)
+    for path in update.get("$unset", {}):
+        container, key = _resolve(scoreboard, path)
+        container.pop(key, None)
+    return scoreboard
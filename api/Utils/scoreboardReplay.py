@@ -0,0 +1,97 @@
+# Utils/scoreboardReplay.py
+"""
+Deterministic scoreboard reconstruction from the ball events in ballsCollection.
+
+Every stored ball carries an `eventIndex` (its position in the match), and the
+scoreboard carries `eventCount` (how many events it has absorbed). Replaying
+events through `applyBallEvent` uses exactly the rules of the live scoring path,
+so a rebuilt scoreboard matches the one produced ball by ball.
+
+Snapshots of the scoreboard are stored every `snapshotEveryOvers` completed
+overs, so a rebuild starts from the latest snapshot and replays only the tail.
+"""
+import copy
+from typing import Iterable, Optional, Union
+
+from Models.ballModel import BallEvent
+from Database.matchDb import getMatchFromDb, getBallEventsForReplay
+from Database.snapshotDb import getLatestSnapshotFromDb
+from Utils.scoreboardUtils import buildInitialScoreboard, updateScoreboardWithBall
+from constants import snapshotEveryOvers, recentBallHistorySize
+
+
+def applyBallEvent(scoreboard: dict, ball: BallEvent) -> dict:
+    """
+    Apply one delivery with the live scoring rules, count it, and add it to
+    the scoreboard's bounded window of recent balls.
+    """
+    if ball.seq is not None:
+        # The highest client sequence number per innings lets resubmitted balls be recognised
+        innings = str(scoreboard.get("currentInnings") or 1)
+        lastSeq = dict(scoreboard.get("lastSeq") or {})
+        lastSeq[innings] = max(lastSeq.get(innings, 0), ball.seq)
+        scoreboard["lastSeq"] = lastSeq
+    scoreboard = updateScoreboardWithBall(scoreboard, ball)
+    scoreboard["eventCount"] = scoreboard.get("eventCount", 0) + 1
+    history = scoreboard.get("ballHistory") or []
+    scoreboard["ballHistory"] = (history + [historyEntry(ball)])[-recentBallHistorySize:]
+    return scoreboard
+
+
+def lastSequence(scoreboard: dict) -> int:
+    """Highest client sequence number applied in the current innings, 0 before the first."""
+    return (scoreboard.get("lastSeq") or {}).get(str(scoreboard.get("currentInnings") or 1), 0)
+
+
+def historyEntry(ball: BallEvent) -> dict:
+    return ball.model_dump()
+
+
+def historyBucketItem(event: dict, ballData: BallEvent):
+    """`(innings, over, entry)` for a stored ball's history bucket; eventIndex keeps re-appends idempotent."""
+    return event.get("innings", 1), event.get("over", 0), {**historyEntry(ballData), "eventIndex": event.get("eventIndex")}
+
+
+def replayBallEvents(scoreboard: dict, events: Iterable[Union[dict, BallEvent]]) -> dict:
+    """Apply stored event documents, or `BallEvent`s such as `CompactBallLog.toBallEvents()`."""
+    for event in events:
+        scoreboard = applyBallEvent(scoreboard, event if isinstance(event, BallEvent) else BallEvent.model_validate(event))
+    return scoreboard
+
+
+def snapshotIfDue(before: dict, after: dict) -> Optional[dict]:
+    """
+    Return a snapshot document if `after` closes an over that falls on the
+    snapshot interval, otherwise None.
+    """
+    overs = after.get("overs", 0)
+    if overs == before.get("overs", 0) or after.get("balls", 0) != 0 or overs % snapshotEveryOvers != 0:
+        return None
+    return {
+        "matchId": after.get("matchId"),
+        "innings": after.get("currentInnings", 1),
+        "over": overs,
+        "eventCount": after.get("eventCount", 0),
+        "scoreboard": copy.deepcopy(after),
+    }
+
+
+async def rebuildScoreboard(matchId: str, innings: int = None, over: int = None) -> Optional[dict]:
+    """
+    Rebuild a match's scoreboard from its ball events. When `innings` and
+    `over` are given, the result is the scoreboard as it stood after `over`
+    completed overs of that innings. Returns None if the match does not exist.
+    """
+    snapshot = await getLatestSnapshotFromDb(matchId, innings, over)
+    if snapshot:
+        scoreboard = snapshot["scoreboard"]
+        fromEventIndex = snapshot["eventCount"]
+    else:
+        match = await getMatchFromDb({"id": matchId})
+        if not match:
+            return None
+        scoreboard = buildInitialScoreboard(match)
+        fromEventIndex = None
+
+    events = await getBallEventsForReplay(matchId, fromEventIndex, innings, over)
+    return replayBallEvents(scoreboard, events)
@@ -1,49 +1,66 @@
 from bson import ObjectId
 from Models.scoreboardModel import BatsmanStats, BowlerStats, Extras, Scoreboard
-from Database.scoreboardDb import insertScoreboardToDb
+from Database.scoreboardDb import getScoreboardFromDb, replaceScoreboardInDb, scoreboardCache
+from Database.matchDb import getNextEventIndexFromDb
 from yensiAuthentication import logger
 from Models.ballModel import BallEvent
 from yensiDatetime.yensiDatetime import formatDateTime
 
-def initializeScoreboardFromMatch(match: dict) -> dict:
+def buildInitialScoreboard(match: dict) -> dict:
+    # Extract opening players
+    opening = match.get("openingPlayers", {})
+    striker = opening.get("striker")
+    non_striker = opening.get("nonStriker")
+    bowler = opening.get("bowler")
+
+    # Prepare batsmen and bowler stats
+    strikerStats = BatsmanStats(name=striker, runs=0, balls=0, fours=0, sixes=0, strikeRate=0.0, isOut=False)
+    nonStrikerStats = BatsmanStats(name=non_striker, runs=0, balls=0, fours=0, sixes=0, strikeRate=0.0, isOut=False)
+    bowlerStats = BowlerStats(name=bowler, overs=0.0, maidens=0, runs=0, wickets=0, economyRate=0.0)
+
+    return Scoreboard(
+        matchId=match["id"],
+        hostTeam=match["hostTeam"]["name"],
+        visitorTeam=match["visitorTeam"]["name"],
+        currentInnings=match.get("currentInnings", 1),
+        battingTeam=match.get("battingTeam"),
+        bowlingTeam=match.get("bowlingTeam"),
+        score=0,
+        wickets=0,
+        overs=0,
+        balls=0,
+        target=match.get("target", 0),
+        currentBatsmen=[strikerStats, nonStrikerStats],
+        currentBowler=bowlerStats,
+        allBatsmen=[strikerStats, nonStrikerStats],
+        allBowlers=[bowlerStats],
+        ballHistory=[],
+        extras=Extras(),
+        fallOfWickets=[],
+        isComplete=False,
+        result=None,
+    ).model_dump()
+
+
+async def initializeScoreboardFromMatch(match: dict, previousVersion: int = None) -> dict:
+    """`previousVersion` is the version of a hot scoreboard being replaced, which may be ahead of the stored one."""
     try:
-        # Extract opening players
-        opening = match.get("openingPlayers", {})
-        striker = opening.get("striker")
-        non_striker = opening.get("nonStriker")
-        bowler = opening.get("bowler")
-
-        # Prepare batsmen and bowler stats
-        strikerStats = BatsmanStats(name=striker, runs=0, balls=0, fours=0, sixes=0, strikeRate=0.0, isOut=False)
-        nonStrikerStats = BatsmanStats(name=non_striker, runs=0, balls=0, fours=0, sixes=0, strikeRate=0.0, isOut=False)
-        bowlerStats = BowlerStats(name=bowler, overs=0.0, maidens=0, runs=0, wickets=0, economyRate=0.0)
-
-        scoreboard = Scoreboard(
-            matchId=match["id"],
-            hostTeam=match["hostTeam"]["name"],
-            visitorTeam=match["visitorTeam"]["name"],
-            currentInnings=match.get("currentInnings", 1),
-            battingTeam=match.get("battingTeam"),
-            bowlingTeam=match.get("bowlingTeam"),
-            score=0,
-            wickets=0,
-            overs=0,
-            balls=0,
-            target=match.get("target", 0),
-            currentBatsmen=[strikerStats, nonStrikerStats],
-            currentBowler=bowlerStats,
-            allBatsmen=[strikerStats, nonStrikerStats],
-            allBowlers=[bowlerStats],
-            ballHistory=[],
-            extras=Extras(),
-            fallOfWickets=[],
-            isComplete=False,
-            result=None,
-        ).model_dump()
-
+        scoreboard = buildInitialScoreboard(match)
         scoreboard["id"] = str(ObjectId())
         scoreboard["lastUpdated"] = formatDateTime()
-        insertScoreboardToDb(scoreboard)
+        # One scoreboard per match: re-setting the openers replaces it. Versions carry on from the
+        # replaced one, so a since-version position held by a viewer never points into the new scoreboard.
+        scoreboardCache.invalidate({"matchId": match["id"]})
+        replaced = await getScoreboardFromDb({"matchId": match["id"]})
+        if replaced or previousVersion is not None:
+            scoreboard["version"] = max((replaced or {}).get("version", 0), previousVersion or 0) + 1
+        else:
+            scoreboard["version"] = 0
+        # Balls of the replaced scoreboard stay stored. New balls are numbered after all of them, and
+        # undo stops at firstEventIndex, so neither undo nor redo can reach back into the old scoreboard.
+        scoreboard["eventCount"] = await getNextEventIndexFromDb(match["id"])
+        scoreboard["firstEventIndex"] = scoreboard["eventCount"]
+        await replaceScoreboardInDb({"matchId": match["id"]}, scoreboard)
         scoreboard.pop("_id", None)
 
         logger.info(f"Scoreboard initialized for match: {match['id']}")
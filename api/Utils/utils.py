@@ -14,3 +14,15 @@ def returnResponse(code, result=None):
     except Exception as e:
         logger.error(f"Error creating a returnResponse : {str(e)}")
         raise e
+
+
+def scoreboardETag(matchId: str, scoreboardId: str, version: int) -> str:
+    # Re-setting the openers replaces the scoreboard, so its id is part of the tag
+    return f'"{matchId}-{scoreboardId or ""}-{version}"'
+
+
+def etagMatches(ifNoneMatch: str, etag: str) -> bool:
+    if not ifNoneMatch:
+        return False
+    candidates = [value.strip().removeprefix("W/") for value in ifNoneMatch.split(",")]
+    return "*" in candidates or etag in candidates
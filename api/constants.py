@@ -8,5 +8,57 @@ mongoMatchesCollection = os.getenv("MONGO_MATCHES_COLLECTION_NAME", "matchesColl
 mongoPlayersCollection = os.getenv("MONGO_PLAYERS_COLLECTION_NAME", "playersCollection")
 mongoscoreboardsCollection = os.getenv("MONGO_SCOREBOARD_COLLECTION_NAME", "scoreCollection")
 mongoballsCollection = os.getenv("MONGO_BALLS_COLLECTION_NAME", "ballsCollection")
+mongoSnapshotsCollection = os.getenv("MONGO_SNAPSHOTS_COLLECTION_NAME", "scoreboardSnapshots")
+mongoBallHistoryCollection = os.getenv("MONGO_BALL_HISTORY_COLLECTION_NAME", "ballHistoryBuckets")
+mongoPlayerStatsCollection = os.getenv("MONGO_PLAYER_STATS_COLLECTION_NAME", "playerStats")
+mongoMatchArchivesCollection = os.getenv("MONGO_MATCH_ARCHIVES_COLLECTION_NAME", "matchArchives")
+mongoShardMembersCollection = os.getenv("MONGO_SHARD_MEMBERS_COLLECTION_NAME", "shardMembers")
 
+# Shared connection pool; a timeout of 0 keeps the driver default
+mongoMaxPoolSize = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+mongoMinPoolSize = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+mongoMaxIdleTimeMs = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+mongoWaitQueueTimeoutMs = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+mongoConnectTimeoutMs = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+mongoServerSelectionTimeoutMs = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+mongoHealthTimeoutSeconds = float(os.getenv("MONGO_HEALTH_TIMEOUT_SECONDS", "3"))
+mongoDrainSeconds = float(os.getenv("MONGO_DRAIN_SECONDS", "10"))
 
+liveFlushIntervalSeconds = float(os.getenv("LIVE_FLUSH_INTERVAL_SECONDS", "2"))
+liveMatchIdleSeconds = float(os.getenv("LIVE_MATCH_IDLE_SECONDS", "1800"))
+snapshotEveryOvers = int(os.getenv("SCOREBOARD_SNAPSHOT_EVERY_OVERS", "5"))
+scoreboardChangeLogSize = int(os.getenv("SCOREBOARD_CHANGE_LOG_SIZE", "256"))
+recentBallHistorySize = int(os.getenv("RECENT_BALL_HISTORY_SIZE", "12"))
+matchArchiveCacheSize = int(os.getenv("MATCH_ARCHIVE_CACHE_SIZE", "32"))
+# Scoreboard writes are conditional on the stored version. Run with LIVE_WRITE_THROUGH=true
+# when several processes may score the same match, so every ball is written before it is acknowledged.
+liveWriteThrough = os.getenv("LIVE_WRITE_THROUGH", "false").lower() == "true"
+scoreboardConflictRetries = int(os.getenv("SCOREBOARD_CONFLICT_RETRIES", "3"))
+# Retry n waits a random 0..BACKOFF_MS * 2**n first. Ball events past the stored eventCount
+# that are older than STALE_BALL_EVENT_SECONDS were left by a writer that died, and are discarded.
+scoreboardConflictBackoffMs = float(os.getenv("SCOREBOARD_CONFLICT_BACKOFF_MS", "5"))
+staleBallEventSeconds = float(os.getenv("STALE_BALL_EVENT_SECONDS", "5"))
+# A ball whose client sequence number is ahead of the next one expected waits up to BALL_SEQ_WAIT_SECONDS
+# for the balls before it; at most BALL_SEQ_BUFFER_SIZE balls per match wait at a time.
+ballSeqWaitSeconds = float(os.getenv("BALL_SEQ_WAIT_SECONDS", "10"))
+ballSeqBufferSize = int(os.getenv("BALL_SEQ_BUFFER_SIZE", "64"))
+# Match-affinity sharding, off unless SHARD_SELF is set to this process's base URL as the other
+# nodes reach it. Nodes find each other through the shard members collection; requests for a match
+# owned by another node are forwarded to it (SHARD_MODE=forward) or answered with a redirect (redirect).
+shardSelf = os.getenv("SHARD_SELF", "").rstrip("/")
+shardMode = os.getenv("SHARD_MODE", "forward")
+shardVirtualNodes = int(os.getenv("SHARD_VIRTUAL_NODES", "64"))
+shardHeartbeatSeconds = float(os.getenv("SHARD_HEARTBEAT_SECONDS", "2"))
+shardMemberTtlSeconds = float(os.getenv("SHARD_MEMBER_TTL_SECONDS", "10"))
+shardForwardTimeoutSeconds = float(os.getenv("SHARD_FORWARD_TIMEOUT_SECONDS", "30"))
+# Read-through caches for match and scoreboard documents; a size or TTL of 0 disables one
+matchCacheSize = int(os.getenv("MATCH_CACHE_SIZE", "1024"))
+matchCacheTtlSeconds = float(os.getenv("MATCH_CACHE_TTL_SECONDS", "30"))
+scoreboardCacheSize = int(os.getenv("SCOREBOARD_CACHE_SIZE", "1024"))
+scoreboardCacheTtlSeconds = float(os.getenv("SCOREBOARD_CACHE_TTL_SECONDS", "2"))
+# Serialized GET bodies: matches kept, and distinct requests (scoreboard, ball pages) kept per match
+payloadCacheSize = int(os.getenv("PAYLOAD_CACHE_SIZE", "1024"))
+payloadCacheVariants = int(os.getenv("PAYLOAD_CACHE_VARIANTS", "16"))
+# 0 disables the slow-request log; the sample rate is the fraction of slow requests logged
+slowRequestThresholdMs = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "0"))
+slowRequestSampleRate = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "1"))
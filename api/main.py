@@ -1,16 +1,43 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from yensiAuthentication import logger
-from Router import generalRouter, matchRouter, playerCreateRouter, scoreboardRouter, ballRouter
+from Router import generalRouter, matchRouter, playerCreateRouter, scoreboardRouter, ballRouter, liveRouter, analyticsRouter
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
+from Utils.liveMatchEngine import liveMatchEngine
+from Database.indexManager import ensureIndexes
+from Database.mongoData import mongo
+from Utils.metrics import MetricsMiddleware
+from Utils.matchSharding import matchShards, MatchShardMiddleware
+from constants import shardMode
 
 # Start the FastAPI application
 logger.info("FastAPI application starting...")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One shared Mongo pool for the whole app; connections open on first use
+    mongo.connect()
+    await ensureIndexes()
+    # Start the write-behind scoreboard flusher; flush everything on shutdown
+    liveMatchEngine.start()
+    # Join the shard ring when SHARD_SELF is set; matches are handed off as nodes come and go
+    await matchShards.start()
+    yield
+    # Leave the ring first, so the other nodes take over while this one flushes
+    await matchShards.stop()
+    await liveMatchEngine.stop()
+    # Close the pool only after the final flush has drained
+    await mongo.close()
+
+
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
+# Requests for a match owned by another node go there before any route runs here. It sits inside CORS,
+# so redirects and forwarded responses carry the CORS headers and preflights are answered locally.
+app.add_middleware(MatchShardMiddleware, shards=matchShards, mode=shardMode)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -18,6 +45,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route latency histograms and the slow-request log, exposed at GET /metrics.
+# Outermost, so forwarded and redirected requests are measured too.
+app.add_middleware(MetricsMiddleware)
 
 # Include authentication router
 app.include_router(generalRouter.router)
@@ -25,6 +55,8 @@ app.include_router(matchRouter.router)
 app.include_router(playerCreateRouter.router)
 app.include_router(scoreboardRouter.router)
 app.include_router(ballRouter.router)
+app.include_router(liveRouter.router)
+app.include_router(analyticsRouter.router)
 
 # run the FastAPI application
 if __name__ == "__main__":
@@ -12,6 +12,8 @@ const HistoryPage: React.FC = () => {
   const navigate = useNavigate();
   const { setCurrentMatch, setLoading, setError, isLoading } = useMatchStore();
   const [matches, setMatches] = useState<Match[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   useEffect(() => {
     loadMatches();
@@ -23,7 +25,8 @@ const HistoryPage: React.FC = () => {
 
     try {
       const response = await getAllMatches();
-      setMatches(response.result);
+      setMatches(response.result.matches);
+      setNextCursor(response.result.nextCursor);
     } catch (error) {
       setError(handleApiError(error));
     } finally {
@@ -31,6 +34,22 @@ const HistoryPage: React.FC = () => {
     }
   };
 
+  const loadMoreMatches = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    setError(null);
+
+    try {
+      const response = await getAllMatches(nextCursor);
+      setMatches(prev => [...prev, ...response.result.matches]);
+      setNextCursor(response.result.nextCursor);
+    } catch (error) {
+      setError(handleApiError(error));
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handleResumeMatch = (match: Match) => {
     setCurrentMatch({
       id: match.id,
@@ -206,6 +225,19 @@ const HistoryPage: React.FC = () => {
           </Card>
         ))}
       </div>
+
+      {nextCursor && (
+        <Button
+          onClick={loadMoreMatches}
+          variant="outline"
+          size="md"
+          loading={isLoadingMore}
+          disabled={isLoadingMore}
+          fullWidth
+        >
+          Load More
+        </Button>
+      )}
     </div>
   );
 };
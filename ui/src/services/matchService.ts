@@ -16,8 +16,8 @@ export const updateMatchSettings = async (id: string, settings: MatchSettings):
   return response.data;
 };
 
-export const getAllMatches = async (): Promise<ApiResponse<Match[]>> => {
-  const response = await axiosInstance.get('/matches');
+export const getAllMatches = async (cursor?: string): Promise<ApiResponse<{ matches: Match[]; nextCursor: string | null }>> => {
+  const response = await axiosInstance.get('/matches', { params: { view: 'summary', cursor } });
   return response.data;
 };
 
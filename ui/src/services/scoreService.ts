@@ -17,6 +17,6 @@ export const setOpeningPlayers = async (matchId: string, players: OpeningPlayers
 };
 
 export const undoLastBall = async (matchId: string): Promise<ApiResponse<{ scoreboard: MatchScoreboard }>> => {
-  const response = await axiosInstance.post<ApiResponse<{ scoreboard: MatchScoreboard }>>(`/matches/${matchId}/undo`);
+  const response = await axiosInstance.delete<ApiResponse<{ scoreboard: MatchScoreboard }>>(`/matches/${matchId}/ball/last`);
   return response.data;
 };
\ No newline at end of file